@@ -2,6 +2,7 @@
 import os
 from utils.config import GRAPH_SAVE_FOLDER, DATA_FOLDER
 from utils.plotter import plot_line_comparison
+from utils.loader import load_log
 
 
 # %%
@@ -40,7 +41,7 @@ tagged_folder = os.path.join(GRAPH_SAVE_FOLDER, extra_tag)
 # Ensure the tagged folder exists
 os.makedirs(tagged_folder, exist_ok=True)
 
-df = pd.read_csv('./data/Satellite_Australia_Simulation_Log_starlink_downlink.csv')
+df = load_log('./data/Satellite_Australia_Simulation_Log_starlink_downlink.csv')
 
 # %%
 import pandas as pd
@@ -52,7 +53,7 @@ tagged_folder = os.path.join(GRAPH_SAVE_FOLDER, extra_tag)
 # Ensure the tagged folder exists
 os.makedirs(tagged_folder, exist_ok=True)
 
-df = pd.read_csv('./data/Satellite_Australia_Simulation_Log_starlink_uplink.csv')
+df = load_log('./data/Satellite_Australia_Simulation_Log_starlink_uplink.csv')
 
 # %%
 import pandas as pd
@@ -115,84 +116,15 @@ print("Remaining columns after cleanup:", df.columns.tolist())
 
 
 # %%
-import pandas as pd
 import numpy as np
+from utils.link_cube import LinkCube
+from utils.selection import select_best_satellite
+
+# The cleaned log as a LinkCube, read by the selection and the per-satellite plots
+cube = LinkCube.from_frame(df, dtype=np.float64)
 
-# Assuming your DataFrame is loaded into 'df'
-
-# Identify unique satellite IDs
-satellite_ids = sorted(list(set([col.split('_')[0] for col in df.columns if col.startswith('LEO') and '_' in col])))
-
-results = []
-
-# Iterate through each row (representing a time index)
-for index, row in df.iterrows():
-    best_sydney = {'SAT_ID': None, 'BEST_SNR': -np.inf, 'BEST_RSSI': -np.inf, 'BEST_Thrpt': -np.inf,
-                   'BEST_BER_MQAM': np.inf, 'BEST_BER_QPSK': np.inf, 'BEST_Latency': np.inf}
-    best_melbourne = {'SAT_ID': None, 'BEST_SNR': -np.inf, 'BEST_RSSI': -np.inf, 'BEST_Thrpt': -np.inf,
-                     'BEST_BER_MQAM': np.inf, 'BEST_BER_QPSK': np.inf, 'BEST_Latency': np.inf}
-
-    for sat_id in satellite_ids:
-        # Sydney data
-        sydney_snr = row.get(f'{sat_id}_Sydney_SNR_dB')
-        sydney_rssi = row.get(f'{sat_id}_Sydney_RSSI_dBm')
-        sydney_thrpt = row.get(f'{sat_id}_Sydney_Throughput')
-        sydney_ber_mqam = row.get(f'{sat_id}_Sydney_BER_MQAM')
-        sydney_ber_qpsk = row.get(f'{sat_id}_Sydney_BER_QPSK')
-        sydney_latency = row.get(f'{sat_id}_Sydney_Latency')
-
-        if pd.notna(sydney_snr) and sydney_snr > best_sydney['BEST_SNR']:
-            best_sydney['SAT_ID'] = sat_id
-            best_sydney['BEST_SNR'] = sydney_snr
-            best_sydney['BEST_RSSI'] = sydney_rssi
-            best_sydney['BEST_Thrpt'] = sydney_thrpt
-            best_sydney['BEST_BER_MQAM'] = sydney_ber_mqam
-            best_sydney['BEST_BER_QPSK'] = sydney_ber_qpsk
-            best_sydney['BEST_Latency'] = sydney_latency
-        elif pd.notna(sydney_snr) and sydney_snr == best_sydney['BEST_SNR']:
-            # Handle ties - you might want a specific tie-breaking logic
-            pass
-
-        # Melbourne data
-        melbourne_snr = row.get(f'{sat_id}_Melbourne_SNR_dB')
-        melbourne_rssi = row.get(f'{sat_id}_Melbourne_RSSI_dBm')
-        melbourne_thrpt = row.get(f'{sat_id}_Melbourne_Throughput')
-        melbourne_ber_mqam = row.get(f'{sat_id}_Melbourne_BER_MQAM')
-        melbourne_ber_qpsk = row.get(f'{sat_id}_Melbourne_BER_QPSK')
-        melbourne_latency = row.get(f'{sat_id}_Melbourne_Latency')
-
-        if pd.notna(melbourne_snr) and melbourne_snr > best_melbourne['BEST_SNR']:
-            best_melbourne['SAT_ID'] = sat_id
-            best_melbourne['BEST_SNR'] = melbourne_snr
-            best_melbourne['BEST_RSSI'] = melbourne_rssi
-            best_melbourne['BEST_Thrpt'] = melbourne_thrpt
-            best_melbourne['BEST_BER_MQAM'] = melbourne_ber_mqam
-            best_melbourne['BEST_BER_QPSK'] = melbourne_ber_qpsk
-            best_melbourne['BEST_Latency'] = melbourne_latency
-        elif pd.notna(melbourne_snr) and melbourne_snr == best_melbourne['BEST_SNR']:
-            # Handle ties - you might want a specific tie-breaking logic
-            pass
-
-    results.append({
-        'Time': row['Time'],
-        'Sydney_Best_SAT_ID': best_sydney['SAT_ID'],
-        'Sydney_BEST_SNR': best_sydney['BEST_SNR'],
-        'Sydney_BEST_RSSI': best_sydney['BEST_RSSI'],
-        'Sydney_BEST_Thrpt': best_sydney['BEST_Thrpt'] / (1024 * 1024),  # Convert to Mbps
-        'Sydney_BEST_BER_MQAM': best_sydney['BEST_BER_MQAM'],
-        'Sydney_BEST_BER_QPSK': best_sydney['BEST_BER_QPSK'],
-        'Sydney_BEST_Latency': best_sydney['BEST_Latency'] * 1000,  # Convert to ms,
-        'Melbourne_Best_SAT_ID': best_melbourne['SAT_ID'],
-        'Melbourne_BEST_SNR': best_melbourne['BEST_SNR'],
-        'Melbourne_BEST_RSSI': best_melbourne['BEST_RSSI'],
-        'Melbourne_BEST_Thrpt': best_melbourne['BEST_Thrpt'] / (1024 * 1024),  # Convert to Mbps
-        'Melbourne_BEST_BER_MQAM': best_melbourne['BEST_BER_MQAM'],
-        'Melbourne_BEST_BER_QPSK': best_melbourne['BEST_BER_QPSK'],
-        'Melbourne_BEST_Latency': best_melbourne['BEST_Latency'] * 1000,  # Convert to ms
-    })
-
-# Create the new DataFrame
-best_sinr_df = pd.DataFrame(results)
+# Best satellite per time step for each station (ties go to the lowest satellite number)
+best_sinr_df = select_best_satellite(cube, ['Sydney', 'Melbourne'], metric='SNR_dB')
 
 print(best_sinr_df)
 
@@ -257,238 +189,38 @@ all_TimeOut_cols = [col for col in df.columns if re.search(r'TimeOut$', col)]
 # df[all_Latency_cols] = df[all_Latency_cols] * 1000 # Convert to Mbps
 
 # %%
-# Loop over each satellite in possible_sat_conn_ids
-for sat_id in possible_sat_conn_ids:
-    # Build Latency column names
-    sydney_Latency_col = f'{sat_id}_Sydney_Latency'
-    melbourne_Latency_col = f'{sat_id}_Melbourne_Latency'
-
-    # Check which Latency columns exist
-    sydney_exists = sydney_Latency_col in df.columns
-    melbourne_exists = melbourne_Latency_col in df.columns
-
-    # Skip if neither exists
-    if not sydney_exists and not melbourne_exists:
-        continue
-    temp_tagged_folder = os.path.join(tagged_folder, "Latency")
-    # Plot 
-    if sydney_exists:
-        plot_line_comparison(
-            df,
-            columns=[sydney_Latency_col],
-            labels=[sydney_Latency_col],
+from utils.plotter import render_batch, sat_metric_jobs
+
+# One figure per satellite and station for each metric:
+# (metric column suffix, sub folder, file tag, y label, title)
+sat_plots = [
+    ('Latency', 'Latency', 'latency', 'Latency (ms)', 'Latency for Starlink Satellites'),
+    ('Throughput', 'thrpt', 'thrpt', 'Thrpt (Mbps)', 'Thrpt for Starlink Satellites'),
+    ('SNR_dB', 'SNR', 'SNR', 'SNR (dBm)', 'SNR for Starlink Satellites'),
+    ('BER_QPSK', 'BER_QPSK', 'BER_QPSK', 'BER_QPSK', 'BER_QPSK for Starlink Satellites'),
+    ('BER_MQAM', 'BER_MQAM', 'BER_MQAM', 'BER_MQAM ', 'BER_MQAM for Starlink Satellites'),
+    ('RSSI_dBm', 'RSSI', 'RSSI', 'RSSI(dBm)', 'RSSI for Starlink Satellites'),
+]
+
+# Rendering runs on a process pool (one worker per CPU). Spawned workers re-import
+# this script as '__mp_main__', so the guard keeps them from building and
+# rendering the jobs again.
+if __name__ == '__main__':
+    jobs = []
+    for metric, sub_folder, file_tag, ylabel, title in sat_plots:
+        jobs += sat_metric_jobs(
+            cube,
+            sat_ids=possible_sat_conn_ids,
+            stations=['Sydney', 'Melbourne'],
+            metric=metric,
             xlabel='Time (m)',
-            ylabel='Latency (ms)',
-            title=f'Latency for Starlink Satellites',
-            filename=f"{extra_tag}_{sat_id}_Sydney_latency",
-            folder=temp_tagged_folder
-        )
-    if melbourne_exists:
-        plot_line_comparison(
-            df,
-            columns=[melbourne_Latency_col],
-            labels=[melbourne_Latency_col],
-            xlabel='Time (m) ',
-            ylabel='Latency (ms)',
-            title=f'Latency for Starlink Satellites',
-            filename=f"{extra_tag}_{sat_id}_Melbourne_latency",
-            folder=temp_tagged_folder
+            ylabel=ylabel,
+            title=title,
+            filename=f"{extra_tag}_{{sat_id}}_{{station}}_{file_tag}",
+            folder=os.path.join(tagged_folder, sub_folder)
         )
 
-# %%
-# Loop over each satellite in possible_sat_conn_ids
-for sat_id in possible_sat_conn_ids:
-    # Build Thrpt column names
-    sydney_Thrpt_col = f'{sat_id}_Sydney_Throughput'
-    melbourne_Thrpt_col = f'{sat_id}_Melbourne_Throughput'
-
-    # Check which Thrpt columns exist
-    sydney_exists = sydney_Thrpt_col in df.columns
-    melbourne_exists = melbourne_Thrpt_col in df.columns
-
-    # Skip if neither exists
-    if not sydney_exists and not melbourne_exists:
-        continue
-    temp_tagged_folder = os.path.join(tagged_folder, "thrpt")
-    # Plot 
-    if sydney_exists:
-        plot_line_comparison(
-            df,
-            columns=[sydney_Thrpt_col],
-            labels=[sydney_Thrpt_col],
-            xlabel='Time (m)',
-            ylabel='Thrpt (Mbps)',
-            title=f'Thrpt for Starlink Satellites',
-            filename=f"{extra_tag}_{sat_id}_Sydney_thrpt",
-            folder=temp_tagged_folder
-        )
-    if melbourne_exists:
-        plot_line_comparison(
-            df,
-            columns=[melbourne_Thrpt_col],
-            labels=[melbourne_Thrpt_col],
-            xlabel='Time (m) ',
-            ylabel='Thrpt (Mbps)',
-            title=f'Thrpt for Starlink Satellites',
-            filename=f"{extra_tag}_{sat_id}_Melbourne_thrpt",
-            folder=temp_tagged_folder
-        )
-
-# %%
-# Loop over each satellite in possible_sat_conn_ids
-for sat_id in possible_sat_conn_ids:
-    # Build SNR column names
-    sydney_SNR_col = f'{sat_id}_Sydney_SNR_dB'
-    melbourne_SNR_col = f'{sat_id}_Melbourne_SNR_dB'
-
-    # Check which SNR columns exist
-    sydney_exists = sydney_SNR_col in df.columns
-    melbourne_exists = melbourne_SNR_col in df.columns
-
-    # Skip if neither exists
-    if not sydney_exists and not melbourne_exists:
-        continue
-    # Plot 
-    temp_tagged_folder = os.path.join(tagged_folder, "SNR")
-    if sydney_exists:
-        plot_line_comparison(
-            df,
-            columns=[sydney_SNR_col],
-            labels=[sydney_SNR_col],
-            xlabel='Time (m)',
-            ylabel='SNR (dBm)',
-            title=f'SNR for Starlink Satellites',
-            filename=f"{extra_tag}_{sat_id}_Sydney_SNR",
-            folder=temp_tagged_folder
-        )
-    if melbourne_exists:
-        plot_line_comparison(
-            df,
-            columns=[melbourne_SNR_col],
-            labels=[melbourne_SNR_col],
-            xlabel='Time (m) ',
-            ylabel='SNR (dBm)',
-            title=f'SNR for Starlink Satellites',
-            filename=f"{extra_tag}_{sat_id}_Melbourne_SNR",
-            folder=temp_tagged_folder
-        )
-
-# %%
-# Loop over each satellite in possible_sat_conn_ids
-for sat_id in possible_sat_conn_ids:
-    # Build BER_QPSK column names
-    sydney_BER_QPSK_col = f'{sat_id}_Sydney_BER_QPSK'
-    melbourne_BER_QPSK_col = f'{sat_id}_Melbourne_BER_QPSK'
-
-    # Check which BER_QPSK columns exist
-    sydney_exists = sydney_BER_QPSK_col in df.columns
-    melbourne_exists = melbourne_BER_QPSK_col in df.columns
-
-    # Skip if neither exists
-    if not sydney_exists and not melbourne_exists:
-        continue
-    # Plot 
-    temp_tagged_folder = os.path.join(tagged_folder, "BER_QPSK")
-    if sydney_exists:
-        plot_line_comparison(
-            df,
-            columns=[sydney_BER_QPSK_col],
-            labels=[sydney_BER_QPSK_col],
-            xlabel='Time (m)',
-            ylabel='BER_QPSK',
-            title=f'BER_QPSK for Starlink Satellites',
-            filename=f"{extra_tag}_{sat_id}_Sydney_BER_QPSK",
-            folder=temp_tagged_folder
-        )
-    if melbourne_exists:
-        plot_line_comparison(
-            df,
-            columns=[melbourne_BER_QPSK_col],
-            labels=[melbourne_BER_QPSK_col],
-            xlabel='Time (m) ',
-            ylabel='BER_QPSK',
-            title=f'BER_QPSK for Starlink Satellites',
-            filename=f"{extra_tag}_{sat_id}_Melbourne_BER_QPSK",
-            folder=temp_tagged_folder
-        )
-
-# %%
-# Loop over each satellite in possible_sat_conn_ids
-for sat_id in possible_sat_conn_ids:
-    # Build BER_MQAM column names
-    sydney_BER_MQAM_col = f'{sat_id}_Sydney_BER_MQAM'
-    melbourne_BER_MQAM_col = f'{sat_id}_Melbourne_BER_MQAM'
-
-    # Check which BER_MQAM columns exist
-    sydney_exists = sydney_BER_MQAM_col in df.columns
-    melbourne_exists = melbourne_BER_MQAM_col in df.columns
-
-    # Skip if neither exists
-    if not sydney_exists and not melbourne_exists:
-        continue
-    # Plot 
-    temp_tagged_folder = os.path.join(tagged_folder, "BER_MQAM")
-    if sydney_exists:
-        plot_line_comparison(
-            df,
-            columns=[sydney_BER_MQAM_col],
-            labels=[sydney_BER_MQAM_col],
-            xlabel='Time (m)',
-            ylabel='BER_MQAM ',
-            title=f'BER_MQAM for Starlink Satellites',
-            filename=f"{extra_tag}_{sat_id}_Sydney_BER_MQAM",
-            folder=temp_tagged_folder
-        )
-    if melbourne_exists:
-        plot_line_comparison(
-            df,
-            columns=[melbourne_BER_MQAM_col],
-            labels=[melbourne_BER_MQAM_col],
-            xlabel='Time (m) ',
-            ylabel='BER_MQAM ',
-            title=f'BER_MQAM for Starlink Satellites',
-            filename=f"{extra_tag}_{sat_id}_Melbourne_BER_MQAM",
-            folder=temp_tagged_folder
-        )
-
-# %%
-# Loop over each satellite in possible_sat_conn_ids
-for sat_id in possible_sat_conn_ids:
-    # Build RSSI column names
-    sydney_RSSI_col = f'{sat_id}_Sydney_RSSI_dBm'
-    melbourne_RSSI_col = f'{sat_id}_Melbourne_RSSI_dBm'
-
-    # Check which RSSI columns exist
-    sydney_exists = sydney_RSSI_col in df.columns
-    melbourne_exists = melbourne_RSSI_col in df.columns
-
-    # Skip if neither exists
-    if not sydney_exists and not melbourne_exists:
-        continue
-    # Plot 
-    temp_tagged_folder = os.path.join(tagged_folder, "RSSI")
-    if sydney_exists:
-        plot_line_comparison(
-            df,
-            columns=[sydney_RSSI_col],
-            labels=[sydney_RSSI_col],
-            xlabel='Time (m)',
-            ylabel='RSSI(dBm)',
-            title=f'RSSI for Starlink Satellites',
-            filename=f"{extra_tag}_{sat_id}_Sydney_RSSI",
-            folder=temp_tagged_folder
-        )
-    if melbourne_exists:
-        plot_line_comparison(
-            df,
-            columns=[melbourne_RSSI_col],
-            labels=[melbourne_RSSI_col],
-            xlabel='Time (m) ',
-            ylabel='RSSI(dBm)',
-            title=f'RSSI for Starlink Satellites',
-            filename=f"{extra_tag}_{sat_id}_Melbourne_RSSI",
-            folder=temp_tagged_folder
-        )
+    render_batch(jobs, workers=None)
 
 # %%
 df.head(2)
@@ -0,0 +1,224 @@
+"""
+satl4s: command-line pipeline over the satellite simulation logs.
+
+    python satl4s.py clean  --direction downlink
+    python satl4s.py best   --direction uplink --metric SNR_dB
+    python satl4s.py e2e    --src Melbourne --dst Sydney
+    python satl4s.py stats  --direction downlink
+    python satl4s.py plot   --direction downlink --workers 8
+    python satl4s.py export --input EndToEnd_Starlink_Performance.csv --prefix traces/e2e
+
+The log is DATA_FOLDER/LOG_NAME for --constellation and --direction, or --log
+(e2e reads both directions, or --uplink-log and --downlink-log).
+Only argparse and utils.config are imported at startup; every subcommand
+imports what it needs, and only `plot` imports matplotlib.
+"""
+import argparse
+import os
+import sys
+
+from utils.config import DATA_FOLDER, GRAPH_SAVE_FOLDER, LOG_NAME, STATIONS
+
+
+DIRECTIONS = ['downlink', 'uplink']
+
+# Per-satellite plots of main.py: (metric column suffix, sub folder, file tag, y label, title)
+SAT_PLOTS = [
+    ('Latency', 'Latency', 'latency', 'Latency (ms)', 'Latency for Starlink Satellites'),
+    ('Throughput', 'thrpt', 'thrpt', 'Thrpt (Mbps)', 'Thrpt for Starlink Satellites'),
+    ('SNR_dB', 'SNR', 'SNR', 'SNR (dBm)', 'SNR for Starlink Satellites'),
+    ('BER_QPSK', 'BER_QPSK', 'BER_QPSK', 'BER_QPSK', 'BER_QPSK for Starlink Satellites'),
+    ('BER_MQAM', 'BER_MQAM', 'BER_MQAM', 'BER_MQAM ', 'BER_MQAM for Starlink Satellites'),
+    ('RSSI_dBm', 'RSSI', 'RSSI', 'RSSI(dBm)', 'RSSI for Starlink Satellites'),
+]
+
+# Short names of the stats files, as rssi_stats.csv and snr_stats.csv of main.py
+STATS_NAMES = {'RSSI_dBm': 'rssi', 'SNR_dB': 'snr'}
+
+
+def log_path(args, direction=None):
+    """
+    Log of the arguments' constellation and direction, unless --log is given.
+
+    With an explicit `direction` (e2e) the override is --uplink-log or --downlink-log.
+    """
+    explicit = getattr(args, 'log', None) if direction is None else getattr(args, f'{direction}_log', None)
+    if explicit:
+        return explicit
+    name = LOG_NAME.format(constellation=args.constellation, direction=direction or args.direction)
+    return os.path.join(DATA_FOLDER, name)
+
+
+def tag(args):
+    """File tag of main.py, e.g. starlink_downlink."""
+    return f'{args.constellation}_{args.direction}'
+
+
+def cmd_clean(args):
+    from utils.process_data import process_data_streaming
+
+    out = args.out or f'Satellite_Australia_Simulation_Log_cleaned_{tag(args)}.csv'
+    process_data_streaming(log_path(args), out, args.stations)
+    print(f'Wrote {out}')
+
+
+def cmd_best(args):
+    from utils.loader import read_visible_log
+    from utils.selection import BEST_METRICS
+
+    df, _ = read_visible_log(log_path(args), args.stations, metrics=list(BEST_METRICS))
+    if args.schedule == 'greedy':
+        from utils.selection import select_best_satellite
+        best_df = select_best_satellite(df, args.stations, metric=args.metric)
+    else:
+        import numpy as np
+
+        from utils.handover import schedule_best_satellite
+        from utils.link_cube import LinkCube
+        best_df = schedule_best_satellite(LinkCube.from_frame(df, dtype=np.float64), args.stations, metric=args.metric)
+
+    out = args.out or f'{tag(args)}_Best_Satellite_Australia_Simulation_Log_cleaned.csv'
+    best_df.to_csv(out)
+    print(f'Wrote {out}')
+
+
+def cmd_e2e(args):
+    import numpy as np
+    import pandas as pd
+
+    from utils.end_to_end import LEG_METRICS, end_to_end, end_to_end_table
+    from utils.link_cube import LinkCube
+    from utils.loader import read_header
+    from utils.schema import Schema
+
+    def read(direction):
+        path = log_path(args, direction)
+        usecols = ['Time'] + Schema(read_header(path)).select(metrics=LEG_METRICS + [args.metric])
+        return LinkCube.from_frame(pd.read_csv(path, usecols=usecols)[usecols], dtype=np.float64)
+
+    uplink, downlink = read('uplink'), read('downlink')
+    if args.all_pairs:
+        result = end_to_end_table(uplink, downlink, metric=args.metric)
+        out = args.out or f'EndToEnd_{args.constellation.capitalize()}_Performance_AllPairs.csv'
+    else:
+        result = end_to_end(uplink, downlink, args.src, args.dst, metric=args.metric)
+        out = args.out or f'EndToEnd_{args.constellation.capitalize()}_Performance.csv'
+    result.to_csv(out, index=False)
+    print(f'Wrote {out}')
+
+
+def cmd_stats(args):
+    from utils.loader import read_visible_log
+
+    df, _ = read_visible_log(log_path(args), args.stations, metrics=args.metrics)
+    for metric in args.metrics:
+        columns = [col for col in df.columns if col.endswith(f'_{metric}')]
+        out = os.path.join(args.out or './', f'{STATS_NAMES.get(metric, metric.lower())}_stats.csv')
+        df[columns].describe().T.to_csv(out)
+        print(f'Wrote {out}')
+
+
+def cmd_plot(args):
+    import numpy as np
+
+    from utils.link_cube import LinkCube
+    from utils.loader import read_visible_log
+    from utils.plotter import render_batch, sat_metric_jobs
+
+    plots = [plot for plot in SAT_PLOTS if args.metrics is None or plot[0] in args.metrics]
+    df, sat_ids = read_visible_log(log_path(args), args.stations, metrics=[plot[0] for plot in plots])
+    cube = LinkCube.from_frame(df, dtype=np.float64)
+    tagged_folder = os.path.join(args.out or GRAPH_SAVE_FOLDER, tag(args))
+
+    jobs = []
+    for metric, sub_folder, file_tag, ylabel, title in plots:
+        jobs += sat_metric_jobs(
+            cube,
+            sat_ids=sat_ids,
+            stations=args.stations,
+            metric=metric,
+            xlabel='Time (m)',
+            ylabel=ylabel,
+            title=title,
+            filename=f"{tag(args)}_{{sat_id}}_{{station}}_{file_tag}",
+            folder=os.path.join(tagged_folder, sub_folder)
+        )
+    render_batch(jobs, workers=args.workers)
+
+
+def cmd_export(args):
+    import pandas as pd
+
+    from utils.traces import best_satellite_series, end_to_end_series, export_traces
+
+    df = pd.read_csv(args.input)
+    series = best_satellite_series(df, args.station) if args.station else end_to_end_series(df)
+    prefix = args.prefix or os.path.splitext(os.path.basename(args.input))[0]
+    # Unset options keep each writer's own default (e.g. hold steps for netem)
+    trace_kwargs = {name: value for name, value in [('interpolation', args.interpolation), ('spike_ms', args.spike_ms),
+                                                    ('outage_ms', args.outage_ms)] if value is not None}
+    results = export_traces(series, prefix, args.formats, **trace_kwargs)
+    for name, result in results.items():
+        print(f'{name}: {result}')
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='satl4s', description='Satellite log pipeline for L4S/AQM studies.')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    def log_command(name, func, help_text):
+        command = sub.add_parser(name, help=help_text)
+        command.add_argument('--constellation', default='starlink', help='Log constellation tag (default: starlink)')
+        command.add_argument('--direction', choices=DIRECTIONS, default='downlink')
+        command.add_argument('--log', help='Log path, overrides --constellation/--direction')
+        command.add_argument('--stations', nargs='+', default=list(STATIONS))
+        command.add_argument('--out', help='Output file (folder for stats and plot)')
+        command.set_defaults(func=func)
+        return command
+
+    log_command('clean', cmd_clean, 'Drop empty columns and unconnectable satellites, convert units')
+
+    best = log_command('best', cmd_best, 'Best satellite per time step and station')
+    best.add_argument('--metric', default='SNR_dB')
+    best.add_argument('--schedule', choices=['greedy', 'viterbi'], default='greedy',
+                      help='Per-step best, or the handover-aware schedule')
+
+    e2e = sub.add_parser('e2e', help='End-to-end uplink -> downlink metrics')
+    e2e.add_argument('--constellation', default='starlink', help='Log constellation tag (default: starlink)')
+    e2e.add_argument('--uplink-log', help='Uplink log path, overrides --constellation')
+    e2e.add_argument('--downlink-log', help='Downlink log path, overrides --constellation')
+    e2e.add_argument('--out', help='Output file')
+    e2e.set_defaults(func=cmd_e2e)
+    e2e.add_argument('--src', default='Melbourne')
+    e2e.add_argument('--dst', default='Sydney')
+    e2e.add_argument('--metric', default='SNR_dB')
+    e2e.add_argument('--all-pairs', action='store_true', help='Every station pair in long format')
+
+    stats = log_command('stats', cmd_stats, 'describe() of per-satellite metrics')
+    stats.add_argument('--metrics', nargs='+', default=['RSSI_dBm', 'SNR_dB'])
+
+    plot = log_command('plot', cmd_plot, 'Per-satellite metric plots')
+    plot.add_argument('--metrics', nargs='+', help='Metrics to plot (default: all of SAT_PLOTS)')
+    plot.add_argument('--workers', type=int, default=None, help='Render processes (default: CPU count)')
+
+    export = sub.add_parser('export', help='Emulator traces from a best-satellite or end-to-end CSV')
+    export.add_argument('--input', required=True, help='Output of best (with --station) or e2e')
+    export.add_argument('--station', help='Station of a best-satellite CSV')
+    export.add_argument('--prefix', help='Output path prefix (default: input name)')
+    export.add_argument('--formats', nargs='+', choices=['mahimahi', 'netem', 'ns3'],
+                        default=['mahimahi', 'netem', 'ns3'])
+    export.add_argument('--interpolation', choices=['linear', 'hold'],
+                        help='Between log samples (default: hold for netem, linear for the others)')
+    export.add_argument('--spike-ms', type=float, help='Extra delay after a handover (default: 30)')
+    export.add_argument('--outage-ms', type=float, help='Zero capacity after a handover (default: 0)')
+    export.set_defaults(func=cmd_export)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,43 @@
+"""Link budget against the shipped P07 logs, run with `python -m pytest` from Graph Viz."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.attenuation import AttenuationTable
+from utils.config import DATA_FOLDER, LOG_NAME
+from utils.fading import fading_loss_db
+from utils.link_budget import DOWNLINK, UPLINK, budget_cube
+from utils.link_cube import LinkCube
+from utils.selection import select_best_satellite
+
+
+def read_cube(direction):
+    path = f"{DATA_FOLDER}{LOG_NAME.format(constellation='starlink', direction=direction)}"
+    return LinkCube.from_frame(pd.read_csv(path), dtype=np.float64)
+
+
+@pytest.mark.parametrize('direction, params, clear_sky_gap', [
+    ('downlink', DOWNLINK, 29.7),
+    ('uplink', UPLINK, 43.4),
+])
+def test_budget_reproduces_log(direction, params, clear_sky_gap):
+    cube = read_cube(direction)
+    logged_snr = cube.sel(metric='SNR_dB')
+
+    clear_sky = budget_cube(cube, params)
+    np.testing.assert_allclose(clear_sky.sel(metric='Latency')[cube.access], cube.sel(metric='Latency')[cube.access],
+                               rtol=3e-3)
+    gap = np.nanmean((clear_sky.sel(metric='SNR_dB') - logged_snr)[cube.access])
+    assert gap == pytest.approx(clear_sky_gap, abs=0.5)
+
+    table = AttenuationTable.from_log(cube, params)
+    budget = budget_cube(cube, params, atmos_loss_db=table.atmos_loss(cube, params),
+                         fading_db=fading_loss_db(cube.access.shape, rng=0))
+    assert abs(np.nanmean((budget.sel(metric='SNR_dB') - logged_snr)[cube.access])) < 0.5
+
+    # Best satellite per step: mean SNR within 0.3 dB of the log
+    ours = select_best_satellite(budget, cube.stations)
+    logged = select_best_satellite(cube, cube.stations)
+    for station in cube.stations:
+        column = f'{station}_BEST_SNR'
+        assert ours[column].mean() == pytest.approx(logged[column].mean(), abs=0.3)
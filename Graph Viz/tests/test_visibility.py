@@ -0,0 +1,34 @@
+"""VisibilityIndex against a brute-force elevation pass, run with `python -m pytest` from Graph Viz."""
+import numpy as np
+import pytest
+
+from utils import visibility
+from utils.geometry import look_angles
+from utils.visibility import VisibilityIndex
+
+
+ALTITUDE = 547e3  # m
+
+
+@pytest.mark.parametrize('station_lat, station_lon, min_elevation', [
+    (10.0, -178.0, 10.0),
+    (-20.0, 175.0, 25.0),
+    (-33.8688, 151.2093, 0.0),
+])
+def test_visible_matches_brute_force(monkeypatch, station_lat, station_lon, min_elevation):
+    monkeypatch.setitem(visibility.STATIONS, 'Test', (station_lat, station_lon))
+    rng = np.random.default_rng(0)
+    shape = (20, 5000)
+    lat = np.degrees(np.arcsin(rng.uniform(-1, 1, shape)))
+    lon = rng.uniform(-180, 180, shape)
+
+    index = VisibilityIndex(lat, lon, ALTITUDE, min_elevation)
+    _, elevation = look_angles(lat, lon, ALTITUDE, [station_lat], [station_lon])
+    expected = elevation[..., 0] >= min_elevation
+    assert expected.any()
+
+    for t in range(shape[0]):
+        np.testing.assert_array_equal(index.visible('Test', t), np.flatnonzero(expected[t]))
+
+    access = index.access(['Test'])[..., 0]
+    np.testing.assert_array_equal(access, expected)
@@ -0,0 +1,420 @@
+import math
+from dataclasses import dataclass, replace
+
+import numpy as np
+import pandas as pd
+
+from utils.traces import MBPS, MTU_BYTES, iter_trace
+
+# Optional requirement: numba (pip install numba) compiles the per-ms queue loop,
+# plain Python runs the same loop otherwise
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+
+TRAFFIC_CLASSES = ['L4S', 'Classic', 'Unresponsive']
+PERCENTILES = [50, 90, 99, 99.9]
+BASE_RTT_MS = 20.0       # Terrestrial part of the round trip, added to twice the one-way link delay
+INITIAL_WINDOW = 10.0    # Congestion window of every flow at the start, packets
+RING_MS = 1 << 16        # Queue ring length per traffic class, the longest sojourn that can be held
+FEEDBACK_MS = 1 << 12    # Congestion-signal history, the longest RTT a sender can react over
+HISTOGRAM_MS = 4096      # Sojourn histogram bins of 1 ms, the last one collects longer sojourns
+
+
+@dataclass(frozen=True)
+class AqmParams:
+    """
+    Bottleneck AQM parameters, defaults of RFC 9332 (DualPI2) and RFC 8290/8289 (FQ-CoDel).
+
+    DualPI2 serves its L4S queue before the classic queue unless the
+    classic head is older by more than tshift_ms (time-shifted FIFO).
+    """
+    aqm: str                          # 'dualpi2' or 'fq_codel'
+    limit_packets: int = 10000        # Shared queue limit, tail drop above it
+    mss: int = MTU_BYTES              # Packet size, bytes
+    pi2_target_ms: float = 15.0       # Classic queue delay target
+    pi2_tupdate_ms: int = 16          # PI update interval
+    pi2_alpha: float = 0.16           # Integral gain, Hz
+    pi2_beta: float = 3.2             # Proportional gain, Hz
+    pi2_coupling: float = 2.0         # k, L4S marking = k * base probability
+    l4s_step_ms: float = 1.0          # Native L4S marking threshold
+    tshift_ms: float = 30.0           # Time shift of the classic queue in the scheduler
+    codel_target_ms: float = 5.0
+    codel_interval_ms: float = 100.0
+    ce_threshold_ms: float = 0.0      # fq_codel ce_threshold for ECN flows, 0 = off
+
+    def with_changes(self, **changes):
+        """Copy with some parameters changed, e.g. DUALPI2.with_changes(pi2_target_ms=5)."""
+        return replace(self, **changes)
+
+
+DUALPI2 = AqmParams('dualpi2')
+FQ_CODEL = AqmParams('fq_codel')
+
+
+def _run_queue(capacity, link_rtt, fq, n_l4s, n_classic, unresponsive, mss, limit,
+               target, tupdate, alpha, beta, coupling, step, tshift, codel_target, codel_interval, ce_threshold,
+               ring_bytes, ring_time, hist, totals, signals, queue_delay, backlog_out):
+    # Discrete-time fluid queue, one step per ms. Written in the subset shared by
+    # numba and plain Python: every argument is an array or list of numbers.
+    # link_rtt is the RTT without the queue, 2 x link delay + base RTT, per ms.
+    ring = len(ring_bytes) // 3
+    n_hist = len(hist) // 3
+    n_feedback = len(signals) // 6
+    # The unresponsive queue stays empty without its traffic, so it is not visited
+    n_queues = 3 if unresponsive > 0 else 2
+    flows = [n_l4s, n_classic]
+    # Per-flow queues in FQ mode: a class of n identical flows is held as one flow
+    scale = [1.0, 1.0, 1.0]
+    if fq:
+        scale[0] = float(max(n_l4s, 1))
+        scale[1] = float(max(n_classic, 1))
+    window = [INITIAL_WINDOW, INITIAL_WINDOW]
+    head = [0, 0, 0]
+    size = [0, 0, 0]
+    backlog = [0.0, 0.0, 0.0]
+    arrivals = [0.0, 0.0, 0.0]
+    arrived = [0.0, 0.0, 0.0]
+    dropped = [0.0, 0.0, 0.0]
+    marked = [0.0, 0.0, 0.0]
+    delivered = [0.0, 0.0, 0.0]
+    share = [0.0, 0.0, 0.0]
+    active = [False, False, False]
+    p_base = 0.0
+    prev_qdelay = 0.0
+    first_above = [-1.0, -1.0, -1.0]
+    dropping = [False, False, False]
+    drop_next = [0.0, 0.0, 0.0]
+    count = [0, 0, 0]
+    last_count = [0, 0, 0]
+
+    for t in range(len(capacity)):
+        # Senders: fluid window per flow, reacting to the signals of one RTT ago
+        for c in range(2):
+            if flows[c] == 0:
+                arrivals[c] = 0.0
+                continue
+            rtt = link_rtt[t]
+            if size[c] > 0:
+                rtt += t - ring_time[c * ring + head[c]]
+            if rtt < 1.0:
+                rtt = 1.0
+            lag = int(rtt)
+            if lag >= n_feedback:
+                lag = n_feedback - 1
+            slot = c * n_feedback + (t - lag) % n_feedback
+            # Scalable: -1/2 packet per mark, both: halve per loss, +1 packet per RTT
+            w = window[c]
+            w = w + 1.0 / rtt - w / rtt * (signals[slot] * 0.5 + signals[3 * n_feedback + slot] * w * 0.5)
+            if w < 1.0:
+                w = 1.0
+            window[c] = w
+            arrivals[c] = flows[c] * w * mss / rtt
+        arrivals[2] = unresponsive
+
+        # Enqueue, with the DualPI2 classic drop (p^2) and the shared limit
+        total_backlog = backlog[0] * scale[0] + backlog[1] * scale[1] + backlog[2] * scale[2]
+        for q in range(n_queues):
+            dropped[q] = 0.0
+            marked[q] = 0.0
+            delivered[q] = 0.0
+            a = arrivals[q]
+            if a <= 0:
+                arrived[q] = 0.0
+                continue
+            arrived[q] = a
+            lost = 0.0
+            if not fq and q > 0:
+                lost = a * p_base * p_base
+            room = limit - total_backlog
+            if room < 0.0:
+                room = 0.0
+            if a - lost > room:
+                lost = a - room
+            if size[q] == ring:
+                lost = a
+            dropped[q] = lost
+            a -= lost
+            if a > 0:
+                j = q * ring + (head[q] + size[q]) % ring
+                ring_bytes[j] = a / scale[q]
+                ring_time[j] = t
+                size[q] += 1
+                backlog[q] += a / scale[q]
+                total_backlog += a
+
+        budget = capacity[t]
+        if not fq:
+            # Time-shifted FIFO between the L4S queue and the oldest classic head
+            l4s_mark = coupling * p_base
+            if l4s_mark > 1.0:
+                l4s_mark = 1.0
+            while budget > 1e-9:
+                c = -1
+                oldest = 0
+                for q in range(1, n_queues):
+                    if size[q] > 0:
+                        arrival = ring_time[q * ring + head[q]]
+                        if c < 0 or arrival < oldest:
+                            c = q
+                            oldest = arrival
+                q = c
+                if size[0] > 0 and (c < 0 or ring_time[head[0]] <= oldest + tshift):
+                    q = 0
+                if q < 0:
+                    break
+                j = q * ring + head[q]
+                sojourn = t - ring_time[j]
+                take = ring_bytes[j]
+                if budget < take:
+                    take = budget
+                if q == 0:
+                    marked[0] += take if sojourn >= step else take * l4s_mark
+                delivered[q] += take
+                hist[q * n_hist + (sojourn if sojourn < n_hist else n_hist - 1)] += take
+                budget -= take
+                ring_bytes[j] -= take
+                backlog[q] -= take
+                if ring_bytes[j] <= 1e-9:
+                    backlog[q] -= ring_bytes[j]
+                    head[q] = (head[q] + 1) % ring
+                    size[q] -= 1
+
+            if (t + 1) % tupdate == 0:
+                qdelay = 0.0
+                for q in range(n_queues):
+                    if size[q] > 0:
+                        qdelay = max(qdelay, float(t - ring_time[q * ring + head[q]]))
+                p_base += alpha * (qdelay - target) + beta * (qdelay - prev_qdelay)
+                p_base = min(max(p_base, 0.0), 1.0)
+                prev_qdelay = qdelay
+        else:
+            # Fair share between the backlogged flows (water-filling), then CoDel per flow queue
+            for q in range(n_queues):
+                share[q] = 0.0
+                active[q] = size[q] > 0
+            remaining = budget
+            for _ in range(3):
+                weights = 0.0
+                for q in range(n_queues):
+                    if active[q]:
+                        weights += scale[q]
+                if weights == 0.0 or remaining <= 0:
+                    break
+                per_flow = remaining / weights
+                saturated = False
+                for q in range(n_queues):
+                    if active[q] and backlog[q] <= per_flow:
+                        share[q] = backlog[q] * scale[q]
+                        remaining -= share[q]
+                        active[q] = False
+                        saturated = True
+                if not saturated:
+                    for q in range(n_queues):
+                        if active[q]:
+                            share[q] = per_flow * scale[q]
+                    break
+
+            for q in range(n_queues):
+                if size[q] == 0:
+                    first_above[q] = -1.0
+                    dropping[q] = False
+                    continue
+                sojourn = t - ring_time[q * ring + head[q]]
+                ok_to_drop = False
+                if sojourn < codel_target or backlog[q] <= mss:
+                    first_above[q] = -1.0
+                elif first_above[q] < 0:
+                    first_above[q] = t + codel_interval
+                elif t >= first_above[q]:
+                    ok_to_drop = True
+
+                signal = 0
+                if dropping[q]:
+                    if not ok_to_drop:
+                        dropping[q] = False
+                    while dropping[q] and t >= drop_next[q]:
+                        signal += 1
+                        count[q] += 1
+                        drop_next[q] += codel_interval / math.sqrt(count[q])
+                elif ok_to_drop:
+                    dropping[q] = True
+                    signal = 1
+                    delta = count[q] - last_count[q]
+                    count[q] = delta if delta > 1 and t - drop_next[q] < 16 * codel_interval else 1
+                    drop_next[q] = t + codel_interval / math.sqrt(count[q])
+                    last_count[q] = count[q]
+
+                if q == 0:
+                    marked[0] += signal * mss * scale[0]  # ECN-capable: marked, not dropped
+                elif signal > 0:
+                    # One packet per signal from the head of the flow queue
+                    lose = min(float(signal * mss), backlog[q])
+                    dropped[q] += lose * scale[q]
+                    backlog[q] -= lose
+                    while lose > 1e-9 and size[q] > 0:
+                        j = q * ring + head[q]
+                        cut = min(lose, ring_bytes[j])
+                        ring_bytes[j] -= cut
+                        lose -= cut
+                        if ring_bytes[j] <= 1e-9:
+                            head[q] = (head[q] + 1) % ring
+                            size[q] -= 1
+
+                amount = min(share[q] / scale[q], backlog[q])
+                while amount > 1e-9 and size[q] > 0:
+                    j = q * ring + head[q]
+                    sojourn = t - ring_time[j]
+                    take = ring_bytes[j]
+                    if amount < take:
+                        take = amount
+                    if q == 0 and 0 < ce_threshold < sojourn:
+                        marked[0] += take * scale[0]
+                    delivered[q] += take * scale[q]
+                    hist[q * n_hist + (sojourn if sojourn < n_hist else n_hist - 1)] += take * scale[q]
+                    amount -= take
+                    ring_bytes[j] -= take
+                    backlog[q] -= take
+                    if ring_bytes[j] <= 1e-9:
+                        backlog[q] -= ring_bytes[j]
+                        head[q] = (head[q] + 1) % ring
+                        size[q] -= 1
+
+        # Totals and the signal fractions the senders will see one RTT later
+        qdelay = 0.0
+        total_backlog = 0.0
+        slot = t % n_feedback
+        for q in range(n_queues):
+            totals[q * 4] += arrived[q]
+            totals[q * 4 + 1] += delivered[q]
+            totals[q * 4 + 2] += dropped[q]
+            totals[q * 4 + 3] += marked[q]
+            total_backlog += backlog[q] * scale[q]
+            if size[q] > 0 and t - ring_time[q * ring + head[q]] > qdelay:
+                qdelay = float(t - ring_time[q * ring + head[q]])
+            if q < 2:
+                signals[slot] = marked[q] / delivered[q] if delivered[q] > 0 else 0.0
+                signals[3 * n_feedback + slot] = dropped[q] / arrived[q] if arrived[q] > 0 else 0.0
+                slot += n_feedback
+        queue_delay[t] = qdelay
+        backlog_out[t] = total_backlog
+
+
+if njit is not None:
+    _run_queue = njit(cache=True)(_run_queue)
+
+
+def millisecond_trace(series, **trace_kwargs) -> dict:
+    """The whole iter_trace of a link_series at 1 ms as arrays: 't_ms', 'rate_mbps', 'delay_ms', 'handover'."""
+    trace_kwargs['step_ms'] = 1
+    chunks = list(iter_trace(series, **trace_kwargs))
+    return {key: np.concatenate([chunk[key] for chunk in chunks]) for key in chunks[0]}
+
+
+def _percentiles(hist):
+    # Sojourn percentiles (ms) from a byte-weighted histogram of 1 ms bins
+    total = hist.sum()
+    if total <= 0:
+        return [np.nan] * len(PERCENTILES)
+    cumulative = np.cumsum(hist) / total
+    return [float(np.searchsorted(cumulative, p / 100 - 1e-12)) for p in PERCENTILES]
+
+
+def simulate_queue(series, params=DUALPI2, l4s_flows=1, classic_flows=1, unresponsive_mbps=0.0,
+                   base_rtt_ms=BASE_RTT_MS, **trace_kwargs) -> dict:
+    """
+    Discrete-time bottleneck queue under DualPI2 or FQ-CoDel, driven by a link capacity/latency series.
+
+    The bottleneck serves the link capacity every millisecond. Traffic is
+    fluid: each L4S flow is a scalable sender (half a packet less per
+    mark, as Prague/DCTCP), each classic flow a Reno-like sender (halve per
+    loss, not ECN-capable), both adding one packet per RTT; unresponsive
+    traffic arrives at a fixed rate. Senders see the marks and drops one
+    RTT late, with RTT = 2 x link delay + base_rtt_ms + queue delay, so
+    the handover delay spikes of the trace reach the control loop.
+
+    DualPI2 couples the classic drop probability p^2 with the L4S marking
+    k*p, plus the native L4S step at l4s_step_ms. FQ-CoDel gives every flow
+    its own CoDel queue and an equal share of the capacity; identical flows
+    of a class are simulated once. Queue state is kept in 1 ms bins, so
+    sojourn times have 1 ms resolution.
+
+    The inner loop is compiled with numba when it is installed (pip install
+    numba, recommended for sweeps). Without it the same loop runs as plain
+    Python on lists at 10-30 us per simulated ms: a 30-minute trace takes
+    20-30 s per run on a fast machine and about a minute on a slow one,
+    FQ-CoDel about 40% longer than DualPI2.
+
+    Parameters:
+        series (dict): link_series, or a millisecond_trace to skip the interpolation.
+        params (AqmParams): DUALPI2, FQ_CODEL or a variant of them.
+        l4s_flows, classic_flows (int): Responsive flows per class.
+        unresponsive_mbps (float): Fixed-rate classic traffic.
+        base_rtt_ms (float): RTT added to the link delays.
+        trace_kwargs: Options of iter_trace (step_ms is fixed at 1).
+
+    Returns:
+        dict: 'summary' (one row per traffic class with Throughput_Mbps, Sojourn_p{50,90,99,99.9}_ms,
+        Drop_Rate and Mark_Rate of the bytes), 'utilisation' of the capacity, and per ms
+        'queue_delay_ms' (oldest head sojourn) and 'backlog_bytes'.
+    """
+    if params.aqm not in ('dualpi2', 'fq_codel'):
+        raise ValueError(f"Unknown AQM '{params.aqm}', use 'dualpi2' or 'fq_codel'")
+    trace = series if 't_ms' in series else millisecond_trace(series, **trace_kwargs)
+    capacity = trace['rate_mbps'] * MBPS / 8 / 1000  # Bytes per ms
+    link_rtt = 2 * np.asarray(trace['delay_ms'], dtype=float) + base_rtt_ms
+    n_time = len(capacity)
+
+    arrays = {
+        'ring_bytes': np.zeros(3 * RING_MS),
+        'ring_time': np.zeros(3 * RING_MS, dtype=np.int64),
+        'hist': np.zeros(3 * HISTOGRAM_MS),
+        'totals': np.zeros(12),
+        'signals': np.zeros(6 * FEEDBACK_MS),
+        'queue_delay': np.zeros(n_time),
+        'backlog': np.zeros(n_time),
+    }
+    if njit is None:
+        # Plain Python indexes lists much faster than numpy arrays
+        capacity, link_rtt = capacity.tolist(), link_rtt.tolist()
+        arrays = {name: array.tolist() for name, array in arrays.items()}
+
+    _run_queue(capacity, link_rtt, params.aqm == 'fq_codel', int(l4s_flows), int(classic_flows),
+               unresponsive_mbps * MBPS / 8 / 1000, params.mss, params.limit_packets * params.mss,
+               params.pi2_target_ms, params.pi2_tupdate_ms,
+               # Gains per update on delays in ms, applied per Tupdate as in Linux sch_dualpi2
+               params.pi2_alpha / 1000, params.pi2_beta / 1000,
+               params.pi2_coupling, params.l4s_step_ms, params.tshift_ms,
+               params.codel_target_ms, params.codel_interval_ms, params.ce_threshold_ms,
+               arrays['ring_bytes'], arrays['ring_time'], arrays['hist'], arrays['totals'], arrays['signals'],
+               arrays['queue_delay'], arrays['backlog'])
+
+    totals = np.asarray(arrays['totals']).reshape(3, 4)
+    hist = np.asarray(arrays['hist']).reshape(3, HISTOGRAM_MS)
+    duration_s = n_time / 1000
+    rows = []
+    for q, name in enumerate(TRAFFIC_CLASSES):
+        arrived, delivered, dropped, marked = totals[q]
+        if arrived <= 0:
+            continue
+        row = {
+            'Class': name,
+            'Flows': [l4s_flows, classic_flows, 1][q],
+            'Offered_Mbps': arrived * 8 / duration_s / MBPS,
+            'Throughput_Mbps': delivered * 8 / duration_s / MBPS,
+        }
+        for p, value in zip(PERCENTILES, _percentiles(hist[q])):
+            row[f'Sojourn_p{p:g}_ms'] = value
+        row['Drop_Rate'] = dropped / arrived
+        row['Mark_Rate'] = marked / delivered if delivered > 0 else np.nan
+        rows.append(row)
+
+    served = float(np.sum(capacity))
+    return {
+        'summary': pd.DataFrame(rows),
+        'utilisation': totals[:, 1].sum() / served if served > 0 else np.nan,
+        'queue_delay_ms': np.asarray(arrays['queue_delay']),
+        'backlog_bytes': np.asarray(arrays['backlog']),
+    }
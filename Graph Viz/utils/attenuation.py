@@ -0,0 +1,327 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from utils.config import CACHE_FOLDER, P840_FILE, STATIONS
+from utils.geometry import look_angles
+from utils.fading import FADING_MODEL, RICIAN_K_DB, fading_loss_db
+from utils.link_budget import DOWNLINK, UPLINK, LinkParams, budget_cube
+
+# Optional requirements: itur (pip install itur) for the P.618 total attenuation
+# that P07 applies, scipy (pip install scipy) to read p840.mat for the cloud term
+try:
+    import itur
+except ImportError:
+    itur = None
+
+try:
+    from scipy.io import loadmat
+except ImportError:
+    loadmat = None
+
+
+# p618Config of P07_SelectiveLogging.m
+EXCEEDANCE = 0.001           # TotalAnnualExceedance, %
+MIN_ELEVATION = 5.0          # ElevationAngle = max(el, 5)
+MIN_FREQ = 4e9               # Frequency = max(baseFreq, 4e9)
+ANTENNA_DIAMETER = 1.0       # p618Config AntennaDiameter default, m
+ANTENNA_EFFICIENCY = 0.5     # p618Config AntennaEfficiency default
+
+# Exceedance probabilities (%) of the Lred maps in p840.mat (ITU-R P.840-7)
+P840_PROBABILITIES = np.array([0.1, 0.2, 0.3, 0.5, 1, 2, 3, 5, 10, 20, 30, 50, 60, 70, 80, 90, 95, 99])
+
+# Default table axes: both Starlink channel plans and the p618 elevation range
+FREQ_GRID = np.unique(np.concatenate([DOWNLINK.channel_freqs, UPLINK.channel_freqs,
+                                      [DOWNLINK.base_freq, UPLINK.base_freq]]))
+ELEVATION_GRID = np.arange(MIN_ELEVATION, 90 + 1e-9, 0.5)
+
+# Bump when the table layout or a model changes so old caches are rebuilt
+TABLE_VERSION = 1
+
+_lred_maps = {}
+
+
+def load_lred(path=P840_FILE):
+    """
+    Reduced cloud liquid water maps (kg/m^2) of p840.mat, read once per process.
+
+    Returns:
+        tuple: Latitude grid (ascending, degrees), longitude grid (0..360 degrees)
+        and maps of shape (probability, lat, lon) for P840_PROBABILITIES.
+    """
+    if path not in _lred_maps:
+        if loadmat is None:
+            raise ImportError("Reading p840.mat needs scipy (pip install scipy)")
+        cells = loadmat(path)['Lred'].ravel()
+        lat = np.asarray(cells[0], dtype=float)[:, 0]
+        lon = np.asarray(cells[1], dtype=float)[0, :]
+        maps = np.stack([np.asarray(cell, dtype=float) for cell in cells[2:]])
+        _lred_maps[path] = lat, lon, maps
+    return _lred_maps[path]
+
+
+def _interp_weights(grid, x):
+    # Lower grid index and weight of the upper neighbour, clamped to the grid ends
+    if len(grid) == 1:
+        return np.zeros(np.shape(x), dtype=np.intp), np.zeros(np.shape(x))
+    x = np.clip(x, grid[0], grid[-1])
+    i = np.clip(np.searchsorted(grid, x, side='right') - 1, 0, len(grid) - 2)
+    return i, (x - grid[i]) / (grid[i + 1] - grid[i])
+
+
+def _bilinear(lat_grid, lon_grid, values, lat, lon):
+    i, wi = _interp_weights(lat_grid, lat)
+    j, wj = _interp_weights(lon_grid, np.mod(lon, 360))
+    return ((1 - wi) * (1 - wj) * values[..., i, j] + (1 - wi) * wj * values[..., i, j + 1]
+            + wi * (1 - wj) * values[..., i + 1, j] + wi * wj * values[..., i + 1, j + 1])
+
+
+def liquid_water_coefficient(freq, temp_k=273.15):
+    """
+    Specific cloud attenuation coefficient Kl in (dB/km)/(g/m^3) of the
+    P.840 double-Debye model, for a frequency in Hz.
+    """
+    f = np.asarray(freq, dtype=float) / 1e9
+    theta = 300 / temp_k
+    eps0 = 77.66 + 103.3 * (theta - 1)
+    eps1 = 0.0671 * eps0
+    eps2 = 3.52
+    fp = 20.20 - 146 * (theta - 1) + 316 * (theta - 1) ** 2
+    fs = 39.8 * fp
+    eps_im = f * (eps0 - eps1) / (fp * (1 + (f / fp) ** 2)) + f * (eps1 - eps2) / (fs * (1 + (f / fs) ** 2))
+    eps_re = (eps0 - eps1) / (1 + (f / fp) ** 2) + (eps1 - eps2) / (1 + (f / fs) ** 2) + eps2
+    eta = (2 + eps_re) / eps_im
+    return 0.819 * f / (eps_im * (1 + eta ** 2))
+
+
+def cloud_attenuation(lat, lon, freq, elevation, exceedance=EXCEEDANCE, path=P840_FILE):
+    """
+    Slant-path cloud attenuation in dB from the shipped P.840 Lred maps.
+
+    This is only the cloud term of P.618 (no rain, gas or scintillation),
+    a few dB where the At of P07 at its 0.001% exceedance is tens of dB,
+    so it is never picked by default_model.
+
+    As in P.618, exceedances below 1% use the 1% cloud value. Between the
+    map probabilities Lred is interpolated linearly in log(p).
+    """
+    lat_grid, lon_grid, maps = load_lred(path)
+    p = np.log(np.clip(max(exceedance, 1.0), P840_PROBABILITIES[0], P840_PROBABILITIES[-1]))
+    k, w = _interp_weights(np.log(P840_PROBABILITIES), p)
+    lred = _bilinear(lat_grid, lon_grid, (1 - w) * maps[k] + w * maps[k + 1], lat, lon)
+    return lred * liquid_water_coefficient(freq) / np.sin(np.radians(elevation))
+
+
+def p618_attenuation(lat, lon, freq, elevation, exceedance=EXCEEDANCE):
+    """
+    Total P.618 attenuation At in dB (gas, rain, clouds and scintillation),
+    the At of MATLAB's p618PropagationLosses, through the itur package.
+    """
+    if itur is None:
+        raise ImportError("P.618 attenuation needs the itur package (pip install itur)")
+    attenuation = itur.atmospheric_attenuation_slant_path(
+        lat, lon, np.asarray(freq) / 1e9, elevation, exceedance, ANTENNA_DIAMETER, eta=ANTENNA_EFFICIENCY)
+    return np.asarray(getattr(attenuation, 'value', attenuation), dtype=float)
+
+
+def default_model():
+    """
+    p618_attenuation, the full At of P07, which needs the itur package.
+
+    Without itur this raises ImportError instead of falling back to a partial
+    model; AttenuationTable.from_log recovers the At of P07 from a shipped log.
+    """
+    if itur is None:
+        raise ImportError("The P.618 total attenuation needs the itur package (pip install itur); "
+                          "use AttenuationTable.from_log to take it from a shipped log instead")
+    return p618_attenuation
+
+
+class AttenuationTable:
+    """
+    Attenuation tabulated over (station, frequency, elevation).
+
+    The p618 result of P07 only depends on the station, frequency, elevation
+    and exceedance, and the stations are fixed, so the model is evaluated
+    once on a grid and later queries are bilinear interpolations over
+    whole arrays. Elevations are clamped to MIN_ELEVATION as in P07.
+
+    Parameters:
+        stations (list): Station names from config.STATIONS.
+        freqs (np.ndarray): Ascending frequency grid in Hz.
+        elevations (np.ndarray): Ascending elevation grid in degrees.
+        values (np.ndarray): Attenuation in dB of shape (station, frequency, elevation).
+        exceedance (float): Annual exceedance in %.
+        model (str): Name of the model that filled the table.
+    """
+
+    def __init__(self, stations, freqs, elevations, values, exceedance=EXCEEDANCE, model=''):
+        self.stations = list(stations)
+        self.freqs = np.asarray(freqs, dtype=float)
+        self.elevations = np.asarray(elevations, dtype=float)
+        self.values = np.asarray(values, dtype=float)
+        self.exceedance = exceedance
+        self.model = model
+        self.station_index = {station: i for i, station in enumerate(self.stations)}
+
+    @classmethod
+    def build(cls, stations=None, freqs=FREQ_GRID, elevations=ELEVATION_GRID, exceedance=EXCEEDANCE, model=None):
+        """
+        Evaluate `model(lat, lon, freq, elevation, exceedance)` on the grid.
+
+        The model gets one station and frequency with the whole elevation
+        grid per call, see p618_attenuation and cloud_attenuation.
+        """
+        stations = list(STATIONS) if stations is None else list(stations)
+        model = default_model() if model is None else model
+        freqs = np.unique(np.maximum(freqs, MIN_FREQ))
+        values = np.empty((len(stations), len(freqs), len(elevations)))
+        for k, station in enumerate(stations):
+            lat, lon = STATIONS[station]
+            for f, freq in enumerate(freqs):
+                values[k, f] = model(lat, lon, freq, elevations, exceedance)
+        return cls(stations, freqs, elevations, values, exceedance, model.__name__)
+
+    @classmethod
+    def cached(cls, stations=None, freqs=FREQ_GRID, elevations=ELEVATION_GRID, exceedance=EXCEEDANCE, model=None,
+               cache_folder=CACHE_FOLDER):
+        """
+        Load the table from the cache folder, building and saving it on a miss.
+
+        The file name is a hash of the station coordinates, grids, exceedance
+        and model, so runs and sweeps with the same setup share one table.
+        """
+        stations = list(STATIONS) if stations is None else list(stations)
+        model = default_model() if model is None else model
+        key = table_key(stations, freqs, elevations, exceedance, model.__name__)
+        path = os.path.join(cache_folder, f'attenuation-{key}.npz')
+        if os.path.exists(path):
+            return cls.load(path)
+
+        table = cls.build(stations, freqs, elevations, exceedance, model)
+        os.makedirs(cache_folder, exist_ok=True)
+        table.save(path)
+        return table
+
+    @classmethod
+    def from_log(cls, cube, params: LinkParams, fading_model=FADING_MODEL, k_db=RICIAN_K_DB,
+                 elevations=ELEVATION_GRID, bin_links=16):
+        """
+        The At that P07 applied, recovered from a logged cube.
+
+        The logged RSSI is the clear-sky budget minus At and one fading draw,
+        so budget_cube(cube, params) RSSI minus the logged RSSI is At plus
+        fading. The residuals of every station are sorted by elevation and
+        averaged over runs of `bin_links` links (the links under
+        MIN_ELEVATION, where P07 clamps, in a run of their own), the mean
+        loss of the fading model is taken off, and the run means are
+        interpolated onto `elevations` and held flat past the outer runs.
+
+        P07 evaluates At at cfg.Frequency = baseFreq only, so the table has
+        the single frequency params.base_freq and serves that direction.
+
+        Parameters:
+            cube (LinkCube): Unconverted cube of the log, with RSSI_dBm.
+            params (LinkParams): Parameters the log was made with, e.g. DOWNLINK.
+            fading_model, k_db: Fading of the log (fadingModel, ricianK_dB of P01).
+            elevations (np.ndarray): Ascending elevation grid in degrees.
+            bin_links (int): Links averaged per elevation run, the fading spread
+                (about 2 dB for Rician K = 10 dB) shrinks by its square root.
+        """
+        elevation = _elevation(cube, params)
+        residual = budget_cube(cube, params).sel(metric='RSSI_dBm').astype(float) - cube.sel(metric='RSSI_dBm')
+        # Mean of -10*log10(|h|^2), about 0.41 dB for Rician K = 10 dB
+        fading_mean = float(np.mean(fading_loss_db(1 << 20, fading_model, k_db, rng=0, dtype=np.float64)))
+
+        values = np.empty((len(cube.stations), 1, len(elevations)))
+        for k in range(len(cube.stations)):
+            used = cube.access[:, :, k] & ~np.isnan(residual[:, :, k]) & ~np.isnan(elevation[:, :, k])
+            if not used.any():
+                raise ValueError(f"No logged links of {cube.stations[k]} to recover the attenuation from")
+            el = np.maximum(elevation[:, :, k][used], MIN_ELEVATION)
+            order = np.argsort(el, kind='stable')
+            el, res = el[order], residual[:, :, k][used][order]
+
+            clamped = np.count_nonzero(el <= MIN_ELEVATION)
+            run = np.concatenate([np.zeros(clamped, dtype=np.int64),
+                                  1 + np.arange(len(el) - clamped) // bin_links])
+            counts = np.bincount(run)
+            has = counts > 0
+            centers = np.bincount(run, el)[has] / counts[has]
+            means = np.bincount(run, res)[has] / counts[has] - fading_mean
+            values[k, 0] = np.interp(elevations, centers, means)
+
+        name = f"from_log-{hashlib.sha1(values.tobytes()).hexdigest()[:8]}"
+        return cls(cube.stations, [max(params.base_freq, MIN_FREQ)], elevations, values, EXCEEDANCE, name)
+
+    def save(self, path):
+        # np.savez appends .npz to names without it, so write to a .npz temp file
+        tmp_file = path[:-len('.npz')] + '.tmp.npz'
+        np.savez(tmp_file, stations=np.array(self.stations), freqs=self.freqs, elevations=self.elevations,
+                 values=self.values, exceedance=self.exceedance, model=self.model)
+        os.replace(tmp_file, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            return cls(f['stations'].tolist(), f['freqs'], f['elevations'], f['values'],
+                       float(f['exceedance']), str(f['model']))
+
+    def lookup(self, station, freq, elevation) -> np.ndarray:
+        """
+        Attenuation in dB for arrays of stations, frequencies and elevations.
+
+        Parameters:
+            station (str, int or np.ndarray): Station name or station indices into self.stations.
+            freq (float or np.ndarray): Frequency in Hz.
+            elevation (float or np.ndarray): Elevation in degrees, NaN gives NaN.
+
+        All three are broadcast together.
+        """
+        if isinstance(station, str):
+            station = self.station_index[station]
+        station, freq, elevation = np.broadcast_arrays(np.asarray(station), np.asarray(freq, dtype=float),
+                                                       np.asarray(elevation, dtype=float))
+        f, wf = _interp_weights(self.freqs, np.maximum(freq, MIN_FREQ))
+        e, we = _interp_weights(self.elevations, np.nan_to_num(np.maximum(elevation, MIN_ELEVATION), nan=90.0))
+        values = self.values
+        f1 = np.minimum(f + 1, len(self.freqs) - 1)  # Single-frequency tables (from_log)
+        attenuation = ((1 - wf) * (1 - we) * values[station, f, e] + (1 - wf) * we * values[station, f, e + 1]
+                       + wf * (1 - we) * values[station, f1, e] + wf * we * values[station, f1, e + 1])
+        return np.where(np.isnan(elevation), np.nan, attenuation)
+
+    def atmos_loss(self, cube, params: LinkParams, elevation=None) -> np.ndarray:
+        """
+        (time, satellite, station) attenuation for budget_cube(atmos_loss_db=...).
+
+        The frequency is params.base_freq, as cfg.Frequency in P07.
+
+        Parameters:
+            cube (LinkCube): Cube with the satellite positions; its stations must be in the table.
+            params (LinkParams): Link parameters.
+            elevation (np.ndarray): (time, satellite, station) elevation, computed from cube.lat/lon if omitted.
+        """
+        elevation = _elevation(cube, params) if elevation is None else elevation
+        station = np.array([self.station_index[station] for station in cube.stations])
+        return self.lookup(station, params.base_freq, elevation)
+
+
+def _elevation(cube, params):
+    """(time, satellite, station) elevation of the cube's satellites at params.altitude."""
+    station_lat, station_lon = np.array([STATIONS[station] for station in cube.stations]).T
+    return look_angles(cube.lat, cube.lon, params.altitude, station_lat, station_lon)[1]
+
+
+def table_key(stations, freqs, elevations, exceedance, model_name) -> str:
+    """Cache key of a table setup."""
+    setup = {
+        'version': TABLE_VERSION,
+        'stations': [[station, *STATIONS[station]] for station in stations],
+        'freqs': np.asarray(freqs, dtype=float).tolist(),
+        'elevations': np.asarray(elevations, dtype=float).tolist(),
+        'exceedance': exceedance,
+        'model': model_name,
+    }
+    return hashlib.sha1(json.dumps(setup, sort_keys=True).encode()).hexdigest()[:16]
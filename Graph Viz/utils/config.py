@@ -1,13 +1,30 @@
 # Configuration variables
+import os
 
 
 GRAPH_SAVE_FOLDER = "graphs/"
-DATA_FOLDER = "G:/Work/Github/LLM/1LLM-Results/LLM_Results_New_Evaluation_with_old_TON_Data/results_eval"
+DATA_FOLDER = os.environ.get('SATL4S_DATA_FOLDER', "data/")  # Simulation logs, override with SATL4S_DATA_FOLDER
+LOG_NAME = "Satellite_Australia_Simulation_Log_{constellation}_{direction}.csv"  # Log file in DATA_FOLDER
+
+CACHE_FOLDER = ".cache/"  # Columnar caches of the simulation logs (see utils/loader.py)
+TIME_FORMAT = '%d-%b-%Y %H:%M:%S'  # MATLAB datetime format used in the logs, e.g. 10-Apr-2025 12:00:00
+TIME_ZONE = 'Australia/Sydney'  # Time zone of the log timestamps (startTime in P01_Parameters.m)
+# ITU-R P.840 reduced cloud liquid water maps shipped with the MATLAB scripts, found from this file
+# so it does not depend on the working directory
+P840_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'Starlink_Uplink', 'p840.mat')
+
+# Ground stations as (latitude, longitude) in degrees, as in leoCities of P02_GStations.m
+STATIONS = {
+    'Sydney': (-33.8688, 151.2093),
+    'Melbourne': (-37.8136, 144.9631),
+}
 
 
 SAVE_FORMATS = ['png', 'eps', 'pdf']  # Formats to save graphs
 SAVE_FORMATS = ['png']  # Formats to save graphs
 DPI = 500
+MAX_MARKERS = 30  # Per-line marker cap, longer series get a marker every few points
+SKIP_UNCHANGED_PLOTS = True  # Skip figures whose data and style match the folder manifest
 
 # # Color, marker, and linestyle options
 # colors = ['b', 'g', 'r', 'c', 'm', 'y', 'k', '#ff6347']  # Add more colors as needed
@@ -0,0 +1,237 @@
+import csv
+import re
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from utils.config import STATIONS, TIME_FORMAT, TIME_ZONE
+from utils.geometry import ecef_to_geodetic, inertial_to_ecef, look_angles_ecef
+from utils.link_cube import LinkCube
+
+
+EARTH_MU = 3.986004418e14      # m^3/s^2
+EARTH_RADIUS = 6371000.0       # m, earthRadius in MATLAB
+
+
+@dataclass(frozen=True)
+class WalkerShell:
+    """
+    Walker constellation as built by walkerDelta/walkerStar in P04_Satellites.m.
+
+    Satellites are numbered plane by plane (LEO1..LEO{sats_per_plane} in the
+    first plane), with circular two-body orbits. At the epoch, plane p has
+    RAAN 360*p/n_planes (180*p/n_planes for a Walker-Star) and satellite j
+    in it the argument of latitude 360*j/sats_per_plane + 360*phase_offset*p/total.
+    """
+    a: float                   # Semi-major axis in metres (walker.a)
+    inc: float                 # Inclination in degrees (walker.Inc)
+    n_planes: int              # walker.NPlanes
+    sats_per_plane: int        # walker.SatsPerPlane
+    phase_offset: int = 1      # walker.PhaseOffset
+    kind: str = 'delta'        # 'delta' or 'star'
+
+    @property
+    def total(self) -> int:
+        return self.n_planes * self.sats_per_plane
+
+    @property
+    def sat_ids(self) -> list:
+        return [f'LEO{num}' for num in range(1, self.total + 1)]
+
+    def elements(self, sat_nums=None):
+        """RAAN and argument of latitude at the epoch, in radians, for satellite numbers (1-based)."""
+        sat_nums = np.arange(1, self.total + 1) if sat_nums is None else np.asarray(sat_nums)
+        plane, slot = np.divmod(sat_nums - 1, self.sats_per_plane)
+        spread = np.pi if self.kind == 'star' else 2 * np.pi
+        raan = spread * plane / self.n_planes
+        arg_lat = 2 * np.pi * (slot / self.sats_per_plane + self.phase_offset * plane / self.total)
+        return raan, arg_lat
+
+
+# Starlink shell 1 of Starlink_Downlink/P01_Parameters.m
+STARLINK_SHELL = WalkerShell(a=547e3 + EARTH_RADIUS, inc=53, n_planes=72, sats_per_plane=22, phase_offset=1)
+
+# Smaller 144 satellite shell (12 planes x 12) behind the shipped starlink logs
+LOGGED_SHELL = WalkerShell(a=547e3 + EARTH_RADIUS, inc=53, n_planes=12, sats_per_plane=12, phase_offset=1)
+
+
+def read_walker_params(path, column='Spacex (Shell-1)', kind='delta') -> WalkerShell:
+    """
+    Read a Walker shell from LEO_Parameters.csv.
+
+    Parameters:
+        path (str): Path of LEO_Parameters.csv.
+        column (str): Constellation column, e.g. 'OneWeb' or 'Spacex (Shell-1)'.
+        kind (str): 'delta' (walkerDelta) or 'star' (walkerStar, as for OneWeb in P04).
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        rows = {row['Parameter'].strip(): row[column] for row in csv.DictReader(f)}
+
+    def number(name):
+        return float(re.search(r'[\d.]+', rows[name].replace(',', '')).group())
+
+    return WalkerShell(
+        a=number('Altitude') * 1e3 + number('Earth Radius'),
+        inc=number('Inclination'),
+        n_planes=int(number('Orbital Planes')),
+        sats_per_plane=int(number('Satellites per Plane')),
+        phase_offset=int(number('Phase Offset')),
+        kind=kind,
+    )
+
+
+def time_grid(start, duration, step, tz=TIME_ZONE) -> np.ndarray:
+    """
+    UTC sample times startTime:seconds(sampleTime):stopTime, as in P01_Parameters.m.
+
+    Parameters:
+        start (str): Local start time, e.g. '2025-04-10 12:00:00'.
+        duration (float): Duration in seconds (duration_sec).
+        step (float): Sample time in seconds (sampleTime).
+        tz (str): Time zone of `start`.
+    """
+    start = pd.Timestamp(start, tz=tz).tz_convert('UTC').tz_localize(None)
+    offsets = np.arange(0, duration + step / 2, step) * 1e9
+    return start.to_datetime64().astype('datetime64[ns]') + offsets.astype('timedelta64[ns]')
+
+
+def time_labels(times, tz=TIME_ZONE) -> np.ndarray:
+    """Log-style Time labels (e.g. '10-Apr-2025 12:00:00') of UTC times, in local time."""
+    local = pd.DatetimeIndex(times).tz_localize('UTC').tz_convert(tz)
+    return np.asarray(local.strftime(TIME_FORMAT))
+
+
+def propagate(shell: WalkerShell, times, epoch=None, sat_nums=None) -> np.ndarray:
+    """
+    Earth-fixed positions of the shell's satellites at all times in one broadcast.
+
+    Parameters:
+        shell (WalkerShell): The constellation.
+        times (np.ndarray): UTC times as datetime64.
+        epoch (np.datetime64): Epoch of the elements, defaults to times[0] (the scenario start).
+        sat_nums (array_like): Satellite numbers to propagate, defaults to all.
+
+    Returns:
+        np.ndarray: ECEF positions of shape (time, satellite, 3) in metres.
+    """
+    times = np.asarray(times, dtype='datetime64[ns]')
+    epoch = times[0] if epoch is None else np.datetime64(epoch, 'ns')
+    raan, arg_lat0 = shell.elements(sat_nums)
+    inc = np.radians(shell.inc)
+
+    mean_motion = np.sqrt(EARTH_MU / shell.a ** 3)
+    seconds = (times - epoch) / np.timedelta64(1, 's')
+    arg_lat = arg_lat0 + mean_motion * seconds[:, np.newaxis]
+
+    # Circular orbit in the inertial frame
+    cos_u, sin_u = np.cos(arg_lat), np.sin(arg_lat)
+    cos_raan, sin_raan = np.cos(raan), np.sin(raan)
+    inertial = shell.a * np.stack([cos_raan * cos_u - sin_raan * sin_u * np.cos(inc),
+                                   sin_raan * cos_u + cos_raan * sin_u * np.cos(inc),
+                                   sin_u * np.sin(inc)], axis=-1)
+
+    # Batched matmul with the transposed rotations, one per time step
+    return inertial @ np.swapaxes(inertial_to_ecef(times), -1, -2)
+
+
+def iter_geometry(positions, times, stations=None, chunk_steps=3600, min_elevation=0.0):
+    """
+    Evaluate a propagator over a long time grid in chunks of `chunk_steps` samples.
+
+    Peak memory is bounded by one chunk, so e.g. 1584 satellites x 86400 one
+    second steps run as 24 chunks of 3600 steps.
+
+    Parameters:
+        positions (callable): Maps a chunk of UTC times to ECEF positions (time, satellite, 3).
+        times (np.ndarray): UTC times as datetime64.
+        stations (list): Station names from config.STATIONS, defaults to all of them.
+        chunk_steps (int): Time steps per chunk.
+        min_elevation (float): Elevation mask in degrees for the access flags.
+
+    Yields:
+        dict: 'start' (first time index of the chunk), 'lat', 'lon', 'alt' of shape
+        (time, satellite) and 'range', 'elevation', 'access' of shape (time, satellite, station).
+    """
+    times = np.asarray(times, dtype='datetime64[ns]')
+    stations = list(STATIONS) if stations is None else list(stations)
+    station_lat, station_lon = np.array([STATIONS[station] for station in stations]).T
+
+    for start in range(0, len(times), chunk_steps):
+        ecef = positions(times[start:start + chunk_steps])
+        lat, lon, alt = ecef_to_geodetic(ecef)
+        with np.errstate(invalid='ignore'):
+            distance, elevation = look_angles_ecef(ecef, station_lat, station_lon)
+            access = elevation >= min_elevation
+        yield {
+            'start': start,
+            'lat': lat,
+            'lon': lon,
+            'alt': alt,
+            'range': distance,
+            'elevation': elevation,
+            'access': access,
+        }
+
+
+def geometry_cube(positions, times, sat_ids, stations=None, chunk_steps=3600, min_elevation=0.0,
+                  dtype=np.float32) -> LinkCube:
+    """
+    Geometry cube of a propagator, in the layout of the logged cubes.
+
+    The cube holds the LEO{i}_Lat/Lon of every satellite, the access flags
+    (elevation above `min_elevation`, as the default access() of MATLAB) and
+    Elevation (degrees) and Range (metres) metrics per station. Freq_Hz is
+    NaN; link metrics are added with utils.link_budget.budget_cube.
+
+    Parameters:
+        positions (callable): As in iter_geometry.
+        sat_ids (list): Satellite IDs of the propagated satellites, in order.
+        times, stations, chunk_steps, min_elevation: As in iter_geometry.
+    """
+    times = np.asarray(times, dtype='datetime64[ns]')
+    stations = list(STATIONS) if stations is None else list(stations)
+
+    n_time, n_sat = len(times), len(sat_ids)
+    data = np.empty((n_time, n_sat, len(stations), 2), dtype=dtype)
+    access = np.empty((n_time, n_sat, len(stations)), dtype=bool)
+    lat = np.empty((n_time, n_sat))
+    lon = np.empty((n_time, n_sat))
+
+    for chunk in iter_geometry(positions, times, stations, chunk_steps, min_elevation):
+        rows = slice(chunk['start'], chunk['start'] + len(chunk['lat']))
+        data[rows, ..., 0] = chunk['elevation']
+        data[rows, ..., 1] = chunk['range']
+        access[rows] = chunk['access']
+        lat[rows] = chunk['lat']
+        lon[rows] = chunk['lon']
+
+    sat_data = {'Lat': lat, 'Lon': lon, 'Freq_Hz': np.full((n_time, n_sat), np.nan)}
+    return LinkCube(time_labels(times), sat_ids, stations, ['Elevation', 'Range'], data, access, sat_data)
+
+
+def walker_positions(shell: WalkerShell, epoch, sat_nums=None):
+    """Propagator callable of a shell for iter_geometry/geometry_cube."""
+    return lambda times: propagate(shell, times, epoch, sat_nums)
+
+
+def iter_walker_geometry(shell: WalkerShell, times, stations=None, chunk_steps=3600, epoch=None,
+                         sat_nums=None, min_elevation=0.0):
+    """Chunked geometry of a Walker shell, see iter_geometry. The epoch defaults to the first time."""
+    times = np.asarray(times, dtype='datetime64[ns]')
+    epoch = times[0] if epoch is None else epoch
+    return iter_geometry(walker_positions(shell, epoch, sat_nums), times, stations, chunk_steps, min_elevation)
+
+
+def walker_cube(shell: WalkerShell, times, stations=None, chunk_steps=3600, epoch=None,
+                sat_nums=None, min_elevation=0.0, dtype=np.float32) -> LinkCube:
+    """
+    Geometry cube of a Walker shell (see geometry_cube).
+
+    The elements are set at `epoch`, by default the first time (the scenario start).
+    """
+    times = np.asarray(times, dtype='datetime64[ns]')
+    epoch = times[0] if epoch is None else epoch
+    sat_nums = np.arange(1, shell.total + 1) if sat_nums is None else np.asarray(sat_nums)
+    return geometry_cube(walker_positions(shell, epoch, sat_nums), times, [f'LEO{num}' for num in sat_nums],
+                         stations, chunk_steps, min_elevation, dtype)
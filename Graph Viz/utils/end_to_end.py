@@ -0,0 +1,256 @@
+import numpy as np
+import pandas as pd
+
+from utils.link_cube import LinkCube
+from utils.selection import LOWER_IS_BETTER
+
+
+# Leg metrics combined into the end-to-end path, as in calc.ipynb
+LEG_METRICS = ['Throughput', 'BER_QPSK', 'Latency']
+
+
+def best_legs(data, stations=None, metric='SNR_dB', convert_units=True) -> dict:
+    """
+    Best satellite of every (time, station) and its leg metrics, for all stations at once.
+
+    Same choice as select_best_satellite: a NaN-aware argmax of `metric`
+    over the satellites (argmin for BER and Latency), ties to the lowest
+    satellite number.
+
+    Parameters:
+        data (LinkCube or pd.DataFrame): Link cube or wide simulation log.
+        stations (list): Station names, defaults to all stations of the cube.
+        metric (str): Metric used to rank the satellites.
+        convert_units (bool): Throughput in Mbps and Latency in ms (skipped for converted cubes).
+
+    Returns:
+        dict: 'time', 'stations', 'sat_id' (time, station) object array with None where no
+        satellite is available, and the LEG_METRICS as (time, station) arrays.
+    """
+    cube = data if isinstance(data, LinkCube) else LinkCube.from_frame(data, dtype=np.float64)
+    stations = cube.stations if stations is None else list(stations)
+    convert_units = convert_units and not cube.converted
+
+    score = cube.sel(station=stations, metric=metric).astype(float)
+    valid = ~np.isnan(score)
+    if metric in LOWER_IS_BETTER:
+        best = np.where(valid, score, np.inf).argmin(axis=1)
+    else:
+        best = np.where(valid, score, -np.inf).argmax(axis=1)
+    has_sat = valid.any(axis=1)
+
+    legs = {'time': cube.time, 'stations': stations}
+    sat_names = np.array(cube.sat_ids, dtype=object)
+    legs['sat_id'] = np.where(has_sat, sat_names[best], None)
+
+    for name in LEG_METRICS:
+        values = cube.sel(station=stations, metric=name).astype(float)
+        values = np.take_along_axis(values, best[:, np.newaxis, :], axis=1)[:, 0, :]
+        values = np.where(has_sat, values, np.nan)
+        if convert_units and name == 'Throughput':
+            values = values / (1024 * 1024)  # Convert to Mbps
+        elif convert_units and name == 'Latency':
+            values = values * 1000  # Convert to ms
+        legs[name] = values
+    return legs
+
+
+def _align(left_time, right_time):
+    # Inner join on the Time labels in left order, as pd.merge(left, right, on='Time')
+    right_rows = pd.Index(right_time).get_indexer(left_time)
+    left_rows = np.flatnonzero(right_rows >= 0)
+    return left_rows, right_rows[left_rows]
+
+
+def end_to_end_pairs(uplink_cube, downlink_cube, sources=None, destinations=None, metric='SNR_dB',
+                     convert_units=True) -> dict:
+    """
+    End-to-end metrics of every source -> destination station pair in one pass.
+
+    The source uplinks to its best satellite and the destination downlinks
+    from its own best satellite. Per time step the path throughput is the
+    smaller leg throughput, the path BER the larger leg BER and the latency
+    the sum of both legs. As with pandas min/max in calc.ipynb, a missing
+    leg is skipped for throughput and BER but makes the latency NaN.
+
+    Parameters:
+        uplink_cube, downlink_cube (LinkCube or pd.DataFrame): Uplink and downlink logs.
+        sources, destinations (list): Station names, default to all stations of each cube.
+        metric, convert_units: As in best_legs.
+
+    Returns:
+        dict: 'time', 'sources', 'destinations', the (time, source, destination) arrays
+        'Thrpt', 'BER_QPSK' and 'Latency', and the best satellites 'uplink_sat_id'
+        (time, source) and 'downlink_sat_id' (time, destination).
+    """
+    uplink = best_legs(uplink_cube, sources, metric, convert_units)
+    downlink = best_legs(downlink_cube, destinations, metric, convert_units)
+    down_rows, up_rows = _align(downlink['time'], uplink['time'])
+
+    def legs(name):
+        return uplink[name][up_rows][:, :, np.newaxis], downlink[name][down_rows][:, np.newaxis, :]
+
+    up, down = legs('Throughput')
+    thrpt = np.fmin(up, down)
+    up, down = legs('BER_QPSK')
+    ber = np.fmax(up, down)
+    up, down = legs('Latency')
+    latency = up + down
+
+    return {
+        'time': downlink['time'][down_rows],
+        'sources': uplink['stations'],
+        'destinations': downlink['stations'],
+        'Thrpt': thrpt,
+        'BER_QPSK': ber,
+        'Latency': latency,
+        'uplink_sat_id': uplink['sat_id'][up_rows],
+        'downlink_sat_id': downlink['sat_id'][down_rows],
+    }
+
+
+def end_to_end(uplink_cube, downlink_cube, src, dst, metric='SNR_dB', convert_units=True) -> pd.DataFrame:
+    """
+    End-to-end metrics of one station pair, in the EndToEnd_Starlink_Performance.csv layout.
+
+    Returns:
+        pd.DataFrame: Time, EndToEnd_Thrpt_Mbps, EndToEnd_BER_QPSK, EndToEnd_Latency_ms,
+        {src}_Uplink_Best_SAT_ID and {dst}_Downlink_Best_SAT_ID.
+    """
+    paths = end_to_end_pairs(uplink_cube, downlink_cube, [src], [dst], metric, convert_units)
+    return pd.DataFrame({
+        'Time': paths['time'],
+        'EndToEnd_Thrpt_Mbps': paths['Thrpt'][:, 0, 0],
+        'EndToEnd_BER_QPSK': paths['BER_QPSK'][:, 0, 0],
+        'EndToEnd_Latency_ms': paths['Latency'][:, 0, 0],
+        f'{src}_Uplink_Best_SAT_ID': paths['uplink_sat_id'][:, 0],
+        f'{dst}_Downlink_Best_SAT_ID': paths['downlink_sat_id'][:, 0],
+    })
+
+
+def end_to_end_table(uplink_cube, downlink_cube, sources=None, destinations=None, metric='SNR_dB',
+                     convert_units=True, include_self=False) -> pd.DataFrame:
+    """
+    Long-format end-to-end metrics of all station pairs, one row per (time, source, destination).
+
+    Columns follow EndToEnd_Starlink_Performance.csv with Source and Destination
+    added and the satellite IDs under Uplink_Best_SAT_ID/Downlink_Best_SAT_ID.
+    Pairs of a station with itself are dropped unless `include_self`.
+    """
+    paths = end_to_end_pairs(uplink_cube, downlink_cube, sources, destinations, metric, convert_units)
+    sources = np.array(paths['sources'], dtype=object)
+    destinations = np.array(paths['destinations'], dtype=object)
+    n_time, n_src, n_dst = paths['Thrpt'].shape
+
+    t, s, d = (axis.ravel() for axis in np.meshgrid(np.arange(n_time), np.arange(n_src), np.arange(n_dst),
+                                                    indexing='ij'))
+    keep = np.ones(len(t), dtype=bool) if include_self else sources[s] != destinations[d]
+    t, s, d = t[keep], s[keep], d[keep]
+
+    return pd.DataFrame({
+        'Time': paths['time'][t],
+        'Source': sources[s],
+        'Destination': destinations[d],
+        'EndToEnd_Thrpt_Mbps': paths['Thrpt'][t, s, d],
+        'EndToEnd_BER_QPSK': paths['BER_QPSK'][t, s, d],
+        'EndToEnd_Latency_ms': paths['Latency'][t, s, d],
+        'Uplink_Best_SAT_ID': paths['uplink_sat_id'][t, s],
+        'Downlink_Best_SAT_ID': paths['downlink_sat_id'][t, d],
+    })
+
+
+def lexicographic_argmax(keys, valid) -> np.ndarray:
+    """
+    Column of the lexicographic maximum of `keys` in every row.
+
+    The first key is compared first, later keys only break exact ties and
+    remaining ties go to the lowest column. One masked max per key, so the
+    cost is linear in the array size.
+
+    Parameters:
+        keys (list): (row, column) score arrays, most significant first.
+        valid (np.ndarray): Boolean (row, column) mask of the allowed columns.
+
+    Returns:
+        np.ndarray: Column index per row, -1 for rows without a valid column.
+    """
+    candidates = np.asarray(valid, dtype=bool).copy()
+    for key in keys:
+        best = np.where(candidates, key, -np.inf).max(axis=1, keepdims=True)
+        candidates &= key == best
+    return np.where(candidates.any(axis=1), candidates.argmax(axis=1), -1)
+
+
+def balanced_best(uplink_cube, downlink_cube, src='Melbourne', dst='Sydney', metric='SNR_dB', latency_weight=0.0,
+                  objective=None, convert_units=True) -> pd.DataFrame:
+    """
+    One satellite per time step that serves both the src uplink and the dst downlink, max-min balanced.
+
+    By default the satellite maximizes min(uplink SNR, downlink SNR), with
+    ties going to the smallest |uplink SNR - downlink SNR| and then to the
+    lowest satellite number (extract_balanced_best of calcv2.ipynb). Only
+    satellites with an SNR on both legs are candidates and time steps
+    without any are dropped.
+
+    Parameters:
+        uplink_cube, downlink_cube (LinkCube or pd.DataFrame): Uplink and downlink logs,
+            frames are read at float64 as the rows of calcv2.ipynb.
+        src, dst (str): Uplink and downlink station.
+        metric (str): Leg metric of the max-min score, e.g. 'Throughput' for min-throughput.
+        latency_weight (float): Score penalty per ms of summed leg latency.
+        objective (callable): Custom score objective(up, down) -> (time, satellite) array, where
+            up and down map metric names to (time, satellite) arrays in output units. Replaces
+            metric and latency_weight.
+        convert_units (bool): Throughput in Mbps and Latency in ms (skipped for converted cubes).
+
+    Returns:
+        pd.DataFrame: The Balanced_EndToEnd_Starlink_Performance.csv columns (Time, Best_SAT_ID,
+        EndToEnd_Min_SNR_dB, EndToEnd_SNR_Diff_dB, EndToEnd_Throughput_Mbps, EndToEnd_BER_QPSK,
+        EndToEnd_Latency_ms).
+    """
+    uplink = uplink_cube if isinstance(uplink_cube, LinkCube) else LinkCube.from_frame(uplink_cube, dtype=np.float64)
+    downlink = (downlink_cube if isinstance(downlink_cube, LinkCube)
+                else LinkCube.from_frame(downlink_cube, dtype=np.float64))
+
+    up_rows, down_rows = _align(uplink.time, downlink.time)
+    sat_ids = [sat_id for sat_id in uplink.sat_ids if sat_id in downlink.sat_index]
+    up_sats = [uplink.sat_index[sat_id] for sat_id in sat_ids]
+    down_sats = [downlink.sat_index[sat_id] for sat_id in sat_ids]
+
+    def legs(cube, station, rows, sats):
+        values = {}
+        for name in {'SNR_dB', 'Throughput', 'BER_QPSK', 'Latency', metric}:
+            leg = cube.sel(station=station, metric=name)[rows][:, sats].astype(float)
+            if convert_units and not cube.converted and name == 'Throughput':
+                leg = leg / (1024 * 1024)  # Convert to Mbps
+            elif convert_units and not cube.converted and name == 'Latency':
+                leg = leg * 1000  # Convert to ms
+            values[name] = leg
+        return values
+
+    up = legs(uplink, src, up_rows, up_sats)
+    down = legs(downlink, dst, down_rows, down_sats)
+
+    if objective is None:
+        score = np.minimum(up[metric], down[metric]) - latency_weight * (up['Latency'] + down['Latency'])
+    else:
+        score = objective(up, down)
+    snr_diff = np.abs(up['SNR_dB'] - down['SNR_dB'])
+    valid = ~np.isnan(up['SNR_dB']) & ~np.isnan(down['SNR_dB']) & ~np.isnan(score)
+
+    best = lexicographic_argmax([score, -snr_diff], valid)
+    rows = np.flatnonzero(best >= 0)
+    best = best[rows]
+
+    def pick(values):
+        return values[rows, best]
+
+    return pd.DataFrame({
+        'Time': uplink.time[up_rows][rows],
+        'Best_SAT_ID': np.array(sat_ids, dtype=object)[best],
+        'EndToEnd_Min_SNR_dB': np.minimum(pick(up['SNR_dB']), pick(down['SNR_dB'])),
+        'EndToEnd_SNR_Diff_dB': pick(snr_diff),
+        'EndToEnd_Throughput_Mbps': np.fmin(pick(up['Throughput']), pick(down['Throughput'])),
+        'EndToEnd_BER_QPSK': np.fmax(pick(up['BER_QPSK']), pick(down['BER_QPSK'])),
+        'EndToEnd_Latency_ms': pick(up['Latency']) + pick(down['Latency']),
+    })
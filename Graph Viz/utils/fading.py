@@ -0,0 +1,152 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from utils.link_budget import ber_mqam, ber_qpsk, link_budget_pairs, shannon_throughput
+
+
+# Multi-path fading parameters of P01_Parameters.m
+FADING_MODELS = ('None', 'Rayleigh', 'Rician')
+FADING_MODEL = 'Rician'      # fadingModel
+RICIAN_K_DB = 10.0           # ricianK_dB
+RAYLEIGH_BELOW = 10.0        # Elevation (degrees) under which the second F01 option switches to Rayleigh
+
+# Realizations drawn from one child seed, fixes the streams whatever the worker count
+REALIZATION_BLOCK = 64
+
+
+def fading_loss_db(shape, model=FADING_MODEL, k_db=RICIAN_K_DB, elevation=None, rayleigh_below=None,
+                   rng=None, dtype=np.float32) -> np.ndarray:
+    """
+    Multi-path fading loss -20*log10(|h|) of F01_GetMultipathFadingLoss.m for a whole block of links.
+
+    Rician fading is h = s + sigma*(x + jy) with s = sqrt(K/(K+1)),
+    sigma = sqrt(1/(2(K+1))) and x, y standard normal; Rayleigh is the
+    same with K = 0. With `elevation` and `rayleigh_below`, links below that
+    elevation use Rayleigh whatever the model (the commented-out second
+    option of F01, with rayleigh_below=10).
+
+    Parameters:
+        shape (tuple): Output shape, e.g. (realization, time, satellite, station) or (realization, link).
+        model (str): 'None', 'Rayleigh' or 'Rician'.
+        k_db (float): Rician K-factor in dB.
+        elevation (np.ndarray): Elevation in degrees, broadcast against `shape`.
+        rayleigh_below (float): Elevation threshold of the Rayleigh switch, off by default.
+        rng (np.random.Generator or int): Generator or seed, defaults to a fresh unseeded one.
+        dtype: Output dtype.
+
+    Returns:
+        np.ndarray: Fading loss in dB (negative for constructive fades).
+    """
+    if model not in FADING_MODELS:
+        raise ValueError(f"Unsupported fading model '{model}', expected one of {FADING_MODELS}")
+    shape = tuple(np.atleast_1d(shape))
+    rng = np.random.default_rng(rng)
+
+    rayleigh = None
+    if elevation is not None and rayleigh_below is not None:
+        rayleigh = np.asarray(elevation) < rayleigh_below
+    elif model == 'None':
+        return np.zeros(shape, dtype=dtype)
+
+    k = 10 ** (k_db / 10) if model == 'Rician' else 0.0
+    if rayleigh is not None:
+        k = np.where(rayleigh, 0.0, k)
+
+    # K = 0 gives s = 0 and sigma = 1/sqrt(2), i.e. the Rayleigh coefficient of F01
+    s = np.sqrt(k / (k + 1))
+    sigma = np.sqrt(1 / (2 * (k + 1)))
+    x = rng.standard_normal(shape, dtype=np.float32)
+    y = rng.standard_normal(shape, dtype=np.float32)
+    power = (s + sigma * x) ** 2 + (sigma * y) ** 2
+    if model == 'None':
+        # Only the links below the threshold fade
+        power = np.where(rayleigh, power, 1.0)
+    return (-10 * np.log10(power)).astype(dtype, copy=False)
+
+
+def spawn_generators(seed, n) -> list:
+    """`n` independent Generators from one seed, via SeedSequence.spawn."""
+    return [np.random.default_rng(child) for child in np.random.SeedSequence(seed).spawn(n)]
+
+
+def _fading_block(args):
+    n, shape, model, k_db, elevation, rayleigh_below, seed, dtype = args
+    return fading_loss_db((n,) + shape, model, k_db, elevation, rayleigh_below, np.random.default_rng(seed), dtype)
+
+
+def fading_realizations(n_realizations, shape, model=FADING_MODEL, k_db=RICIAN_K_DB, elevation=None,
+                        rayleigh_below=None, seed=None, workers=1, dtype=np.float32) -> np.ndarray:
+    """
+    Many Monte Carlo realizations of fading_loss_db, optionally on several processes.
+
+    Realizations come in blocks of REALIZATION_BLOCK, each drawn from its own
+    child of SeedSequence(seed), so a seed gives the same array for any
+    number of workers and the streams never overlap.
+
+    Parameters:
+        n_realizations (int): Number of realizations (leading output axis).
+        shape (tuple): Shape of one realization, e.g. cube.access.shape or (n_links,).
+        model, k_db, elevation, rayleigh_below, dtype: As in fading_loss_db.
+        seed (int): Root seed, None for fresh entropy.
+        workers (int): Worker processes, 1 draws in this process and None uses the CPU count.
+
+    Returns:
+        np.ndarray: Fading loss in dB of shape (n_realizations,) + shape.
+    """
+    shape = tuple(np.atleast_1d(shape))
+    sizes = [min(REALIZATION_BLOCK, n_realizations - start) for start in range(0, n_realizations, REALIZATION_BLOCK)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(n, shape, model, k_db, elevation, rayleigh_below, child, dtype) for n, child in zip(sizes, seeds)]
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) <= 1:
+        blocks = [_fading_block(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            blocks = list(pool.map(_fading_block, tasks))
+    return np.concatenate(blocks) if blocks else np.empty((0,) + shape, dtype=dtype)
+
+
+def monte_carlo_budget(cube, params, n_realizations, model=FADING_MODEL, k_db=RICIAN_K_DB, rayleigh_below=None,
+                       atmos_loss_db=0.0, seed=None, workers=1) -> dict:
+    """
+    Replay the link budget of a logged geometry under many fading realizations.
+
+    The geometry and fade-free budget of the links with access are computed
+    once (link_budget_pairs), then every realization only subtracts its
+    fading loss and recomputes the SNR-derived metrics.
+
+    Parameters:
+        cube (LinkCube): Cube with the logged positions, frequencies and access.
+        params (LinkParams): Link parameters, e.g. DOWNLINK.
+        n_realizations (int): Number of fading realizations.
+        model, k_db, rayleigh_below: As in fading_loss_db.
+        atmos_loss_db (float or np.ndarray): p618 attenuation, as in link_budget_pairs.
+        seed, workers: As in fading_realizations.
+
+    Returns:
+        dict: 'links' (t_idx, s_idx, k_idx), 'Elevation', 'Range' and 'Latency' per link,
+        'Fading_dB', 'SNR_dB', 'RSSI_dBm', 'Throughput', 'BER_QPSK' and 'BER_MQAM' of shape
+        (realization, link).
+    """
+    links = np.nonzero(cube.access)
+    clear = link_budget_pairs(*links, cube.lat, cube.lon, cube.freq, params, cube.stations, atmos_loss_db)
+    fading = fading_realizations(n_realizations, len(links[0]), model, k_db, clear['Elevation'],
+                                 rayleigh_below, seed, workers)
+
+    snr = clear['SNR_dB'] - fading
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {
+            'links': links,
+            'Elevation': clear['Elevation'],
+            'Range': clear['Range'],
+            'Latency': clear['Latency'],
+            'Fading_dB': fading,
+            'SNR_dB': snr,
+            'RSSI_dBm': clear['RSSI_dBm'] - fading,
+            'Throughput': shannon_throughput(snr, params.channel_bw),
+            'BER_QPSK': ber_qpsk(snr),
+            'BER_MQAM': ber_mqam(snr, params.mqam_order),
+        }
@@ -0,0 +1,136 @@
+import numpy as np
+
+
+# WGS84 ellipsoid, as used for MATLAB's 'geographic' coordinates
+WGS84_A = 6378137.0
+WGS84_E2 = 6.69437999014e-3
+SPEED_OF_LIGHT = 299792458.0  # m/s
+
+
+def geodetic_to_ecef(lat, lon, alt=0.0) -> np.ndarray:
+    """
+    Earth-centred, Earth-fixed coordinates of geodetic positions.
+
+    Parameters:
+        lat, lon (array_like): Latitude and longitude in degrees.
+        alt (array_like): Height above the ellipsoid in metres.
+
+    Returns:
+        np.ndarray: Array of shape broadcast(lat, lon, alt) + (3,) in metres.
+    """
+    lat = np.radians(lat)
+    lon = np.radians(lon)
+    sin_lat = np.sin(lat)
+    cos_lat = np.cos(lat)
+    n = WGS84_A / np.sqrt(1 - WGS84_E2 * sin_lat ** 2)
+    return np.stack(np.broadcast_arrays((n + alt) * cos_lat * np.cos(lon),
+                                        (n + alt) * cos_lat * np.sin(lon),
+                                        (n * (1 - WGS84_E2) + alt) * sin_lat), axis=-1)
+
+
+def ecef_to_geodetic(xyz):
+    """
+    Geodetic latitude, longitude (degrees) and height (metres) of ECEF positions.
+
+    Uses Bowring's closed form, accurate to well below a metre for LEO heights.
+    """
+    x, y, z = xyz[..., 0], xyz[..., 1], xyz[..., 2]
+    b = WGS84_A * np.sqrt(1 - WGS84_E2)
+    ep2 = (WGS84_A ** 2 - b ** 2) / b ** 2
+    p = np.hypot(x, y)
+    q = np.arctan2(z * WGS84_A, p * b)
+    lat = np.arctan2(z + ep2 * b * np.sin(q) ** 3, p - WGS84_E2 * WGS84_A * np.cos(q) ** 3)
+    n = WGS84_A / np.sqrt(1 - WGS84_E2 * np.sin(lat) ** 2)
+    alt = p / np.cos(lat) - n
+    return np.degrees(lat), np.degrees(np.arctan2(y, x)), alt
+
+
+def _rot_z(angle):
+    c, s = np.cos(angle), np.sin(angle)
+    zero, one = np.zeros_like(angle), np.ones_like(angle)
+    return np.stack([np.stack([c, s, zero], -1), np.stack([-s, c, zero], -1), np.stack([zero, zero, one], -1)], -2)
+
+
+def _rot_y(angle):
+    c, s = np.cos(angle), np.sin(angle)
+    zero, one = np.zeros_like(angle), np.ones_like(angle)
+    return np.stack([np.stack([c, zero, -s], -1), np.stack([zero, one, zero], -1), np.stack([s, zero, c], -1)], -2)
+
+
+def _j2000_days(times):
+    return (np.asarray(times, dtype='datetime64[ns]') - np.datetime64('2000-01-01T12:00:00')) / np.timedelta64(1, 'D')
+
+
+def _gmst(days):
+    centuries = days / 36525
+    return np.radians((280.46061837 + 360.98564736629 * days + 0.000387933 * centuries ** 2) % 360)
+
+
+def teme_to_ecef(times) -> np.ndarray:
+    """Rotation matrices from the TEME frame of TLE/SGP4 output to Earth-fixed axes (GMST rotation)."""
+    return _rot_z(_gmst(_j2000_days(times)))
+
+
+def inertial_to_ecef(times) -> np.ndarray:
+    """
+    Rotation matrices from the J2000 inertial frame to Earth-fixed axes.
+
+    IAU-76 precession followed by the GMST rotation; nutation and polar
+    motion are left out (a few millidegrees). This reproduces the Lat/Lon
+    MATLAB logs for two-body orbits to about 0.003 degrees.
+
+    Parameters:
+        times (np.ndarray): UTC times as datetime64.
+
+    Returns:
+        np.ndarray: Array of shape (len(times), 3, 3).
+    """
+    days = _j2000_days(times)
+    centuries = days / 36525
+    arcsec = np.pi / (180 * 3600)
+
+    zeta = (2306.2181 * centuries + 0.30188 * centuries ** 2 + 0.017998 * centuries ** 3) * arcsec
+    z = (2306.2181 * centuries + 1.09468 * centuries ** 2 + 0.018203 * centuries ** 3) * arcsec
+    theta = (2004.3109 * centuries - 0.42665 * centuries ** 2 - 0.041833 * centuries ** 3) * arcsec
+
+    return _rot_z(_gmst(days)) @ _rot_z(-z) @ _rot_y(theta) @ _rot_z(-zeta)
+
+
+def look_angles(sat_lat, sat_lon, sat_alt, station_lat, station_lon, station_alt=0.0, paired=False):
+    """
+    Slant range and elevation from ground stations to satellites.
+
+    Satellite arrays of shape (time, satellite) and station arrays of shape
+    (station,) give results of shape (time, satellite, station). With
+    paired=True the station arrays are matched element-wise with the
+    satellite arrays instead (e.g. flat lists of candidate links).
+
+    Parameters:
+        sat_lat, sat_lon (np.ndarray): Satellite sub-points in degrees (e.g. cube.lat, cube.lon).
+        sat_alt (float or np.ndarray): Satellite height above the ellipsoid in metres.
+        station_lat, station_lon (array_like): Station coordinates in degrees.
+        station_alt (float or array_like): Station heights in metres.
+        paired (bool): Match stations and satellites element-wise.
+
+    Returns:
+        tuple: (range in metres, elevation in degrees)
+    """
+    return look_angles_ecef(geodetic_to_ecef(sat_lat, sat_lon, sat_alt), station_lat, station_lon, station_alt, paired)
+
+
+def look_angles_ecef(sat_ecef, station_lat, station_lon, station_alt=0.0, paired=False):
+    """As look_angles, for satellite ECEF positions of shape (time, satellite, 3)."""
+    sat = sat_ecef if paired else sat_ecef[..., np.newaxis, :]
+    station_lat = np.asarray(station_lat, dtype=float)
+    station_lon = np.asarray(station_lon, dtype=float)
+    station = geodetic_to_ecef(station_lat, station_lon, station_alt)
+
+    # Local vertical of each station (ellipsoid normal)
+    lat = np.radians(station_lat)
+    lon = np.radians(station_lon)
+    up = np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=-1)
+
+    los = sat - station
+    distance = np.linalg.norm(los, axis=-1)
+    elevation = np.degrees(np.arcsin(np.einsum('...j,...j->...', los, up) / distance))
+    return distance, elevation
@@ -0,0 +1,221 @@
+import numpy as np
+import pandas as pd
+
+from utils.link_cube import LinkCube
+from utils.selection import BEST_METRICS, LOWER_IS_BETTER, best_satellite_index
+
+
+HANDOVER_COST = 3.0      # Score given up per handover, in units of the metric (dB for SNR_dB)
+MIN_DWELL = 1            # Time steps to stay on a satellite after a handover
+OUTAGE_SCORE = -1e6      # Score of a time step without a satellite, far below any link
+
+
+def viterbi_schedule(score, handover_cost=HANDOVER_COST, min_dwell=MIN_DWELL, outage_score=OUTAGE_SCORE):
+    """
+    Satellite sequence that maximizes the summed score minus the handover costs.
+
+    Viterbi over the time axis with one state per satellite plus an outage
+    state (-1) for steps without a usable satellite. A satellite entered by
+    a handover must be kept for `min_dwell` steps; the dwell is handled as
+    one segment transition (enter at t - min_dwell + 1, stay until t) using
+    prefix sums, so every step costs O(satellites) whatever the dwell.
+    Segments may be shorter only where the satellite's visibility run or the
+    horizon ends. The first connection and reconnections after an outage
+    are not handovers. Only the current score row is kept; the backtracking
+    tables are one int16 segment length per (time, satellite) and one
+    predecessor per time step.
+
+    Parameters:
+        score (np.ndarray): (time, satellite) link quality, higher is better, NaN where unavailable.
+        handover_cost (float): Score lost per handover.
+        min_dwell (int): Minimum steps on a satellite after a handover.
+        outage_score (float): Score of a step in outage.
+
+    Returns:
+        tuple: (path, total) with the satellite index per time step (-1 in outage) and the objective.
+    """
+    score = np.asarray(score, dtype=float)
+    n_time, n_sat = score.shape
+    if n_sat == 0:
+        return np.full(n_time, -1, dtype=np.int64), n_time * outage_score
+    dwell = max(int(min_dwell), 1)
+    available = ~np.isnan(score)
+    prefix = np.vstack([np.zeros(n_sat), np.cumsum(np.where(available, score, 0.0), axis=0)])
+
+    # Backtracking: 0 = stayed on the satellite, L = entered as a segment of L steps
+    segment = np.zeros((n_time, n_sat), dtype=np.int16)
+    # Best predecessor of a segment starting at t (state at t - 1), -1 for outage or the start
+    enter_value = np.empty(n_time + 1)
+    enter_from = np.empty(n_time + 1, dtype=np.int64)
+    outage_from = np.empty(n_time, dtype=np.int64)
+    enter_value[0], enter_from[0] = 0.0, -1
+
+    value = np.full(n_sat, -np.inf)
+    outage_value = 0.0
+    run_start = np.zeros(n_sat, dtype=np.int64)
+
+    for t in range(n_time):
+        run_start = np.where(available[t], run_start, t + 1)
+        if t > 0:
+            run_start = np.where(available[t] & ~available[t - 1], t, run_start)
+
+        stay = np.where(available[t], value + score[t], -np.inf)
+
+        # Full dwell segment [t - dwell + 1, t] on one satellite
+        start = t - dwell + 1
+        enter = np.full(n_sat, -np.inf)
+        length = np.zeros(n_sat, dtype=np.int16)
+        if start >= 0:
+            ok = available[t] & (run_start <= start)
+            enter = np.where(ok, enter_value[start] + prefix[t + 1] - prefix[start], -np.inf)
+            length[ok] = dwell
+
+        # Shorter segments where the satellite's run or the horizon ends
+        run_ends = available[t] & ((t == n_time - 1) | ~available[min(t + 1, n_time - 1)])
+        ends = np.flatnonzero(run_ends)
+        for seg in range(1, min(dwell, t + 2) if len(ends) else 1):
+            seg_start = t - seg + 1
+            candidate = enter_value[seg_start] + prefix[t + 1, ends] - prefix[seg_start, ends]
+            better = (run_start[ends] <= seg_start) & (candidate > enter[ends])
+            enter[ends[better]] = candidate[better]
+            length[ends[better]] = seg
+
+        # Outage at t follows an outage or any satellite at t - 1, without a handover cost
+        previous = int(value.argmax())
+        if value[previous] > outage_value:
+            outage_value, outage_from[t] = value[previous] + outage_score, previous
+        else:
+            outage_value, outage_from[t] = outage_value + outage_score, -1
+
+        # Staying wins ties, fewer handovers
+        entered = enter > stay
+        value = np.where(entered, enter, stay)
+        segment[t] = np.where(entered, length, 0)
+
+        best = int(value.argmax())
+        if value[best] - handover_cost > outage_value:
+            enter_value[t + 1], enter_from[t + 1] = value[best] - handover_cost, best
+        else:
+            enter_value[t + 1], enter_from[t + 1] = outage_value, -1
+
+    # Backtrack from the best final state
+    path = np.full(n_time, -1, dtype=np.int64)
+    state = int(value.argmax()) if value.max() > outage_value else -1
+    total = value[state] if state >= 0 else outage_value
+    t = n_time - 1
+    while t >= 0:
+        if state < 0:
+            state = outage_from[t]
+            t -= 1
+        elif segment[t, state] == 0:
+            path[t] = state
+            t -= 1
+        else:
+            seg_start = t - int(segment[t, state]) + 1
+            path[seg_start:t + 1] = state
+            state = enter_from[seg_start]
+            t = seg_start - 1
+    return path, float(total)
+
+
+def count_handovers(path) -> int:
+    """Switches between two satellites on consecutive steps (outages are not handovers)."""
+    path = np.asarray(path)
+    return int(np.count_nonzero((path[1:] != path[:-1]) & (path[1:] >= 0) & (path[:-1] >= 0)))
+
+
+def handover_schedule(cube: LinkCube, station, metric='SNR_dB', handover_cost=HANDOVER_COST, min_dwell=MIN_DWELL,
+                      outage_score=OUTAGE_SCORE) -> dict:
+    """
+    Handover-aware satellite schedule of one station, compared with the greedy per-step best.
+
+    Parameters:
+        cube (LinkCube): Link cube.
+        station (str): Station name.
+        metric (str): Link quality to maximize (minimized for BER and Latency).
+        handover_cost, min_dwell, outage_score: As in viterbi_schedule.
+
+    Returns:
+        dict: 'sat_index' and 'sat_id' per time step (-1/None in outage), 'handovers' and
+        'quality' (mean metric over the served steps), the same for the greedy
+        choice ('greedy_*') and 'quality_loss', the mean per-step metric given up
+        against greedy (positive is worse).
+    """
+    values = cube.sel(station=station, metric=metric).astype(float)
+    score = -values if metric in LOWER_IS_BETTER else values
+    path, _ = viterbi_schedule(score, handover_cost, min_dwell, outage_score)
+
+    n_sat = len(cube.sat_ids)
+    greedy = best_satellite_index(cube, station, metric)
+    greedy = np.where(greedy == n_sat, -1, greedy)
+
+    sat_names = np.array(cube.sat_ids + [None], dtype=object)
+    rows = np.arange(len(path))
+
+    def quality(choice):
+        picked = np.where(choice >= 0, values[rows, choice], np.nan)
+        return picked, float(np.nanmean(picked)) if np.any(choice >= 0) else np.nan
+
+    picked, mean_quality = quality(path)
+    greedy_picked, greedy_quality = quality(greedy)
+    loss = greedy_picked - picked if metric not in LOWER_IS_BETTER else picked - greedy_picked
+
+    return {
+        'sat_index': path,
+        'sat_id': sat_names[path],
+        'handovers': count_handovers(path),
+        'quality': mean_quality,
+        'greedy_sat_index': greedy,
+        'greedy_sat_id': sat_names[greedy],
+        'greedy_handovers': count_handovers(greedy),
+        'greedy_quality': greedy_quality,
+        'quality_loss': float(np.nanmean(loss)) if np.any(~np.isnan(loss)) else np.nan,
+    }
+
+
+def schedule_best_satellite(cube: LinkCube, stations, metric='SNR_dB', handover_cost=HANDOVER_COST,
+                            min_dwell=MIN_DWELL, convert_units=True) -> pd.DataFrame:
+    """
+    Drop-in for select_best_satellite with the handover-aware schedule instead of the greedy pick.
+
+    Returns:
+        pd.DataFrame: Time plus {Station}_Best_SAT_ID and {Station}_BEST_{SNR,RSSI,Thrpt,BER_MQAM,BER_QPSK,Latency}.
+    """
+    convert_units = convert_units and not cube.converted
+    rows = np.arange(len(cube.time))
+    results = {'Time': cube.time}
+
+    for station in stations:
+        schedule = handover_schedule(cube, station, metric, handover_cost, min_dwell)
+        path = schedule['sat_index']
+        results[f'{station}_Best_SAT_ID'] = schedule['sat_id']
+
+        for metric_name, short_name in BEST_METRICS.items():
+            if metric_name not in cube.metric_index:
+                continue
+            values = cube.sel(station=station, metric=metric_name).astype(float)
+            values = np.where(path >= 0, values[rows, path], np.nan)
+            if convert_units and metric_name == 'Throughput':
+                values = values / (1024 * 1024)  # Convert to Mbps
+            elif convert_units and metric_name == 'Latency':
+                values = values * 1000  # Convert to ms
+            results[f'{station}_BEST_{short_name}'] = values
+
+    return pd.DataFrame(results)
+
+
+def handover_summary(cube: LinkCube, stations, metric='SNR_dB', handover_cost=HANDOVER_COST,
+                     min_dwell=MIN_DWELL) -> pd.DataFrame:
+    """One row per station: handovers and mean quality of the schedule and of greedy, and the quality loss."""
+    rows = []
+    for station in stations:
+        schedule = handover_schedule(cube, station, metric, handover_cost, min_dwell)
+        rows.append({
+            'Station': station,
+            'Handovers': schedule['handovers'],
+            'Greedy_Handovers': schedule['greedy_handovers'],
+            f'Mean_{metric}': schedule['quality'],
+            f'Greedy_Mean_{metric}': schedule['greedy_quality'],
+            'Quality_Loss': schedule['quality_loss'],
+        })
+    return pd.DataFrame(rows)
@@ -0,0 +1,114 @@
+import numpy as np
+
+from utils.link_budget import LinkParams, shannon_throughput, thermal_noise_dbw
+from utils.link_cube import LinkCube
+
+
+SINR_METRICS = ['Interference_dBW', 'SINR_dB', 'SINR_Throughput']
+
+
+def overlap_factor(tx_freq, tx_bw, intf_freq, intf_bw):
+    """
+    F02_GetOverlapFactor.m over arrays: the share of the interferer's band
+    [intf_freq +- intf_bw/2] that falls inside [tx_freq +- tx_bw/2].
+    """
+    hi = np.minimum(tx_freq + tx_bw / 2, intf_freq + intf_bw / 2)
+    lo = np.maximum(tx_freq - tx_bw / 2, intf_freq - intf_bw / 2)
+    return np.maximum(0, hi - lo) / intf_bw
+
+
+def overlap_matrix(channel_freqs, channel_bw) -> np.ndarray:
+    """(channel, channel) overlap factors of a channel plan, [wanted, interferer], computed once per plan."""
+    freqs = np.asarray(channel_freqs, dtype=float)
+    return overlap_factor(freqs[:, np.newaxis], channel_bw, freqs[np.newaxis, :], channel_bw)
+
+
+def channel_index(freq, channel_freqs, tol=1e3) -> np.ndarray:
+    """
+    Channel number of every carrier in `freq` (e.g. cube.freq), -1 for
+    carriers outside the plan such as the 0 Hz of unlogged satellites.
+    """
+    plan = np.asarray(channel_freqs, dtype=float)
+    freq = np.nan_to_num(np.asarray(freq, dtype=float), nan=-np.inf)
+    nearest = np.abs(freq[..., np.newaxis] - plan).argmin(axis=-1)
+    return np.where(np.abs(plan[nearest] - freq) <= tol, nearest, -1)
+
+
+def interference_power(rssi_dbw, access, channels, overlap) -> np.ndarray:
+    """
+    Co-channel interference at every station receiver, per link.
+
+    The received power of all links with access is summed per (time,
+    station, channel) with one batched matrix product over the satellites,
+    spread over the wanted channels with the overlap matrix and finally read
+    back at each link's channel, minus the link's own power.
+
+    Parameters:
+        rssi_dbw (np.ndarray): Received power per (time, satellite, station) in dBW.
+        access (np.ndarray): Boolean (time, satellite, station) access; only these links interfere.
+        channels (np.ndarray): Channel number per (time, satellite), -1 if off plan.
+        overlap (np.ndarray): overlap_matrix of the channel plan.
+
+    Returns:
+        np.ndarray: Interference in W per (time, satellite, station).
+    """
+    n_channel = len(overlap)
+    with np.errstate(invalid='ignore'):
+        power = np.where(access & (channels >= 0)[..., np.newaxis], 10 ** (np.asarray(rssi_dbw, dtype=float) / 10), 0.0)
+    power = np.nan_to_num(power)
+
+    # One-hot channel of every satellite, zero rows for off-plan carriers
+    onehot = (channels[..., np.newaxis] == np.arange(n_channel)).astype(float)
+
+    # (time, station, satellite) @ (time, satellite, channel): power sent on each channel
+    on_channel = np.swapaxes(power, 1, 2) @ onehot
+    # Power landing in each wanted channel, then picked at every link's channel
+    in_channel = on_channel @ overlap.T
+    wanted = np.clip(channels, 0, None)
+    total = np.take_along_axis(in_channel, wanted[:, np.newaxis, :], axis=2)
+    own = power * overlap[wanted, wanted][..., np.newaxis]
+    return np.clip(np.swapaxes(total, 1, 2) - own, 0, None)
+
+
+def sinr_metrics(cube: LinkCube, params: LinkParams, freq=None) -> dict:
+    """
+    SINR of every downlink (satellite to station) in a cube with RSSI_dBm.
+
+    Every satellite with access to a station interferes with the station's
+    other links in proportion to the overlap of their channels, as given by
+    F02_GetOverlapFactor for the channel plan of `params`.
+
+    Parameters:
+        cube (LinkCube): Logged (or budget_cube) cube with RSSI_dBm in dBW.
+        params (LinkParams): Link parameters with the channel plan and noise, e.g. DOWNLINK.
+        freq (np.ndarray): Carrier per (time, satellite), defaults to the logged cube.freq.
+
+    Returns:
+        dict: SINR_METRICS as (time, satellite, station) arrays, NaN without access or off-plan carriers.
+        SINR_Throughput is in bits/s, or Mbps for a converted cube.
+    """
+    freq = cube.freq if freq is None else freq
+    rssi = cube.sel(metric='RSSI_dBm')
+    channels = channel_index(freq, params.channel_freqs)
+    overlap = overlap_matrix(params.channel_freqs, params.channel_bw)
+
+    interference = interference_power(rssi, cube.access, channels, overlap)
+    noise = 10 ** (thermal_noise_dbw(params.channel_bw, params.temp_k) / 10)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sinr = rssi - 10 * np.log10(noise + interference)
+        interference_dbw = 10 * np.log10(interference)
+    throughput = shannon_throughput(sinr, params.channel_bw)
+    if cube.converted:
+        throughput = throughput / (1024 * 1024)  # Mbps, as process_cube
+
+    valid = cube.access & (channels >= 0)[..., np.newaxis]
+    return {
+        'Interference_dBW': np.where(valid, interference_dbw, np.nan),
+        'SINR_dB': np.where(valid, sinr, np.nan),
+        'SINR_Throughput': np.where(valid, throughput, np.nan),
+    }
+
+
+def sinr_cube(cube: LinkCube, params: LinkParams, freq=None) -> LinkCube:
+    """Cube with the SINR_METRICS appended next to the existing SNR columns (see sinr_metrics)."""
+    return cube.with_metrics(sinr_metrics(cube, params, freq))
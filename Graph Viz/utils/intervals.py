@@ -0,0 +1,176 @@
+import numpy as np
+import pandas as pd
+
+from utils.config import TIME_FORMAT
+from utils.link_cube import LinkCube
+
+
+class AccessIntervals:
+    """
+    Run-length encoded access of a LinkCube, like MATLAB's accessIntervals.
+
+    Every pass (a run of consecutive time steps with access) is one record
+    (sat, station, start, end) with `end` exclusive. The link metrics are
+    kept only inside the passes: the samples of pass p are
+    metrics[name][offsets[p]:offsets[p + 1]], so memory grows with the
+    number of links with access instead of time x satellites x stations.
+
+    Lat/Lon/Freq_Hz are per satellite rather than per link and are kept as
+    (time, satellite) arrays only for the logged satellites; the others
+    read back as 0, as in the logs.
+    """
+
+    def __init__(self, time, sat_ids, stations, sat, station, start, end, metrics, sat_data, converted=False):
+        self.time = np.asarray(time)
+        self.timestamps = pd.to_datetime(pd.Series(self.time), format=TIME_FORMAT, errors='coerce').to_numpy()
+        self.sat_ids = list(sat_ids)
+        self.stations = list(stations)
+        self.sat = np.asarray(sat, dtype=np.int64)
+        self.station = np.asarray(station, dtype=np.int64)
+        self.start = np.asarray(start, dtype=np.int64)
+        self.end = np.asarray(end, dtype=np.int64)
+        self.metrics = metrics
+        self.sat_data = sat_data
+        self.converted = converted
+
+        self.lengths = self.end - self.start
+        self.offsets = np.concatenate([[0], np.cumsum(self.lengths)])
+
+    def __len__(self):
+        return len(self.start)
+
+    @property
+    def nbytes(self) -> int:
+        arrays = [self.sat, self.station, self.start, self.end, self.offsets]
+        arrays += list(self.metrics.values()) + list(self.sat_data['values'].values())
+        return sum(array.nbytes for array in arrays)
+
+    @classmethod
+    def from_cube(cls, cube: LinkCube):
+        """Encode the access runs of a cube and keep its metrics inside them."""
+        # Pad with no-access on both ends so every run has a rising and a falling edge
+        access = cube.access.transpose(1, 2, 0)
+        padded = np.zeros(access.shape[:2] + (access.shape[2] + 2,), dtype=np.int8)
+        padded[..., 1:-1] = access
+        edges = np.diff(padded, axis=-1)
+        sat, station, start = np.nonzero(edges == 1)
+        end = np.nonzero(edges == -1)[2]
+
+        # Time, satellite and station of every sample inside the passes
+        t_idx = _expand_runs(start, end)
+        s_idx = np.repeat(sat, end - start)
+        k_idx = np.repeat(station, end - start)
+        metrics = {name: cube.data[t_idx, s_idx, k_idx, m] for m, name in enumerate(cube.metrics)}
+
+        # Satellites with a pass or any logged position
+        logged = np.flatnonzero(np.any(np.nan_to_num(cube.lat) != 0, axis=0))
+        kept = np.union1d(sat, logged)
+        sat_data = {
+            'sats': kept,
+            'values': {'Lat': cube.lat[:, kept], 'Lon': cube.lon[:, kept], 'Freq_Hz': cube.freq[:, kept]},
+        }
+        return cls(cube.time, cube.sat_ids, cube.stations, sat, station, start, end, metrics, sat_data, cube.converted)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, dtype=np.float32):
+        """Encode a wide LEO{i}_{Station}_{Metric} frame (through a LinkCube of `dtype`)."""
+        return cls.from_cube(LinkCube.from_frame(df, dtype=dtype))
+
+    def to_cube(self) -> LinkCube:
+        """Expand back to a dense LinkCube, with NaN metrics outside the passes."""
+        n_time, n_sat, n_station = len(self.time), len(self.sat_ids), len(self.stations)
+        names = list(self.metrics)
+        first = self.metrics[names[0]] if names else np.empty(0, dtype=np.float32)
+        data = np.full((n_time, n_sat, n_station, len(names)), np.nan, dtype=first.dtype)
+        access = np.zeros((n_time, n_sat, n_station), dtype=bool)
+
+        links = self.sample_index()
+        access[links] = True
+        for m, name in enumerate(names):
+            data[links + (m,)] = self.metrics[name]
+
+        sat_data = {}
+        for field, values in self.sat_data['values'].items():
+            sat_data[field] = np.zeros((n_time, n_sat))
+            sat_data[field][:, self.sat_data['sats']] = values
+        return LinkCube(self.time, self.sat_ids, self.stations, names, data, access, sat_data, self.converted)
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Rebuild the wide frame (see LinkCube.to_frame).
+
+        This is not the logged frame column for column: the LEO{i}_Name
+        columns are not kept, TimeOut is in seconds since the first step
+        and the metrics have the dtype of the encoded cube (float32 unless
+        built with dtype=np.float64). Otherwise the values match the log.
+        """
+        return self.to_cube().to_frame()
+
+    def sample_index(self):
+        """(time, satellite, station) index arrays of every stored sample, in storage order."""
+        return (_expand_runs(self.start, self.end),
+                np.repeat(self.sat, self.lengths),
+                np.repeat(self.station, self.lengths))
+
+    def values(self, metric, p) -> np.ndarray:
+        """Samples of `metric` in pass `p`."""
+        return self.metrics[metric][self.offsets[p]:self.offsets[p + 1]]
+
+    def duration(self) -> np.ndarray:
+        """Pass durations in seconds, from the first to the last sample with access."""
+        return (self.timestamps[self.end - 1] - self.timestamps[self.start]) / np.timedelta64(1, 's')
+
+    def peak(self, metric) -> np.ndarray:
+        """Largest value of `metric` in every pass (NaN samples ignored)."""
+        return self._reduce(np.fmax, metric)
+
+    def low(self, metric) -> np.ndarray:
+        """Smallest value of `metric` in every pass (NaN samples ignored)."""
+        return self._reduce(np.fmin, metric)
+
+    def mean(self, metric) -> np.ndarray:
+        """Mean of `metric` over the samples of every pass (NaN samples ignored)."""
+        if not len(self):
+            return np.empty(0)
+        values = self.metrics[metric].astype(float)
+        valid = ~np.isnan(values)
+        sums = np.add.reduceat(np.where(valid, values, 0.0), self.offsets[:-1])
+        counts = np.add.reduceat(valid, self.offsets[:-1])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return sums / counts
+
+    def _reduce(self, ufunc, metric):
+        # Every pass has at least one sample, so reduceat never sees an empty segment
+        if not len(self):
+            return np.empty(0)
+        return ufunc.reduceat(self.metrics[metric].astype(float), self.offsets[:-1])
+
+    def to_table(self) -> pd.DataFrame:
+        """Pass table with the accessIntervals columns (Source, Target, IntervalNumber, StartTime, EndTime, Duration)."""
+        sat_ids = np.array(self.sat_ids, dtype=object)
+        stations = np.array(self.stations, dtype=object)
+        table = pd.DataFrame({
+            'Source': sat_ids[self.sat],
+            'Target': stations[self.station],
+            'StartTime': self.time[self.start],
+            'EndTime': self.time[self.end - 1],
+            'Duration': self.duration(),
+            'Samples': self.lengths,
+        })
+        table.insert(2, 'IntervalNumber', table.groupby(['Source', 'Target']).cumcount() + 1)
+        return table
+
+    def summary(self, metrics=('SNR_dB', 'Throughput')) -> pd.DataFrame:
+        """Pass table plus the peak and mean of the given metrics per pass."""
+        table = self.to_table()
+        for metric in metrics:
+            if metric in self.metrics:
+                table[f'Peak_{metric}'] = self.peak(metric)
+                table[f'Mean_{metric}'] = self.mean(metric)
+        return table
+
+
+def _expand_runs(start, end) -> np.ndarray:
+    """Concatenation of np.arange(start[i], end[i]) for all i, without a Python loop."""
+    lengths = end - start
+    return np.repeat(start - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
@@ -0,0 +1,244 @@
+"""
+Vectorized link budget of P07_SelectiveLogging.m.
+
+With the default atmos_loss_db=0 and fading_db=0 this is the clear-sky
+budget: on the shipped logs the SNR comes out about +29.7 dB above the
+logged one on the downlink and +43.4 dB on the uplink, and only Latency
+matches (0.08% mean, 0.26% max). P07 also takes off the P.618 At at
+0.001% exceedance and one Rician draw per link; pass them to reproduce
+the logs, e.g. atmos_loss_db=AttenuationTable.from_log(cube, DOWNLINK).atmos_loss(cube, DOWNLINK)
+(or AttenuationTable.cached() with itur) and fading_db=fading_loss_db(...).
+tests/test_link_budget.py checks this against both shipped logs.
+"""
+from dataclasses import dataclass, replace
+
+import numpy as np
+
+from utils.config import STATIONS
+from utils.geometry import SPEED_OF_LIGHT, look_angles
+from utils.link_cube import LinkCube
+
+try:
+    from scipy.special import erfc as _erfc
+except ImportError:
+    _erfc = None
+
+
+BOLTZMANN = 1.380649e-23  # J/K, physconst('Boltzmann')
+
+# Metrics in the order of the MATLAB logs
+BUDGET_METRICS = ['SNR_dB', 'RSSI_dBm', 'Throughput', 'BER_QPSK', 'BER_MQAM', 'Latency', 'TimeOut']
+
+
+@dataclass(frozen=True)
+class LinkParams:
+    """
+    Link parameters of one direction, named after P01_Parameters.m.
+
+    Losses are the MATLAB object defaults unless set in the scripts:
+    transmitter SystemLoss 5 dB, receiver SystemLoss 1.5 dB (P05/P04),
+    gaussianAntenna ApertureEfficiency 0.65.
+    """
+    channel_bw: float            # channelBW, Hz
+    channel_freqs: tuple         # channelFreqs, Hz
+    base_freq: float             # baseFreq, Hz
+    tx_power: float              # leoPower, dBW
+    tx_dish: float               # Transmit dish diameter in metres
+    rx_dish: float               # Receive dish diameter in metres
+    tx_system_loss: float = 5.0  # dB
+    rx_system_loss: float = 1.5  # dB
+    aperture_efficiency: float = 0.65
+    temp_k: float = 293.0        # tempK
+    mqam_order: int = 16         # M
+    altitude: float = 547e3      # walker.a - EarthRadius, metres
+
+    def with_changes(self, **changes):
+        """Copy with some parameters changed, e.g. DOWNLINK.with_changes(channel_bw=100e6)."""
+        return replace(self, **changes)
+
+
+# Starlink_Downlink/P01_Parameters.m: satellite transmits, 0.5 m dishes on both ends
+DOWNLINK = LinkParams(
+    channel_bw=250e6,
+    channel_freqs=tuple(1e9 * np.arange(10.7, 12.7 + 1e-9, 0.2)),
+    base_freq=11.7e9,
+    tx_power=10 * np.log10(10),
+    tx_dish=0.5,
+    rx_dish=0.5,
+)
+
+# Starlink_Uplink/P01_Parameters.m: 2.4 m ground dish transmits to the 0.5 m satellite dish
+UPLINK = LinkParams(
+    channel_bw=150e6,
+    channel_freqs=tuple(1e9 * np.arange(14.0, 14.5 + 1e-9, 0.05)),
+    base_freq=14.3e9,
+    tx_power=10 * np.log10(3),
+    tx_dish=2.4,
+    rx_dish=0.5,
+)
+
+
+def fspl_db(distance, freq):
+    """Free-space path loss in dB for a distance in metres and a frequency in Hz."""
+    return 20 * np.log10(4 * np.pi * distance * freq / SPEED_OF_LIGHT)
+
+
+def dish_gain_db(diameter, freq, efficiency=0.65):
+    """Peak gain in dBi of a parabolic dish (boresight gain of MATLAB's gaussianAntenna)."""
+    return 10 * np.log10(efficiency * (np.pi * diameter * freq / SPEED_OF_LIGHT) ** 2)
+
+
+def thermal_noise_dbw(channel_bw, temp_k=293.0):
+    """Thermal noise power 10*log10(kb*tempK*channelBW) in dBW."""
+    return 10 * np.log10(BOLTZMANN * temp_k * channel_bw)
+
+
+def shannon_throughput(snr_db, channel_bw):
+    """Shannon capacity channelBW*log2(1 + SNR) in bits/s."""
+    return channel_bw * np.log2(1 + 10 ** (snr_db / 10))
+
+
+def qfunc(x):
+    """Gaussian tail probability Q(x) = erfc(x/sqrt(2))/2, as MATLAB's qfunc."""
+    x = np.asarray(x, dtype=float)
+    if _erfc is not None:
+        return 0.5 * _erfc(x / np.sqrt(2))
+    return 0.5 * _erfc_approx(x / np.sqrt(2))
+
+
+def _erfc_approx(x):
+    # Chebyshev fit of erfc (Numerical Recipes erfcc), relative error < 1.2e-7,
+    # so the tiny BERs at high SNR stay accurate
+    z = np.abs(x)
+    t = 1 / (1 + 0.5 * z)
+    poly = -z * z - 1.26551223 + t * (1.00002368 + t * (0.37409196 + t * (0.09678418 + t * (
+        -0.18628806 + t * (0.27886807 + t * (-1.13520398 + t * (1.48851587 + t * (
+            -0.82215223 + t * 0.17087277))))))))
+    result = t * np.exp(poly)
+    return np.where(x >= 0, result, 2 - result)
+
+
+def ber_qpsk(snr_db):
+    """QPSK bit error rate qfunc(sqrt(2*SNR))."""
+    return qfunc(np.sqrt(2 * 10 ** (snr_db / 10)))
+
+
+def ber_mqam(snr_db, M=16):
+    """Approximate M-QAM bit error rate, as in P07_SelectiveLogging.m."""
+    snr = 10 ** (snr_db / 10)
+    return (4 / np.log2(M)) * (1 - 1 / np.sqrt(M)) * qfunc(np.sqrt(3 * snr / (M - 1)))
+
+
+def link_budget(lat, lon, freq, params: LinkParams, stations=None, atmos_loss_db=0.0, fading_db=0.0) -> dict:
+    """
+    Evaluate the P07 link budget over whole (time, satellite, station) arrays.
+
+    RSSI = tx_power + Gtx + Grx - tx_system_loss - rx_system_loss - FSPL - atmosLoss - fading,
+    which is sigstrength() minus the p618 and multipath losses of P07.
+
+    Parameters:
+        lat, lon (np.ndarray): Satellite sub-points in degrees, shape (time, satellite).
+        freq (np.ndarray): Carrier per (time, satellite) in Hz.
+        params (LinkParams): Link parameters, e.g. DOWNLINK or UPLINK.
+        stations (list): Station names from config.STATIONS, defaults to all of them.
+        atmos_loss_db (float or np.ndarray): p618 attenuation, broadcast to (time, satellite, station).
+        fading_db (float or np.ndarray): Multipath fading loss, broadcast likewise.
+
+    Returns:
+        dict: Elevation, Range and the BUDGET_METRICS except TimeOut as (time, satellite, station) arrays.
+    """
+    stations = list(STATIONS) if stations is None else list(stations)
+    station_lat, station_lon = np.array([STATIONS[station] for station in stations]).T
+
+    distance, elevation = look_angles(lat, lon, params.altitude, station_lat, station_lon)
+    freq = np.asarray(freq, dtype=float)[..., np.newaxis]
+    return _link_metrics(distance, elevation, freq, params, atmos_loss_db, fading_db)
+
+
+def link_budget_pairs(t_idx, s_idx, k_idx, lat, lon, freq, params: LinkParams, stations=None,
+                      atmos_loss_db=0.0, fading_db=0.0) -> dict:
+    """
+    Evaluate the link budget only for the given (time, satellite, station) links.
+
+    The links are flat index arrays, e.g. from VisibilityIndex.pairs() or
+    np.nonzero(access), so the cost scales with the number of visible links
+    instead of time x satellites x stations.
+
+    Parameters:
+        t_idx, s_idx, k_idx (np.ndarray): Time, satellite and station index of every link.
+        lat, lon, freq, params, stations: As in link_budget.
+        atmos_loss_db, fading_db (float or np.ndarray): Scalars, or (time, satellite, station) arrays
+            that are read at the given links.
+
+    Returns:
+        dict: As link_budget, with one value per link.
+    """
+    stations = list(STATIONS) if stations is None else list(stations)
+    station_lat, station_lon = np.array([STATIONS[station] for station in stations]).T
+    links = (t_idx, s_idx, k_idx)
+
+    distance, elevation = look_angles(lat[t_idx, s_idx], lon[t_idx, s_idx], params.altitude,
+                                      station_lat[k_idx], station_lon[k_idx], paired=True)
+    freq = np.asarray(freq, dtype=float)[t_idx, s_idx]
+    atmos_loss_db = atmos_loss_db if np.ndim(atmos_loss_db) == 0 else np.asarray(atmos_loss_db)[links]
+    fading_db = fading_db if np.ndim(fading_db) == 0 else np.asarray(fading_db)[links]
+    return _link_metrics(distance, elevation, freq, params, atmos_loss_db, fading_db)
+
+
+def _link_metrics(distance, elevation, freq, params, atmos_loss_db, fading_db):
+    # Unlogged satellites have a zero or NaN frequency, their metrics come out NaN/-inf
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gains = (dish_gain_db(params.tx_dish, freq, params.aperture_efficiency)
+                 + dish_gain_db(params.rx_dish, freq, params.aperture_efficiency))
+        rssi = (params.tx_power + gains - params.tx_system_loss - params.rx_system_loss
+                - fspl_db(distance, freq) - atmos_loss_db - fading_db)
+        snr = rssi - thermal_noise_dbw(params.channel_bw, params.temp_k)
+        throughput = shannon_throughput(snr, params.channel_bw)
+        ber = ber_qpsk(snr), ber_mqam(snr, params.mqam_order)
+
+    return {
+        'Elevation': elevation,
+        'Range': distance,
+        'SNR_dB': snr,
+        'RSSI_dBm': rssi,  # dBW, named as in the logs
+        'Throughput': throughput,
+        'BER_QPSK': ber[0],
+        'BER_MQAM': ber[1],
+        # Straight-line range, 0.08% mean (0.26% max) relative error against the logged latency
+        'Latency': distance / SPEED_OF_LIGHT,
+    }
+
+
+def budget_cube(cube: LinkCube, params: LinkParams, access=None, freq=None, atmos_loss_db=0.0, fading_db=0.0) -> LinkCube:
+    """
+    Recompute the link metrics of a cube from its logged geometry.
+
+    The Lat/Lon (and by default Freq_Hz) of `cube` are reused, so a what-if
+    study only changes `params`, e.g. budget_cube(cube, DOWNLINK.with_changes(mqam_order=64)).
+    Only links with access are evaluated (see link_budget_pairs); the others
+    get NaN metrics, as in the logs.
+
+    Parameters:
+        cube (LinkCube): Cube with the logged satellite positions.
+        params (LinkParams): Link parameters.
+        access (np.ndarray): Boolean (time, satellite, station) access, defaults to cube.access
+            (or e.g. VisibilityIndex.access() for a propagated constellation).
+        freq (np.ndarray): Carrier per (time, satellite), defaults to cube.freq.
+        atmos_loss_db, fading_db: As in link_budget.
+
+    Returns:
+        LinkCube: Unconverted cube with the BUDGET_METRICS (TimeOut is the sample time, as logged).
+    """
+    access = cube.access if access is None else access
+    freq = cube.freq if freq is None else freq
+    links = np.nonzero(access)
+    budget = link_budget_pairs(*links, cube.lat, cube.lon, freq, params, cube.stations, atmos_loss_db, fading_db)
+
+    seconds = (cube.timestamps - cube.timestamps[0]) / np.timedelta64(1, 's')
+    budget['TimeOut'] = seconds[links[0]]
+
+    data = np.full(access.shape + (len(BUDGET_METRICS),), np.nan, dtype=cube.data.dtype)
+    for m, metric in enumerate(BUDGET_METRICS):
+        data[links + (m,)] = budget[metric]
+    sat_data = {'Lat': cube.lat, 'Lon': cube.lon, 'Freq_Hz': np.asarray(freq, dtype=float)}
+    return LinkCube(cube.time, cube.sat_ids, cube.stations, BUDGET_METRICS, data, access, sat_data)
@@ -0,0 +1,184 @@
+import numpy as np
+import pandas as pd
+
+from utils.config import TIME_FORMAT
+from utils.schema import Schema
+
+
+# Numeric per-satellite columns (LEO{i}_Lat, ...) kept as (time, satellite) arrays
+SAT_FIELDS = ['Lat', 'Lon', 'Freq_Hz']
+
+
+class LinkCube:
+    """
+    Dense in-memory view of a wide simulation log.
+
+    Link metrics are held in one float32 array with axes
+    (time, satellite, station, metric), the access flags in a boolean
+    (time, satellite, station) array and Lat/Lon/Freq_Hz in
+    (time, satellite) arrays. Satellites are sorted by number, so LEO2
+    comes before LEO10. TimeOut is stored as seconds since the first
+    time step.
+
+    The header is indexed once by a Schema in `from_frame`; after that every lookup is
+    a dict access and `sel` returns a view into the array.
+    """
+
+    def __init__(self, time, sat_ids, stations, metrics, data, access, sat_data, converted=False):
+        self.time = np.asarray(time)
+        self.timestamps = pd.to_datetime(pd.Series(self.time), format=TIME_FORMAT, errors='coerce').to_numpy()
+        self.sat_ids = list(sat_ids)
+        self.stations = list(stations)
+        self.metrics = list(metrics)
+        self.data = data
+        self.access = access
+        self.lat = sat_data['Lat']
+        self.lon = sat_data['Lon']
+        self.freq = sat_data['Freq_Hz']
+        # True once Throughput is in Mbps and Latency in ms (see process_cube)
+        self.converted = converted
+
+        self.sat_index = {sat_id: i for i, sat_id in enumerate(self.sat_ids)}
+        self.station_index = {station: i for i, station in enumerate(self.stations)}
+        self.metric_index = {metric: i for i, metric in enumerate(self.metrics)}
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, dtype=np.float32):
+        """Build a cube from a wide LEO{i}_{Station}_{Metric} DataFrame."""
+        schema = Schema(df.columns)
+        stations = schema.stations
+        metrics = [metric for metric in schema.link_metrics if metric != 'Access']
+
+        # Satellite number -> position on the satellite axis (the extra last entry catches sat == -1)
+        sat_pos = np.full(schema.sat.max() + 2, -1)
+        sat_pos[schema.sat_nums] = np.arange(len(schema.sat_nums))
+        metric_pos = np.full(len(schema.metrics), -1)
+        metric_pos[[schema.metric_codes[metric] for metric in metrics]] = np.arange(len(metrics))
+
+        n_time, n_sat, n_station, n_metric = len(df), len(schema.sat_nums), len(stations), len(metrics)
+        data = np.full((n_time, n_sat, n_station, n_metric), np.nan, dtype=dtype)
+        access = np.zeros((n_time, n_sat, n_station), dtype=bool)
+        sat_data = {field: np.full((n_time, n_sat), np.nan) for field in SAT_FIELDS}
+
+        # Destination of every link column in the flattened (satellite, station, metric) axes
+        link = schema.station >= 0
+        link_dest = (sat_pos[schema.sat] * n_station + schema.station) * n_metric + metric_pos[schema.metric]
+
+        access_mask = schema.mask(metrics='Access')
+        timeout_mask = schema.mask(metrics='TimeOut')
+        metric_mask = link & ~access_mask & ~timeout_mask
+
+        metric_cols, metric_dest = np.flatnonzero(metric_mask), link_dest[metric_mask]
+        timeout_cols, timeout_dest = np.flatnonzero(timeout_mask), link_dest[timeout_mask]
+        access_cols = np.flatnonzero(access_mask)
+        access_dest = sat_pos[schema.sat[access_mask]] * n_station + schema.station[access_mask]
+
+        flat_data = data.reshape(n_time, -1)
+        if metric_cols.size:
+            flat_data[:, metric_dest] = df.iloc[:, metric_cols].to_numpy(dtype=dtype, na_value=np.nan)
+
+        if timeout_cols.size:
+            # Parse all TimeOut columns in one call, stored as seconds since the first step
+            raw = df.iloc[:, timeout_cols].to_numpy().ravel()
+            parsed_times = pd.to_datetime(pd.Series(raw), format=TIME_FORMAT, errors='coerce')
+            time0 = pd.to_datetime(pd.Series(df['Time'].iloc[:1]), format=TIME_FORMAT, errors='coerce').iloc[0]
+            seconds = (parsed_times - time0).dt.total_seconds().to_numpy()
+            flat_data[:, timeout_dest] = seconds.reshape(n_time, len(timeout_cols))
+
+        if access_cols.size:
+            access_values = df.iloc[:, access_cols].to_numpy(dtype=float, na_value=np.nan)
+            access.reshape(n_time, -1)[:, access_dest] = np.nan_to_num(access_values) != 0
+
+        for field in SAT_FIELDS:
+            cols = schema.positions(metrics=field)
+            if cols.size:
+                sat_data[field][:, sat_pos[schema.sat[cols]]] = df.iloc[:, cols].to_numpy(dtype=float, na_value=np.nan)
+
+        return cls(df['Time'].to_numpy(), schema.sat_ids, stations, metrics, data, access, sat_data)
+
+    @classmethod
+    def from_csv(cls, path, **kwargs):
+        return cls.from_frame(pd.read_csv(path, **kwargs))
+
+    def _key(self, index, key):
+        if key is None:
+            return slice(None)
+        if isinstance(key, str):
+            return index[key]
+        return [index[k] for k in key]
+
+    def sel(self, sat=None, station=None, metric=None) -> np.ndarray:
+        """
+        Select a block of the cube by name.
+
+        Single names drop the axis and return a view, e.g.
+        cube.sel(station='Sydney', metric='SNR_dB') is a (time x satellite) view.
+        Lists of names keep the axis (and copy, as with any fancy indexing).
+        """
+        keys = (self._key(self.sat_index, sat),
+                self._key(self.station_index, station),
+                self._key(self.metric_index, metric))
+        return _take(self.data, keys)
+
+    def sel_access(self, sat=None, station=None) -> np.ndarray:
+        """Select from the boolean access array by name."""
+        return _take(self.access, (self._key(self.sat_index, sat), self._key(self.station_index, station)))
+
+    def subset(self, sat_ids):
+        """Return a new cube holding only `sat_ids`, in the given order."""
+        idx = [self.sat_index[sat_id] for sat_id in sat_ids]
+        sat_data = {'Lat': self.lat[:, idx], 'Lon': self.lon[:, idx], 'Freq_Hz': self.freq[:, idx]}
+        return LinkCube(self.time, sat_ids, self.stations, self.metrics,
+                        self.data[:, idx], self.access[:, idx], sat_data, self.converted)
+
+    def with_metrics(self, new_metrics: dict):
+        """Return a new cube with extra (time, satellite, station) metric arrays appended."""
+        names = list(new_metrics)
+        extra = np.stack([np.asarray(new_metrics[name], dtype=self.data.dtype) for name in names], axis=-1)
+        sat_data = {'Lat': self.lat, 'Lon': self.lon, 'Freq_Hz': self.freq}
+        return LinkCube(self.time, self.sat_ids, self.stations, self.metrics + names,
+                        np.concatenate([self.data, extra], axis=-1), self.access, sat_data, self.converted)
+
+    def dual_access_ids(self, stations=None) -> list:
+        """Satellites that have access to every station in `stations` at least once."""
+        station_idx = self._key(self.station_index, stations)
+        seen = self.access[:, :, station_idx].any(axis=0)
+        if seen.ndim > 1:
+            seen = seen.all(axis=1)
+        return [sat_id for sat_id, ok in zip(self.sat_ids, seen) if ok]
+
+    def frame(self, station, metric, sat_ids=None) -> pd.DataFrame:
+        """Small wide frame of one station metric, with LEO{i}_{Station}_{Metric} column names, for plotting."""
+        sat_ids = self.sat_ids if sat_ids is None else list(sat_ids)
+        values = self.sel(sat=sat_ids, station=station, metric=metric)
+        return pd.DataFrame(values, columns=[f'{sat_id}_{station}_{metric}' for sat_id in sat_ids])
+
+    def to_frame(self) -> pd.DataFrame:
+        """Rebuild the wide LEO{i}_{Station}_{Metric} frame (TimeOut stays in seconds)."""
+        columns = {'Time': self.time}
+        for s, sat_id in enumerate(self.sat_ids):
+            columns[f'{sat_id}_Lat'] = self.lat[:, s]
+            columns[f'{sat_id}_Lon'] = self.lon[:, s]
+            columns[f'{sat_id}_Freq_Hz'] = self.freq[:, s]
+            for k, station in enumerate(self.stations):
+                columns[f'{sat_id}_{station}_Access'] = self.access[:, s, k].astype(int)
+                for m, metric in enumerate(self.metrics):
+                    columns[f'{sat_id}_{station}_{metric}'] = self.data[:, s, k, m]
+        return pd.DataFrame(columns)
+
+
+def _take(array, keys):
+    """Index the non-time axes of `array` with ints, slices or lists of positions."""
+    if not any(isinstance(k, list) for k in keys):
+        return array[(slice(None),) + tuple(keys)]
+    # Index one axis at a time so lists combine as an outer product and
+    # the axis order is kept
+    for axis, k in enumerate(keys, start=1):
+        if isinstance(k, list):
+            array = np.take(array, k, axis=axis)
+    keys = tuple(slice(None) if isinstance(k, list) else k for k in keys)
+    return array[(slice(None),) + keys]
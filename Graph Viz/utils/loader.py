@@ -0,0 +1,255 @@
+import csv
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from utils.config import CACHE_FOLDER
+from utils.schema import Schema
+
+
+# Bump when the on-disk layout changes so old caches are rebuilt
+CACHE_VERSION = 2
+
+
+def file_hash(path, block_size=1 << 20) -> str:
+    """SHA-1 of the file content."""
+    sha = hashlib.sha1()
+    with open(path, 'rb') as f:
+        while block := f.read(block_size):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def cache_dir_for(path, cache_folder=CACHE_FOLDER) -> str:
+    """Cache directory of a log file, e.g. .cache/Satellite_..._downlink-1a2b3c4d5e6f."""
+    abs_path = os.path.abspath(path)
+    stem = os.path.splitext(os.path.basename(abs_path))[0]
+    return os.path.join(cache_folder, f"{stem}-{hashlib.sha1(abs_path.encode()).hexdigest()[:12]}")
+
+
+def _read_meta(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, 'meta.json')) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get('version') == CACHE_VERSION else None
+
+
+def _write_meta(cache_dir, meta):
+    fd, tmp_file = tempfile.mkstemp(prefix='meta.', suffix='.tmp', dir=cache_dir)
+    with os.fdopen(fd, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp_file, os.path.join(cache_dir, 'meta.json'))
+
+
+def _column_group(series):
+    if pd.api.types.is_integer_dtype(series) or pd.api.types.is_bool_dtype(series):
+        return 'int'
+    if pd.api.types.is_numeric_dtype(series):
+        return 'float'
+    return 'str'
+
+
+def build_cache(path, cache_dir) -> dict:
+    """
+    Parse the CSV once and write one column-major .npy block per dtype group.
+
+    Integer columns (e.g. Access) are stored as int64, other numeric
+    columns as float64, and Name, Time and *_TimeOut columns as
+    fixed-width strings, so loads give back the logged timestamps
+    as pd.read_csv does. Column-major order keeps every column
+    contiguous, so a projection only touches the pages of its columns.
+    """
+    stat = os.stat(path)
+    df = pd.read_csv(path)
+
+    # A private build directory next to the cache, so concurrent builders
+    # never write into or delete each other's files
+    parent = os.path.dirname(os.path.abspath(cache_dir))
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=os.path.basename(cache_dir) + '.', suffix='.tmp', dir=parent)
+    try:
+        meta = _write_cache(path, stat, df, tmp_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    # Move the build in. A cache another builder made from the same log is
+    # kept (readers may have it open); a stale one is renamed aside first
+    for attempt in range(3):
+        try:
+            os.replace(tmp_dir, cache_dir)
+            return meta
+        except OSError:
+            current = _read_meta(cache_dir)
+            if current is not None and current['sha1'] == meta['sha1']:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                return current
+            if attempt == 2:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                raise
+        try:
+            os.replace(cache_dir, tmp_dir + '.old')
+        except OSError:
+            pass
+        shutil.rmtree(tmp_dir + '.old', ignore_errors=True)
+
+
+def _write_cache(path, stat, df, tmp_dir):
+    groups = {}
+    for col in df.columns:
+        groups.setdefault(_column_group(df[col]), []).append(col)
+
+    layout = {}
+    for group, cols in groups.items():
+        if group == 'int':
+            block = df[cols].to_numpy(dtype=np.int64)
+        elif group == 'float':
+            block = df[cols].to_numpy(dtype=np.float64)
+        else:
+            block = df[cols].fillna('').to_numpy(dtype=str)
+        np.save(os.path.join(tmp_dir, f'{group}.npy'), np.asfortranarray(block), allow_pickle=False)
+        for i, col in enumerate(cols):
+            layout[col] = [group, i]
+
+    meta = {
+        'version': CACHE_VERSION,
+        'source': os.path.abspath(path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha1': file_hash(path),
+        'columns': list(df.columns),
+        'layout': layout,
+    }
+    _write_meta(tmp_dir, meta)
+    return meta
+
+
+def load_log(path, columns=None, cache_folder=CACHE_FOLDER, mmap=True) -> pd.DataFrame:
+    """
+    Load a simulation log through a columnar cache.
+
+    The first call parses the CSV and writes typed column-major blocks under
+    `cache_folder`. Later calls memory-map the blocks and read only the
+    requested columns. The cache is keyed by file size and mtime; if those
+    changed, the content hash decides whether the CSV really changed and
+    the cache is rebuilt.
+
+    Parameters:
+        path (str): Path of the CSV log.
+        columns (list): Optional column projection, in the order wanted.
+        cache_folder (str): Where the caches are kept.
+        mmap (bool): Memory-map the cached blocks instead of reading them whole.
+
+    Returns:
+        pd.DataFrame: The log as pd.read_csv gives it, with Time and *_TimeOut as the logged strings.
+    """
+    cache_dir = cache_dir_for(path, cache_folder)
+    stat = os.stat(path)
+    meta = _read_meta(cache_dir)
+
+    if meta is None or meta['size'] != stat.st_size:
+        meta = build_cache(path, cache_dir)
+    elif meta['mtime_ns'] != stat.st_mtime_ns:
+        # Touched but maybe not modified, only rebuild if the content changed
+        if file_hash(path) == meta['sha1']:
+            meta['mtime_ns'] = stat.st_mtime_ns
+            _write_meta(cache_dir, meta)
+        else:
+            meta = build_cache(path, cache_dir)
+
+    layout = meta['layout']
+    columns = meta['columns'] if columns is None else list(columns)
+    missing = [col for col in columns if col not in layout]
+    if missing:
+        raise KeyError(f"Columns not in {path}: {missing}")
+
+    # Gather the wanted positions per block, then read each block once
+    wanted = {}
+    for col in columns:
+        group, i = layout[col]
+        wanted.setdefault(group, ([], []))
+        wanted[group][0].append(col)
+        wanted[group][1].append(i)
+
+    mmap_mode = 'r' if mmap else None
+    frames = []
+    for group, (cols, idx) in wanted.items():
+        block = np.load(os.path.join(cache_dir, f'{group}.npy'), mmap_mode=mmap_mode)
+        values = np.asarray(block[:, idx])
+        if group == 'str':
+            # Empty cells were stored as '', give them back as NaN
+            values = values.astype(object)
+            values[values == ''] = np.nan
+        frames.append(pd.DataFrame(values, columns=cols))
+
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, axis=1)[columns]
+
+
+def read_header(path) -> list:
+    """Column names from the first CSV line (much cheaper than pd.read_csv(nrows=0) on wide logs)."""
+    with open(path, newline='') as f:
+        return next(csv.reader(f))
+
+
+def load_header(path, cache_folder=CACHE_FOLDER) -> list:
+    """Column names of a log, from the cache if it is up to date, else from the CSV header."""
+    meta = _read_meta(cache_dir_for(path, cache_folder))
+    stat = os.stat(path)
+    if meta is not None and (meta['size'], meta['mtime_ns']) == (stat.st_size, stat.st_mtime_ns):
+        return meta['columns']
+    return read_header(path)
+
+
+def dual_access_ids(access_df: pd.DataFrame, stations=('Sydney', 'Melbourne')) -> list:
+    """
+    Satellites with access to every station at least once (the filter_dual_access rule).
+
+    `access_df` only needs the LEO{i}_{Station}_Access columns. IDs are sorted by number.
+    """
+    schema = Schema(access_df.columns)
+    access_seen = (access_df.fillna(0) != 0).any().to_numpy()
+    return [f'LEO{num}' for num in schema.dual_access_sat_nums(access_seen, stations)]
+
+
+def read_visible_log(path, stations=('Sydney', 'Melbourne'), sat_ids=None, cached=False, metrics=None):
+    """
+    Read only the columns of satellites that can connect to every station.
+
+    The header and the _Access columns are read first to pick the satellites
+    (unless `sat_ids` is given), then the log is read again with usecols
+    limited to Time and those satellites' columns, so the columns of
+    satellites that never see the stations are never parsed.
+
+    Parameters:
+        path (str): Path of the CSV log.
+        stations (list): Stations every kept satellite must have access to.
+        sat_ids (list): Satellites to read, skipping the access pre-scan
+            (e.g. the IDs found for the matching downlink log).
+        cached (bool): Read through load_log instead of pd.read_csv.
+        metrics (list): Only read these per-satellite columns (e.g. ['SNR_dB', 'Throughput']), all by default.
+
+    Returns:
+        tuple: (DataFrame, sat_ids)
+    """
+    columns = load_header(path) if cached else read_header(path)
+
+    def read(usecols):
+        if cached:
+            return load_log(path, columns=usecols)
+        return pd.read_csv(path, usecols=usecols)[usecols]
+
+    schema = Schema(columns)
+    if sat_ids is None:
+        sat_ids = dual_access_ids(read(schema.select(stations=stations, metrics='Access')), stations)
+
+    usecols = ['Time'] + schema.select(sats=sat_ids, metrics=metrics)
+    return read(usecols), list(sat_ids)
@@ -0,0 +1,195 @@
+import numpy as np
+import pandas as pd
+
+from utils.handover import HANDOVER_COST, count_handovers
+from utils.intervals import AccessIntervals
+from utils.selection import LOWER_IS_BETTER
+
+
+LOOKAHEAD_STEPS = 10     # Look-ahead horizon in time steps
+LOOKAHEAD_DISCOUNT = 0.5 # Weight of each further look-ahead step relative to the one before
+HYSTERESIS = 1.0         # Look-ahead score gain (metric units) needed to leave a satellite that is still visible
+
+
+class LookaheadPlanner:
+    """
+    Handover planning from the remaining visibility window of every candidate.
+
+    The windows come from the access runs of an AccessIntervals: a
+    candidate's window ends with its current pass. (The logged
+    LEO{i}_{Station}_TimeOut column is the sample time in the shipped logs,
+    not the end of access, so the runs are the reliable source.)
+
+    The look-ahead score of every in-pass sample is computed once over the
+    packed pass metrics: the mean metric over the visible part of the next
+    `horizon` steps, each step weighted `discount` times the one before,
+    minus `handover_cost` when the pass ends inside the horizon (the
+    handover it will force). A satellite about to set therefore loses
+    against one that stays up, while the discount keeps a rising satellite
+    that is weak now from winning on its future alone. Planning then only
+    reads these scores, without scanning the log again.
+
+    Parameters:
+        intervals (AccessIntervals): Access runs and per-pass metrics.
+        metric (str): Link quality (lower is better for BER and Latency).
+        horizon (int): Look-ahead steps.
+        discount (float): Weight ratio of consecutive look-ahead steps, 1 for a plain mean.
+        handover_cost (float): Score penalty of a forced handover, in metric units.
+    """
+
+    def __init__(self, intervals: AccessIntervals, metric='SNR_dB', horizon=LOOKAHEAD_STEPS,
+                 discount=LOOKAHEAD_DISCOUNT, handover_cost=HANDOVER_COST):
+        self.intervals = intervals
+        self.metric = metric
+        self.horizon = max(int(horizon), 1)
+        self.discount = discount
+        self.handover_cost = handover_cost
+
+        self.values = intervals.metrics[metric].astype(float)
+        values = -self.values if metric in LOWER_IS_BETTER else self.values
+        valid = ~np.isnan(values)
+        self.now = np.where(valid, values, -np.inf)  # Current-step quality, higher is better
+
+        # Every stored sample, with the end (in sample positions) of its pass
+        self.t_idx, self.s_idx, self.k_idx = intervals.sample_index()
+        position = np.arange(len(values))
+        pass_end = np.repeat(intervals.offsets[1:], intervals.lengths)
+
+        # Discounted sums over the visible part of the horizon, one shifted view per step
+        total = np.zeros(len(values))
+        weight = np.zeros(len(values))
+        for step in range(self.horizon):
+            ahead = position + step
+            inside = ahead < pass_end
+            ahead = np.where(inside, ahead, position)
+            use = inside & valid[ahead]
+            total += np.where(use, discount ** step * values[ahead], 0.0)
+            weight += np.where(use, discount ** step, 0.0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = total / weight
+        sets = pass_end < position + self.horizon
+        self.score = np.where(weight > 0, mean - handover_cost * sets, -np.inf)
+        self.remaining = pass_end - position  # Steps left in the pass, this one included
+
+        # Samples grouped by (station, time) for the planning sweep
+        order = np.lexsort((self.s_idx, self.t_idx, self.k_idx))
+        self.order = order
+        group = self.k_idx[order] * len(intervals.time) + self.t_idx[order]
+        self.group_keys, self.group_starts = np.unique(group, return_index=True)
+        self.group_ends = np.append(self.group_starts[1:], len(order))
+
+    def plan(self, station, hysteresis=HYSTERESIS) -> dict:
+        """
+        Planned satellite per time step of one station.
+
+        The current satellite is kept while it stays visible unless another
+        candidate's look-ahead score is higher by more than `hysteresis` and
+        its metric at this step is at least as good; when it sets, the
+        best-scoring candidate takes over. The plan is compared with the
+        greedy per-step best, as in handover.handover_schedule.
+
+        Returns:
+            dict: 'sat_index' (-1 without candidates), 'sat_id', 'reason' per step
+            ('acquire', 'set', 'lookahead' at a switch, '' otherwise), 'remaining'
+            (steps left in the chosen pass), 'handovers' and 'quality' (mean metric
+            over the served steps), the same for the greedy choice ('greedy_*') and
+            'quality_loss', the mean per-step metric given up against greedy
+            (positive is worse).
+        """
+        k = self.intervals.stations.index(station)
+        n_time = len(self.intervals.time)
+        sat = np.full(n_time, -1, dtype=np.int64)
+        greedy = np.full(n_time, -1, dtype=np.int64)
+        picked = np.full(n_time, np.nan)
+        greedy_picked = np.full(n_time, np.nan)
+        remaining = np.zeros(n_time, dtype=np.int64)
+        reason = np.full(n_time, '', dtype=object)
+
+        first, last = np.searchsorted(self.group_keys, [k * n_time, (k + 1) * n_time])
+        current = -1
+        for g in range(first, last):
+            t = self.group_keys[g] - k * n_time
+            samples = self.order[self.group_starts[g]:self.group_ends[g]]
+            scores = self.score[samples]
+            now = self.now[samples]
+            best = int(scores.argmax())
+
+            # Greedy: best metric at this step, ties to the lowest satellite number
+            top = int(now.argmax())
+            if now[top] > -np.inf:
+                greedy[t] = self.s_idx[samples[top]]
+                greedy_picked[t] = self.values[samples[top]]
+
+            held = np.flatnonzero(self.s_idx[samples] == current)
+            if len(held) and (scores[best] <= scores[held[0]] + hysteresis or now[best] < now[held[0]]):
+                choice = held[0]
+            else:
+                choice = best
+                if current < 0:
+                    reason[t] = 'acquire'
+                else:
+                    reason[t] = 'set' if not len(held) else 'lookahead'
+
+            current = self.s_idx[samples[choice]]
+            sat[t] = current
+            picked[t] = self.values[samples[choice]]
+            remaining[t] = self.remaining[samples[choice]]
+            if t + 1 < n_time and (g + 1 >= last or self.group_keys[g + 1] - k * n_time != t + 1):
+                current = -1  # No candidates at the next step
+
+        def mean(values):
+            return float(np.nanmean(values)) if np.any(~np.isnan(values)) else np.nan
+
+        loss = greedy_picked - picked if self.metric not in LOWER_IS_BETTER else picked - greedy_picked
+        sat_names = np.array(self.intervals.sat_ids + [None], dtype=object)
+        return {
+            'sat_index': sat,
+            'sat_id': sat_names[sat],
+            'reason': reason,
+            'remaining': remaining,
+            'handovers': count_handovers(sat),
+            'quality': mean(picked),
+            'greedy_sat_index': greedy,
+            'greedy_sat_id': sat_names[greedy],
+            'greedy_handovers': count_handovers(greedy),
+            'greedy_quality': mean(greedy_picked),
+            'quality_loss': mean(loss),
+        }
+
+    def timeline(self, stations=None, hysteresis=HYSTERESIS) -> pd.DataFrame:
+        """
+        Planned handover timeline, one row per (station, satellite) segment.
+
+        Columns: Station, SAT_ID, Start, End (Time labels of the first and last
+        step), Steps, Reason (why the segment started) and Mean_{metric}.
+        """
+        stations = self.intervals.stations if stations is None else list(stations)
+        time = self.intervals.time
+        rows = []
+        for station in stations:
+            plan = self.plan(station, hysteresis)
+            sat = plan['sat_index']
+            change = np.flatnonzero(np.r_[True, sat[1:] != sat[:-1]])
+            ends = np.append(change[1:], len(sat))
+            k = self.intervals.stations.index(station)
+            for start, end in zip(change, ends):
+                if sat[start] < 0:
+                    continue
+                rows.append({
+                    'Station': station,
+                    'SAT_ID': plan['sat_id'][start],
+                    'Start': time[start],
+                    'End': time[end - 1],
+                    'Steps': end - start,
+                    'Reason': plan['reason'][start],
+                    f'Mean_{self.metric}': self._segment_mean(sat[start], k, start, end),
+                })
+        return pd.DataFrame(rows)
+
+    def _segment_mean(self, s, k, start, end):
+        # A segment lies inside one pass of (s, k), found by its start
+        intervals = self.intervals
+        p = np.flatnonzero((intervals.sat == s) & (intervals.station == k)
+                           & (intervals.start <= start) & (intervals.end >= end))[0]
+        offset = intervals.offsets[p] + start - intervals.start[p]
+        return float(np.nanmean(intervals.metrics[self.metric][offset:offset + end - start]))
@@ -1,7 +1,17 @@
 import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
 import os
-import itertools
-from utils.config import colors, markers, linestyles, DPI, SAVE_FORMATS, bar_width as global_bar_width , figsize as global_figsize, title_req
+import hashlib
+import json
+import struct
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from matplotlib import rcParams
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from utils.config import colors, markers, linestyles, DPI, SAVE_FORMATS, bar_width as global_bar_width , figsize as global_figsize, title_req, SKIP_UNCHANGED_PLOTS, MAX_MARKERS
+from utils.link_cube import LinkCube
 
 # Function to save the plot in different formats
 def save_plot(fig, filename, folder):
@@ -14,79 +24,17 @@ def save_plot(fig, filename, folder):
 
 # Function to plot multiple datasets for comparison
 def plot_comparison(dfs, x_column, y_column, labels, title, xlabel, ylabel, filename, folder):
-    """Compare multiple datasets on a single plot."""
-    fig, ax = plt.subplots(figsize=(6, 4), dpi=DPI)
-    
-    # Create iterators for cycling through colors, markers, and linestyles
-    color_cycle = itertools.cycle(colors)
-    marker_cycle = itertools.cycle(markers)
-    linestyle_cycle = itertools.cycle(linestyles)
-    
-    for df, label in zip(dfs, labels):
-        # Get the next available color, marker, and linestyle
-        color = next(color_cycle)
-        marker = next(marker_cycle)
-        linestyle = next(linestyle_cycle)
-        
-        # Plot the line with chosen style and color
-        ax.plot(
-            df[x_column], df[y_column], 
-            label=label, 
-            color=color, 
-            marker=marker, 
-            linestyle=linestyle
-        )
-
-    if not title_req:
-        title = ""
-
-    # Set plot properties
-    ax.set(title=title, xlabel=xlabel, ylabel=ylabel)
-    ax.legend()
-    ax.grid(True)
-    
-    # Tight layout and save the plot
-    plt.tight_layout()
+    """Compare multiple datasets on a single plot, drawn on the (6, 4) PlotTemplate."""
     print("folder save", folder)
-    save_plot(fig, filename, folder)
-    plt.close(fig)
+    _render_cached(plot_job([df[x_column].to_numpy() for df in dfs], [df[y_column].to_numpy() for df in dfs],
+                            labels, xlabel, ylabel, title, filename, folder, figsize=(6, 4)))
 
 
 # Function to plot metrics with color, marker, and linestyle cycling
 def plot_metric(df, x_column, y_columns, labels, title, xlabel, ylabel, filename, folder):
-    """Plot one or more metrics."""
-    fig, ax = plt.subplots(figsize=(6, 4), dpi=DPI)
-    
-    # Create iterators for cycling through colors, markers, and linestyles
-    color_cycle = itertools.cycle(colors)
-    marker_cycle = itertools.cycle(markers)
-    linestyle_cycle = itertools.cycle(linestyles)
-    
-    for y_column, label in zip(y_columns, labels):
-        # Get the next available color, marker, and linestyle
-        color = next(color_cycle)
-        marker = next(marker_cycle)
-        linestyle = next(linestyle_cycle)
-        
-        # Plot the line with chosen style and color
-        ax.plot(
-            df[x_column], df[y_column], 
-            label=label, 
-            color=color, 
-            marker=marker, 
-            linestyle=linestyle
-        )
-    if not title_req:
-        title = ""
-    # Set plot properties
-    ax.set(title=title, xlabel=xlabel, ylabel=ylabel)
-    ax.legend()
-    ax.grid(True)
-    
-    # Tight layout and save the plot
-    plt.tight_layout()
-    save_plot(fig, filename, folder)
-    plt.close(fig)
+    """Plot one or more metrics, drawn on the (6, 4) PlotTemplate."""
+    _render_cached(plot_job(df[x_column].to_numpy(), [df[y_column].to_numpy() for y_column in y_columns],
+                            labels, xlabel, ylabel, title, filename, folder, figsize=(6, 4)))
 
 ####################################################################################################################################
 # For Evaluate
@@ -113,23 +61,344 @@ def plot_line_comparison(df, columns, labels, xlabel, ylabel, title, filename, f
     # markers = ['o', 's', 'D', '^', 'v', 'p', '*', 'x']       # Add more markers as needed
     # linestyles = ['-', '--', '-.', ':']                      # Add more linestyles as needed
 
-    fig, ax = plt.subplots(figsize=(4, 3))
+    _render_cached(line_comparison_job(df, columns, labels, xlabel, ylabel, title, filename, folder))
 
-    for i, (column, label) in enumerate(zip(columns, labels)):
-        color = colors[i % len(colors)]
-        marker = markers[i % len(markers)]
-        linestyle = linestyles[i % len(linestyles)]
-        ax.plot(df.index, df[column], color=color, marker=marker, linestyle=linestyle, label=label)
 
-    if not title_req:
-        title = ""
-        
-    ax.set(title=title, xlabel=xlabel, ylabel=ylabel)
-    ax.legend()
-    ax.grid(True)
-    plt.tight_layout()
-    save_plot(fig, filename, folder)
-    plt.close(fig)
+def _render_cached(job):
+    # Render one job in this process unless its saved files are up to date
+    key = job_key(job)
+    if is_up_to_date(job, key):
+        return
+    render_job(job)
+    record_plots(job['folder'], {job['filename']: key})
+
+
+def line_comparison_job(df, columns, labels, xlabel, ylabel, title, filename, folder):
+    """
+    Package a plot_line_comparison call as a plot job.
+
+    The job only holds the x values and the plotted columns as NumPy arrays,
+    so it is cheap to send to a worker process. Arguments as in plot_line_comparison.
+    """
+    return plot_job(df.index, [df[column].to_numpy() for column in columns], labels,
+                    xlabel, ylabel, title, filename, folder)
+
+
+def plot_job(x, series, labels, xlabel, ylabel, title, filename, folder, figsize=None):
+    """
+    Plot job from arrays: `series` is a list of y arrays over the shared `x`.
+
+    `x` may also be a list with one x array per series. `figsize` selects
+    the PlotTemplate the job is drawn on (default (4, 3)). Other arguments
+    as in plot_line_comparison.
+    """
+    job = {
+        'x': [np.asarray(values) for values in x] if isinstance(x, list) else np.asarray(x),
+        'series': [np.asarray(values) for values in series],
+        'labels': list(labels),
+        'xlabel': xlabel,
+        'ylabel': ylabel,
+        'title': title,
+        'filename': filename,
+        'folder': folder,
+    }
+    if figsize is not None:
+        job['figsize'] = tuple(figsize)
+    return job
+
+
+class PlotTemplate:
+    """
+    Reusable figure for the plot_line_comparison style.
+
+    The figure, axes, grid and line styles are built once; each job only
+    swaps the line data, legend labels, axis labels and limits before
+    saving. Lines are created on demand and hidden when a later job has
+    fewer series, so one template serves jobs of any width.
+
+    At DPI 500 a figure still takes about 0.2 s, mostly Agg drawing and
+    PNG compression, so per process the template is under 2x faster than
+    a new figure per plot; larger batch speed-ups come from the
+    render_batch pool and the manifest skip.
+    """
+
+    def __init__(self, figsize=(4, 3)):
+        # A bare Figure is not tracked by pyplot, so it is never closed by accident.
+        # It is drawn at the save DPI, so the PNG comes straight from its Agg buffer
+        self.fig = Figure(figsize=figsize, dpi=DPI)
+        self.canvas = FigureCanvasAgg(self.fig)
+        self.ax = self.fig.add_subplot()
+        self.ax.grid(True)
+        self.lines = []
+        self._layout_key = None
+
+    def _line(self, i):
+        while len(self.lines) <= i:
+            n = len(self.lines)
+            line, = self.ax.plot([], [], color=colors[n % len(colors)], marker=markers[n % len(markers)],
+                                 linestyle=linestyles[n % len(linestyles)])
+            self.lines.append(line)
+        return self.lines[i]
+
+    def render(self, job):
+        """Draw one plot job (see line_comparison_job) on the template and save it."""
+        ax = self.ax
+        n_series = len(job['series'])
+        xs = job['x'] if isinstance(job['x'], list) else [job['x']] * n_series
+        for i, (x, series, label) in enumerate(zip(xs, job['series'], job['labels'])):
+            line = self._line(i)
+            line.set_data(x, series)
+            line.set_markevery(markevery_for(np.count_nonzero(~pd.isna(series))))
+            line.set_label(label)
+            line.set_visible(True)
+        for line in self.lines[n_series:]:
+            line.set_visible(False)
+
+        title = job['title'] if title_req else ""
+        ax.set(title=title, xlabel=job['xlabel'], ylabel=job['ylabel'])
+
+        ax.relim(visible_only=True)
+        ax.autoscale_view()
+        ax.legend(handles=self.lines[:n_series])
+
+        # Layout only depends on the text around the axes; tick label widths
+        # are covered by bbox_inches='tight' in save_plot
+        layout_key = (title, job['xlabel'], job['ylabel'])
+        if layout_key != self._layout_key:
+            self.fig.tight_layout()
+            self._layout_key = layout_key
+
+        self.save(job['filename'], job['folder'])
+
+    def save(self, filename, folder):
+        """
+        Save as save_plot does, with the PNG written from one Agg draw.
+
+        savefig(bbox_inches='tight') draws the figure twice and PIL's PNG
+        encoder tries every row filter; here the figure is drawn once, the
+        buffer is cropped to the same padded tight box and written by
+        write_png. The pixels are the same as savefig's. Other formats
+        still go through savefig.
+        """
+        os.makedirs(folder, exist_ok=True)
+        for fmt in SAVE_FORMATS:
+            if fmt != 'png':
+                self.fig.savefig(f"{folder}/{filename}.{fmt}", dpi=DPI, bbox_inches='tight')
+                continue
+            self.canvas.draw()
+            bbox = self.fig.get_tightbbox(self.canvas.get_renderer()).padded(rcParams['savefig.pad_inches'])
+            write_png(f"{folder}/{filename}.png", _crop(np.asarray(self.canvas.buffer_rgba()), bbox, DPI), DPI)
+
+
+def _crop(rgba, bbox, dpi):
+    # RGB pixels inside `bbox` (inches, y up), white where it reaches past the figure
+    # Same pixel size as the canvas savefig makes for the box (Agg truncates it);
+    # the small offset keeps float noise in the box from losing a pixel
+    height, width = rgba.shape[:2]
+    x0, y0 = int(round(bbox.x0 * dpi)), int(round(bbox.y0 * dpi))
+    x1, y1 = x0 + int(bbox.width * dpi + 1e-6), y0 + int(bbox.height * dpi + 1e-6)
+    top, bottom = height - y1, height - y0
+    pad = ((max(-top, 0), max(bottom - height, 0)), (max(-x0, 0), max(x1 - width, 0)), (0, 0))
+    rgb = rgba[max(top, 0):min(bottom, height), max(x0, 0):min(x1, width), :3]
+    return np.pad(rgb, pad, constant_values=255) if any(map(any, pad)) else rgb
+
+
+def write_png(path, rgb, dpi, level=6):
+    """
+    Write an (height, width, 3) uint8 array as an 8-bit RGB PNG.
+
+    Every row uses the Up filter (difference to the row above), which
+    suits plots with long flat runs; with zlib level 6 the files are
+    smaller than PIL's and written about 2.5x faster.
+    """
+    height, width = rgb.shape[:2]
+    rows = np.empty((height, width * 3 + 1), dtype=np.uint8)
+    rows[:, 0] = 2  # Up filter
+    pixels = rows[:, 1:].reshape(height, width, 3)  # View, so the crop is never copied
+    pixels[...] = rgb
+    pixels[1:] -= rgb[:-1]
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    ppm = int(round(dpi / 0.0254))  # pHYs is in pixels per metre
+    tmp_file = path + '.tmp'
+    with open(tmp_file, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)))
+        f.write(chunk(b'pHYs', struct.pack('>IIB', ppm, ppm, 1)))
+        f.write(chunk(b'IDAT', zlib.compress(rows.tobytes(), level)))
+        f.write(chunk(b'IEND', b''))
+    os.replace(tmp_file, path)
+
+
+def markevery_for(n_points):
+    """Marker stride so that a line with `n_points` drawn points shows at most MAX_MARKERS markers."""
+    return max(1, -(-n_points // MAX_MARKERS))
+
+
+# One template per figure size and process, created on first use (also in pool workers)
+_templates = {}
+
+
+def render_job(job):
+    """Draw and save one plot job (see plot_job) on the process' PlotTemplate for its figsize."""
+    figsize = job.get('figsize', (4, 3))
+    if figsize not in _templates:
+        _templates[figsize] = PlotTemplate(figsize)
+    _templates[figsize].render(job)
+
+
+MANIFEST_NAME = '.plot_manifest.json'
+
+
+def job_key(job) -> str:
+    """Hash of everything that ends up in the saved files of a plot job."""
+    sha = hashlib.sha1()
+    xs = job['x'] if isinstance(job['x'], list) else [job['x']]
+    for array in xs + job['series']:
+        array = np.ascontiguousarray(array)
+        sha.update(str((array.dtype.str, array.shape)).encode())
+        sha.update(array.tobytes() if array.dtype != object else repr(array.tolist()).encode())
+    style = (job['labels'], job['xlabel'], job['ylabel'], job['title'], title_req,
+             colors, markers, linestyles, MAX_MARKERS, DPI, SAVE_FORMATS)
+    sha.update(repr(style).encode())
+    if 'figsize' in job:
+        sha.update(repr(job['figsize']).encode())
+    return sha.hexdigest()
+
+
+def read_manifest(folder) -> dict:
+    """Plot manifest of a folder: filename -> job_key of the saved files."""
+    try:
+        with open(os.path.join(folder, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def record_plots(folder, keys):
+    """Add {filename: job_key} entries to the manifest of `folder`."""
+    manifest = read_manifest(folder)
+    manifest.update(keys)
+    os.makedirs(folder, exist_ok=True)
+    tmp_file = os.path.join(folder, MANIFEST_NAME + '.tmp')
+    with open(tmp_file, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_file, os.path.join(folder, MANIFEST_NAME))
+
+
+def is_up_to_date(job, key, manifest=None) -> bool:
+    """True if the saved files of `job` exist and were rendered from the same key."""
+    if not SKIP_UNCHANGED_PLOTS:
+        return False
+    manifest = read_manifest(job['folder']) if manifest is None else manifest
+    if manifest.get(job['filename']) != key:
+        return False
+    return all(os.path.exists(f"{job['folder']}/{job['filename']}.{fmt}") for fmt in SAVE_FORMATS)
+
+
+def _init_render_worker():
+    # Workers only write files, so use the non-interactive backend
+    plt.switch_backend('Agg')
+
+
+def render_batch(jobs, workers=None):
+    """
+    Render plot jobs on a process pool.
+
+    Jobs whose files are up to date according to the folder manifest are
+    skipped, so only changed figures are re-rendered.
+
+    Parameters:
+        jobs (list): Plot jobs from line_comparison_job / sat_metric_jobs.
+        workers (int): Number of worker processes, defaults to the CPU count.
+            With 1 worker the jobs are rendered in this process.
+    """
+    # Drop jobs whose saved files are up to date (see job_key)
+    manifests = {}
+    keys = {}
+    pending = []
+    for job in jobs:
+        folder = job['folder']
+        if folder not in manifests:
+            manifests[folder] = read_manifest(folder)
+        key = job_key(job)
+        if not is_up_to_date(job, key, manifests[folder]):
+            keys.setdefault(folder, {})[job['filename']] = key
+            pending.append(job)
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(pending) <= 1:
+        for job in pending:
+            render_job(job)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_render_worker) as pool:
+            # Larger chunks keep the per-job pickling overhead low
+            chunksize = max(1, len(pending) // (workers * 4))
+            for _ in pool.map(render_job, pending, chunksize=chunksize):
+                pass
+
+    # Manifests are only written here, never by the workers
+    for folder, folder_keys in keys.items():
+        record_plots(folder, folder_keys)
+
+    print(f"Rendered {len(pending)} plots, {len(jobs) - len(pending)} up to date")
+
+
+def sat_metric_jobs(data, sat_ids, stations, metric, xlabel, ylabel, title, filename, folder):
+    """
+    Plot jobs for one metric, one figure per satellite and station.
+
+    Each station's (time x satellite) block is taken once with cube.sel and
+    every job holds one column of it. Satellites without any value for a
+    station (e.g. columns dropped as empty) get no figure.
+
+    Parameters:
+        data (LinkCube or pd.DataFrame): Link cube, or a wide log with
+            LEO{i}_{Station}_{Metric} columns that is converted to one.
+        sat_ids (list): Satellite IDs, e.g. possible_sat_conn_ids.
+        stations (list): Station names, e.g. ['Sydney', 'Melbourne'].
+        metric (str): Metric name, e.g. 'SNR_dB'.
+        filename (str): Format string with {sat_id} and {station} fields.
+        xlabel, ylabel, title, folder: As in plot_line_comparison.
+    """
+    cube = data if isinstance(data, LinkCube) else LinkCube.from_frame(data, dtype=np.float64)
+    if metric not in cube.metric_index:
+        return []
+    x = np.arange(len(cube.time))
+    sat_ids = [sat_id for sat_id in sat_ids if sat_id in cube.sat_index]
+
+    jobs = []
+    blocks = {station: cube.sel(station=station, metric=metric)
+              for station in stations if station in cube.station_index}
+    for sat_id in sat_ids:
+        for station, block in blocks.items():
+            values = block[:, cube.sat_index[sat_id]]
+            if np.isnan(values).all():
+                continue
+            column = f'{sat_id}_{station}_{metric}'
+            jobs.append(plot_job(x, [values], [column], xlabel, ylabel, title,
+                                 filename.format(sat_id=sat_id, station=station), folder))
+    return jobs
+
+
+def plot_cube_metric(cube, sat_ids, station, metric, xlabel, ylabel, title, filename, folder):
+    """
+    Plot one station metric of a LinkCube for the given satellites.
+
+    Parameters:
+        cube (LinkCube): The link cube holding the data.
+        sat_ids (list): Satellite IDs to plot, one line each.
+        station (str): Ground station name, e.g. 'Sydney'.
+        metric (str): Metric name, e.g. 'SNR_dB'.
+        xlabel, ylabel, title, filename, folder: As in plot_line_comparison.
+    """
+    sat_ids = list(sat_ids)
+    values = cube.sel(sat=sat_ids, station=station, metric=metric)
+    _render_cached(plot_job(np.arange(len(cube.time)), list(values.T),
+                            [f'{sat_id}_{station}_{metric}' for sat_id in sat_ids],
+                            xlabel, ylabel, title, filename, folder))
 
 # def cdf_plot_line_comparison(df, index_rows, columns, labels, xlabel, ylabel, title, filename, folder):
 #     """
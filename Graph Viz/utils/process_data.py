@@ -1,81 +1,149 @@
 import os
-from utils.config import GRAPH_SAVE_FOLDER, DATA_FOLDER
-from utils.plotter import plot_line_comparison
+from utils.link_cube import LinkCube
+from utils.loader import read_header
+from utils.schema import Schema
 
 
+import numpy as np
 import pandas as pd
 import re
 
 
-def process_data(df: pd.DataFrame) -> pd.DataFrame:
+def process_data(df: pd.DataFrame, stations=('Sydney', 'Melbourne')) -> pd.DataFrame:
 
-    # Step 1: Drop columns that are all zeros or all NaN
-    df = df.drop(columns=[col for col in df.columns if ((df[col] == 0) | (df[col].isna())).all()])
+    # Index the header once: column position <-> (satellite, station, metric)
+    schema = Schema(df.columns)
 
-    # Step 2: Get max satellite ID from column names
-    sat_ids = [int(match.group(1)) for col in df.columns if (match := re.match(r'LEO(\d+)_', col))]
-    max_sat_id = max(sat_ids) if sat_ids else -1
+    # Step 1: Columns that are all zeros or all NaN
+    empty = ((df == 0) | df.isna()).all().to_numpy()
+
+    # Step 2: Get max satellite ID from the remaining columns
+    remaining_sats = schema.sat[~empty]
+    max_sat_id = remaining_sats.max() if remaining_sats.size else -1
 
     print("Max satellite ID found:", max_sat_id)
 
-    # Step 3: Track satellites with access
-    possible_sat_conn_ids = []
+    # Step 3: Track satellites with access to every station
+    access_pos = schema.positions(metrics='Access')
+    access_seen = np.zeros(len(schema.columns), dtype=bool)
+    access_seen[access_pos] = (df.iloc[:, access_pos].fillna(0) != 0).any().to_numpy()
+
+    possible_sat_nums = schema.dual_access_sat_nums(access_seen, stations)
+    possible_sat_conn_ids = [f'LEO{i}' for i in possible_sat_nums]
+
+    print("Satellites with possible connection:", possible_sat_conn_ids)
+    print("length(Satellites with possible connection):", len(possible_sat_conn_ids))
+
+    # Step 4: Keep non-empty columns of non-satellite fields and connectable satellites, in one slice
+    keep = ~empty & ((schema.sat < 0) | schema.sat_mask(possible_sat_nums))
+    df = df.loc[:, keep].copy()
 
-    for i in range(max_sat_id + 1):
-        sat_id = f'LEO{i}'
+    print("Remaining columns after cleanup:", df.columns.tolist())
 
-        # Check access columns
-        sydney_access_col = f'{sat_id}_Sydney_Access'
-        melbourne_access_col = f'{sat_id}_Melbourne_Access'
+    # Unit conversion on the kept columns, selected by metric code
+    kept_metric = schema.metric[keep]
+    thrpt_pos = np.flatnonzero(kept_metric == schema.metric_codes.get('Throughput', -2))
+    latency_pos = np.flatnonzero(kept_metric == schema.metric_codes.get('Latency', -2))
 
-        # Check if access columns exist and have any True values
-        # .fillna(False) ensures we treat NaN as False
-        # .any() checks if there is at least one True value
-        sydney_access_ok = sydney_access_col in df.columns and df[sydney_access_col].fillna(False).any()
-        melbourne_access_ok = melbourne_access_col in df.columns and df[melbourne_access_col].fillna(False).any()
+    df.iloc[:, thrpt_pos] = df.iloc[:, thrpt_pos] / (1024 * 1024) # Convert to Mbps
 
-        if sydney_access_ok and melbourne_access_ok:
-            possible_sat_conn_ids.append(sat_id)
-        else:
-            # Drop base satellite info if no access
-            base_cols = [f'{sat_id}_Name', f'{sat_id}_Lat', f'{sat_id}_Lon', f'{sat_id}_Freq_Hz']
-            existing_cols_to_drop = [col for col in base_cols if col in df.columns]
-            df = df.drop(columns=existing_cols_to_drop)
+    df.iloc[:, latency_pos] = df.iloc[:, latency_pos] * 1000 # Convert to ms
+
+    return df, possible_sat_conn_ids
+
+
+def process_cube(cube: LinkCube, stations=('Sydney', 'Melbourne')):
+    """
+    LinkCube counterpart of process_data.
+
+    Keeps the satellites with access to every station in `stations` and
+    converts Throughput to Mbps and Latency to ms in place.
+    """
+    possible_sat_conn_ids = cube.dual_access_ids(list(stations))
 
     print("Satellites with possible connection:", possible_sat_conn_ids)
     print("length(Satellites with possible connection):", len(possible_sat_conn_ids))
 
+    cube = cube.subset(possible_sat_conn_ids)
 
-    # Collect all satellite-related columns NOT in possible_sat_conn_ids to drop
-    cols_to_drop = []
+    if not cube.converted:
+        if 'Throughput' in cube.metric_index:
+            cube.sel(metric='Throughput')[...] /= (1024 * 1024) # Convert to Mbps
+        if 'Latency' in cube.metric_index:
+            cube.sel(metric='Latency')[...] *= 1000 # Convert to ms
+        cube.converted = True
 
-    for col in df.columns:
-        # Extract satellite id number from column name if it matches pattern
-        match = re.match(r'(LEO\d+)_', col)
-        if match:
-            sat_id = match.group(1)
-            # If satellite not in possible_sat_conn_ids, mark its columns for deletion
-            if sat_id not in possible_sat_conn_ids:
-                cols_to_drop.append(col)
+    return cube, possible_sat_conn_ids
 
-    # Drop those columns
-    df = df.drop(columns=cols_to_drop)
 
-    print("Remaining columns after cleanup:", df.columns.tolist())
+def scan_log(path, stations=('Sydney', 'Melbourne'), chunksize=1000):
+    """
+    Pass 1 of the streaming process_data: find the columns to keep.
 
-    all_rssi_cols = [col for col in df.columns if re.search(r'_RSSI_dBm$', col)]
-    all_snr_cols = [col for col in df.columns if re.search(r'_SNR_dB$', col)]
-    all_thrpt_cols = [col for col in df.columns if re.search(r'_Throughput$', col)]
-    all_BER_QPSK_cols = [col for col in df.columns if re.search(r'_BER_QPSK$', col)]
-    all_BER_MQAM_cols = [col for col in df.columns if re.search(r'_BER_MQAM$', col)]
-    all_Latency_cols = [col for col in df.columns if re.search(r'Latency$', col)]
-    all_TimeOut_cols = [col for col in df.columns if re.search(r'TimeOut$', col)]
+    Reads the CSV in row chunks and accumulates, per column, whether it is
+    all zero/NaN and, per access column, whether it ever has access.
+    Memory is bounded by `chunksize` rows.
 
-    df[all_thrpt_cols] = df[all_thrpt_cols] / (1024 * 1024) # Convert to Mbps
+    Returns:
+        tuple: (columns to keep in file order, possible_sat_conn_ids)
+    """
+    schema = Schema(read_header(path))
+    all_zero_nan = np.ones(len(schema.columns), dtype=bool)
+    access_seen = np.zeros(len(schema.columns), dtype=bool)
+    access_pos = schema.positions(metrics='Access')
 
-    df[all_Latency_cols] = df[all_Latency_cols] * 1000 # Convert to Mbps
-    
-    return df, possible_sat_conn_ids
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        all_zero_nan &= ((chunk == 0) | chunk.isna()).all().to_numpy()
+        access = chunk.iloc[:, access_pos]
+        access_seen[access_pos] |= (access.fillna(0) != 0).any().to_numpy()
+
+    # Same rules as process_data: a satellite is kept if it has access to every station
+    possible_sat_nums = schema.dual_access_sat_nums(access_seen, stations)
+    possible_sat_conn_ids = [f'LEO{i}' for i in possible_sat_nums]
+
+    keep = ~all_zero_nan & ((schema.sat < 0) | schema.sat_mask(possible_sat_nums))
+    keep_cols = [schema.columns[pos] for pos in np.flatnonzero(keep)]
+
+    return keep_cols, possible_sat_conn_ids
+
+
+def iter_processed_chunks(path, keep_cols, chunksize=1000):
+    """
+    Pass 2 of the streaming process_data: yield the kept columns chunk by chunk,
+    with Throughput in Mbps and Latency in ms.
+    """
+    schema = Schema(keep_cols)
+    thrpt_cols = schema.select(metrics='Throughput')
+    latency_cols = schema.select(metrics='Latency')
+
+    for chunk in pd.read_csv(path, usecols=keep_cols, chunksize=chunksize):
+        chunk = chunk[keep_cols]
+        chunk[thrpt_cols] = chunk[thrpt_cols] / (1024 * 1024) # Convert to Mbps
+        chunk[latency_cols] = chunk[latency_cols] * 1000 # Convert to ms
+        yield chunk
+
+
+def process_data_streaming(path, out_path, stations=('Sydney', 'Melbourne'), chunksize=1000):
+    """
+    Streaming version of process_data for logs larger than memory.
+
+    Runs scan_log, then writes the surviving columns to `out_path` chunk by
+    chunk. Peak memory depends on `chunksize`, not on the file size.
+
+    Returns:
+        list: possible_sat_conn_ids, as returned by process_data.
+    """
+    keep_cols, possible_sat_conn_ids = scan_log(path, stations, chunksize)
+
+    print("Satellites with possible connection:", possible_sat_conn_ids)
+    print("length(Satellites with possible connection):", len(possible_sat_conn_ids))
+
+    header = True
+    for chunk in iter_processed_chunks(path, keep_cols, chunksize):
+        chunk.to_csv(out_path, mode='w' if header else 'a', header=header, index=False)
+        header = False
+
+    return possible_sat_conn_ids
 
 
 
@@ -0,0 +1,110 @@
+import re
+
+import numpy as np
+
+
+# LEO{i}_{Field} per-satellite columns and LEO{i}_{Station}_{Metric} per-link columns
+SAT_FIELDS = ['Name', 'Lat', 'Lon', 'Freq_Hz']
+col_pattern = re.compile(r'LEO(\d+)_(?:(Name|Lat|Lon|Freq_Hz)|([a-zA-Z0-9]+)_(.+))$')
+
+
+class Schema:
+    """
+    Index of a wide log header, built in one pass over the column names.
+
+    Every column position gets three integer codes:
+        sat:     satellite number (LEO35 -> 35), -1 for Time and other columns
+        station: index into `stations`, -1 for per-satellite and other columns
+        metric:  index into `metrics` (per-link metrics and the per-satellite
+                 Name/Lat/Lon/Freq_Hz fields), -1 for other columns
+
+    Column selections are then boolean operations on these arrays instead
+    of regex scans over the header.
+    """
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        n_cols = len(self.columns)
+        self.sat = np.full(n_cols, -1, dtype=np.int64)
+        self.station = np.full(n_cols, -1, dtype=np.int64)
+        self.metric = np.full(n_cols, -1, dtype=np.int64)
+
+        self.stations = []
+        self.metrics = list(SAT_FIELDS)
+        station_codes = {}
+        metric_codes = {metric: i for i, metric in enumerate(self.metrics)}
+
+        for pos, col in enumerate(self.columns):
+            match = col_pattern.match(col)
+            if not match:
+                continue
+            sat_num, sat_field, station, metric = match.groups()
+            self.sat[pos] = int(sat_num)
+            if sat_field is not None:
+                self.metric[pos] = metric_codes[sat_field]
+                continue
+            if station not in station_codes:
+                station_codes[station] = len(self.stations)
+                self.stations.append(station)
+            if metric not in metric_codes:
+                metric_codes[metric] = len(self.metrics)
+                self.metrics.append(metric)
+            self.station[pos] = station_codes[station]
+            self.metric[pos] = metric_codes[metric]
+
+        self.station_codes = station_codes
+        self.metric_codes = metric_codes
+        self.sat_nums = np.unique(self.sat[self.sat >= 0])
+
+    @property
+    def sat_ids(self) -> list:
+        """Satellite IDs sorted by number (LEO2 before LEO10)."""
+        return [f'LEO{num}' for num in self.sat_nums]
+
+    @property
+    def link_metrics(self) -> list:
+        """Per-link metrics in header order, e.g. Access, SNR_dB, ..."""
+        used = np.unique(self.metric[self.station >= 0])
+        return [self.metrics[code] for code in used]
+
+    def _codes(self, names, codes):
+        names = [names] if isinstance(names, str) else names
+        return [codes[name] for name in names if name in codes]
+
+    def mask(self, sats=None, stations=None, metrics=None) -> np.ndarray:
+        """Boolean mask over the columns matching all the given filters."""
+        mask = self.sat >= 0
+        if sats is not None:
+            sats = [sats] if isinstance(sats, (str, int, np.integer)) else sats
+            nums = [int(sat[3:]) if isinstance(sat, str) else int(sat) for sat in sats]
+            mask &= np.isin(self.sat, nums)
+        if stations is not None:
+            mask &= np.isin(self.station, self._codes(stations, self.station_codes))
+        if metrics is not None:
+            mask &= np.isin(self.metric, self._codes(metrics, self.metric_codes))
+        return mask
+
+    def positions(self, sats=None, stations=None, metrics=None) -> np.ndarray:
+        """Column positions matching all the given filters, in header order."""
+        return np.flatnonzero(self.mask(sats, stations, metrics))
+
+    def select(self, sats=None, stations=None, metrics=None) -> list:
+        """Column names matching all the given filters, in header order."""
+        return [self.columns[pos] for pos in self.positions(sats, stations, metrics)]
+
+    def sat_mask(self, sat_nums) -> np.ndarray:
+        """Boolean mask of satellite columns whose satellite is in `sat_nums`."""
+        return (self.sat >= 0) & np.isin(self.sat, sat_nums)
+
+    def dual_access_sat_nums(self, access_seen: np.ndarray, stations=('Sydney', 'Melbourne')) -> np.ndarray:
+        """
+        Satellite numbers with access to every station.
+
+        `access_seen` is a boolean per column, True for access columns that
+        have at least one access.
+        """
+        sat_nums = self.sat_nums
+        for station in stations:
+            seen = self.sat[self.mask(stations=station, metrics='Access') & access_seen]
+            sat_nums = np.intersect1d(sat_nums, seen)
+        return sat_nums
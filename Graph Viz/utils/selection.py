@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+
+from utils.link_cube import LinkCube
+
+
+# Link metrics carried over from the selected satellite, mapped to the
+# names used in the best_sinr_df columns (e.g. Sydney_BEST_SNR)
+BEST_METRICS = {
+    'SNR_dB': 'SNR',
+    'RSSI_dBm': 'RSSI',
+    'Throughput': 'Thrpt',
+    'BER_MQAM': 'BER_MQAM',
+    'BER_QPSK': 'BER_QPSK',
+    'Latency': 'Latency',
+}
+
+# Metrics where the smallest value is the best one
+LOWER_IS_BETTER = {'BER_MQAM', 'BER_QPSK', 'Latency'}
+
+
+def select_best_satellite(data, stations, metric='SNR_dB', direction=None, convert_units=True) -> pd.DataFrame:
+    """
+    Select the best satellite per time step for each station.
+
+    For every station the (time x satellite) slice of `metric` is taken from
+    the LinkCube and the best satellite is found with a NaN-aware argmax
+    (argmin for BER and Latency). Ties go to the lowest satellite number.
+    Time steps where no satellite has a value get a None SAT_ID and NaN metrics.
+
+    Parameters:
+        data (LinkCube or pd.DataFrame): Link cube, or a wide simulation log with
+            LEO{i}_{Station}_{Metric} columns that is converted to one.
+        stations (list): Station names, e.g. ['Sydney', 'Melbourne'].
+        metric (str): Metric used to rank the satellites.
+        direction (str): Optional tag inserted after the station name, e.g. 'Uplink'
+            gives Melbourne_Uplink_BEST_SNR as in calc.ipynb.
+        convert_units (bool): Convert throughput to Mbps and latency to ms
+            (skipped if the cube is already converted by process_cube).
+
+    Returns:
+        pd.DataFrame: Time plus {Station}_Best_SAT_ID and {Station}_BEST_{SNR,RSSI,Thrpt,BER_MQAM,BER_QPSK,Latency}.
+    """
+    cube = data if isinstance(data, LinkCube) else LinkCube.from_frame(data, dtype=np.float64)
+    convert_units = convert_units and not cube.converted
+
+    n_time = len(cube.time)
+    sat_names = np.array(cube.sat_ids + [None], dtype=object)
+    rows = np.arange(n_time)
+
+    results = {'Time': cube.time}
+
+    for station in stations:
+        prefix = f'{station}_{direction}' if direction else station
+
+        best = best_satellite_index(cube, station, metric)
+        results[f'{prefix}_Best_SAT_ID'] = sat_names[best]
+
+        for metric_name, short_name in BEST_METRICS.items():
+            if metric_name in cube.metric_index:
+                values = cube.sel(station=station, metric=metric_name).astype(float)
+            else:
+                values = np.full((n_time, len(cube.sat_ids)), np.nan)
+            # Trailing NaN column for rows without any satellite
+            values = np.column_stack([values, np.full(n_time, np.nan)])[rows, best]
+
+            if convert_units and metric_name == 'Throughput':
+                values = values / (1024 * 1024)  # Convert to Mbps
+            elif convert_units and metric_name == 'Latency':
+                values = values * 1000  # Convert to ms
+
+            results[f'{prefix}_BEST_{short_name}'] = values
+
+    return pd.DataFrame(results)
+
+
+def best_satellite_index(cube: LinkCube, station: str, metric='SNR_dB') -> np.ndarray:
+    """
+    Index of the best satellite per time step for one station.
+
+    Rows where no satellite has a value get len(cube.sat_ids).
+    """
+    score = cube.sel(station=station, metric=metric)
+    valid = ~np.isnan(score)
+    has_sat = valid.any(axis=1)
+
+    # argmax/argmin return the first hit, i.e. the lowest satellite number on ties
+    if metric in LOWER_IS_BETTER:
+        best = np.where(valid, score, np.inf).argmin(axis=1)
+    else:
+        best = np.where(valid, score, -np.inf).argmax(axis=1)
+
+    return np.where(has_sat, best, len(cube.sat_ids))
+
+
+def best_satellite_pairs(t_idx, s_idx, k_idx, score, n_time, n_station, lower_is_better=False) -> np.ndarray:
+    """
+    Best satellite per time step and station from flat candidate links.
+
+    Works on the links of VisibilityIndex.pairs() (with their scores from
+    link_budget_pairs) instead of a dense (time x satellite) slice, so only
+    the visible candidates are compared. Ties go to the lowest satellite index.
+
+    Returns:
+        np.ndarray: Satellite index of shape (time, station), -1 where no candidate has a score.
+    """
+    valid = ~np.isnan(score)
+    t_idx, s_idx, k_idx, score = t_idx[valid], s_idx[valid], k_idx[valid], score[valid]
+
+    # Sort by (time, station), then best score, then satellite; the first link of every group wins
+    group = t_idx * n_station + k_idx
+    order = np.lexsort((s_idx, score if lower_is_better else -score, group))
+    first = order[np.r_[True, group[order][1:] != group[order][:-1]]] if len(order) else order
+
+    best = np.full((n_time, n_station), -1, dtype=np.int64)
+    best[t_idx[first], k_idx[first]] = s_idx[first]
+    return best
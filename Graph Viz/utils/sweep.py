@@ -0,0 +1,259 @@
+import hashlib
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict, fields
+
+import numpy as np
+import pandas as pd
+
+from utils.attenuation import AttenuationTable
+from utils.config import CACHE_FOLDER
+from utils.fading import FADING_MODEL, FADING_MODELS, RICIAN_K_DB, fading_loss_db
+from utils.handover import count_handovers
+from utils.link_budget import DOWNLINK, LinkParams, budget_cube
+from utils.link_cube import LinkCube
+from utils.loader import file_hash, load_log
+from utils.selection import best_satellite_index
+
+
+# Sweep knobs besides the LinkParams fields (channel_bw, tx_power, tx_dish, rx_dish, mqam_order, ...)
+FADING_KNOBS = {'fading_model': FADING_MODEL, 'rician_k_db': RICIAN_K_DB, 'seed': 0}
+THROUGHPUT_PERCENTILES = [5, 50, 95]
+
+# Largest relative error of the base point's mean best-satellite throughput against the log
+# before a sweep is refused (one fading draw over a 61-step log moves it by up to ~10%)
+REPRODUCTION_TOLERANCE = 0.15
+
+# Bump when evaluate_point changes so old results are recomputed
+SWEEP_VERSION = 3
+
+_worker_cube = None
+_worker_table = None
+
+
+def expand_grid(grid: dict) -> list:
+    """
+    All combinations of a parameter grid, in the order of its keys.
+
+    e.g. expand_grid({'channel_bw': [200e6, 250e6], 'mqam_order': [16, 64]}) gives four points.
+    """
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def _split_point(point, base_params: LinkParams):
+    link_fields = {field.name for field in fields(LinkParams)}
+    unknown = [name for name in point if name not in link_fields and name not in FADING_KNOBS]
+    if unknown:
+        raise ValueError(f"Unknown sweep parameters {unknown}, use LinkParams fields or {list(FADING_KNOBS)}")
+    params = base_params.with_changes(**{name: value for name, value in point.items() if name in link_fields})
+    fading = {**FADING_KNOBS, **{name: value for name, value in point.items() if name in FADING_KNOBS}}
+    if fading['fading_model'] not in FADING_MODELS:
+        raise ValueError(f"Unsupported fading model '{fading['fading_model']}', expected one of {FADING_MODELS}")
+    return params, fading
+
+
+def point_key(log_hash, base_params: LinkParams, point, stations, metric, atmos_model) -> str:
+    """
+    Cache key of one sweep point: the log content, the full link parameters,
+    the fading, the attenuation model and the selection.
+    """
+    params, fading = _split_point(point, base_params)
+    setup = {
+        'version': SWEEP_VERSION,
+        'log': log_hash,
+        'params': {name: np.asarray(value).tolist() for name, value in asdict(params).items()},
+        'fading': {name: np.asarray(value).tolist() for name, value in fading.items()},
+        'atmos_model': atmos_model,
+        'stations': list(stations),
+        'metric': metric,
+    }
+    return hashlib.sha1(json.dumps(setup, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def evaluate_point(cube: LinkCube, point, atmos_table: AttenuationTable, base_params=DOWNLINK, stations=None,
+                   metric='SNR_dB') -> list:
+    """
+    Link metrics of one sweep point, summarized per station.
+
+    The budget is recomputed from the logged geometry (budget_cube) with the
+    atmospheric attenuation of `atmos_table` and one seeded fading
+    realization, then the best satellite per time step is picked by
+    `metric` as in select_best_satellite.
+
+    Parameters:
+        cube (LinkCube): Logged cube with positions, frequencies and access.
+        point (dict): LinkParams fields and FADING_KNOBS to change.
+        atmos_table (AttenuationTable): Attenuation of the cube's stations (P07's At), e.g.
+            AttenuationTable.cached() with itur or AttenuationTable.from_log(cube, base_params).
+        base_params (LinkParams): Parameters the point is applied to.
+        stations (list): Station names, defaults to all stations of the cube.
+        metric (str): Metric used to rank the satellites.
+
+    Returns:
+        list: One dict per station with the Mean/P{5,50,95} throughput in Mbps, mean BER_QPSK and
+        BER_MQAM, mean latency in ms, handovers, availability (share of steps with a satellite)
+        and Atmos_Model (the table's model).
+    """
+    params, fading = _split_point(point, base_params)
+    stations = cube.stations if stations is None else list(stations)
+    fading_db = fading_loss_db(cube.access.shape, fading['fading_model'], fading['rician_k_db'],
+                               rng=fading['seed'])
+    budget = budget_cube(cube, params, atmos_loss_db=atmos_table.atmos_loss(cube, params), fading_db=fading_db)
+
+    rows = []
+    n_sat = len(budget.sat_ids)
+    time_rows = np.arange(len(budget.time))
+    for station in stations:
+        best = best_satellite_index(budget, station, metric)
+        served = best < n_sat
+
+        def picked(name):
+            values = budget.sel(station=station, metric=name).astype(float)
+            return values[time_rows[served], best[served]]
+
+        thrpt = picked('Throughput') / (1024 * 1024)  # Convert to Mbps
+        row = {'Station': station, 'Mean_Thrpt_Mbps': float(np.mean(thrpt)) if served.any() else np.nan}
+        for p in THROUGHPUT_PERCENTILES:
+            row[f'P{p}_Thrpt_Mbps'] = float(np.percentile(thrpt, p)) if served.any() else np.nan
+        row['Mean_BER_QPSK'] = float(np.mean(picked('BER_QPSK'))) if served.any() else np.nan
+        row['Mean_BER_MQAM'] = float(np.mean(picked('BER_MQAM'))) if served.any() else np.nan
+        row['Mean_Latency_ms'] = float(np.mean(picked('Latency')) * 1000) if served.any() else np.nan
+        row['Handovers'] = count_handovers(np.where(served, best, -1))
+        row['Availability'] = float(served.mean())
+        row['Atmos_Model'] = atmos_table.model
+        rows.append(row)
+    return rows
+
+
+def _init_worker(cube, table):
+    global _worker_cube, _worker_table
+    _worker_cube = cube
+    _worker_table = table
+
+
+def _evaluate_task(args):
+    point, base_params, stations, metric = args
+    return evaluate_point(_worker_cube, point, _worker_table, base_params, stations, metric)
+
+
+def check_reproduction(cube: LinkCube, atmos_table: AttenuationTable, base_params=DOWNLINK, stations=None,
+                       metric='SNR_dB', tolerance=REPRODUCTION_TOLERANCE) -> dict:
+    """
+    Check that the unmodified base point reproduces the log it replays.
+
+    The mean throughput of the best satellite per step (picked by `metric`)
+    is compared between evaluate_point({}) and the logged metrics, per
+    station. A wrong base_params (e.g. UPLINK for a downlink log) or a
+    partial attenuation model shows up here as an error of several times.
+
+    Returns:
+        dict: Relative error of the mean throughput per station.
+
+    Raises:
+        ValueError: If a station is off by more than `tolerance`.
+    """
+    stations = cube.stations if stations is None else list(stations)
+    n_sat = len(cube.sat_ids)
+    errors = {}
+    for row in evaluate_point(cube, {}, atmos_table, base_params, stations, metric):
+        station = row['Station']
+        best = best_satellite_index(cube, station, metric)
+        served = best < n_sat
+        thrpt = cube.sel(station=station, metric='Throughput').astype(float)[np.flatnonzero(served), best[served]]
+        logged = float(np.mean(thrpt)) / (1 if cube.converted else 1024 * 1024)
+        errors[station] = row['Mean_Thrpt_Mbps'] / logged - 1
+
+    off = {station: error for station, error in errors.items() if not abs(error) <= tolerance}
+    if off:
+        details = ', '.join(f'{station} {error:+.0%}' for station, error in off.items())
+        raise ValueError(f"The base point does not reproduce the log's best-satellite throughput ({details}, "
+                         f"tolerance {tolerance:.0%}); check base_params and the attenuation model "
+                         f"'{atmos_table.model}'")
+    return errors
+
+
+def _save_result(path, rows):
+    tmp_file = path + '.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump(rows, f)
+    os.replace(tmp_file, path)
+
+
+def run_sweep(log_path, grid, base_params=DOWNLINK, stations=None, metric='SNR_dB', workers=None,
+              atmos_table=None, tolerance=REPRODUCTION_TOLERANCE, cache_folder=CACHE_FOLDER) -> pd.DataFrame:
+    """
+    Evaluate a parameter grid on a process pool, with every point memoized on disk.
+
+    Each point's result is stored as JSON under {cache_folder}/sweep, named
+    by point_key, as soon as it finishes. Re-runs and grown grids only
+    compute the new points, and an interrupted sweep resumes where it
+    stopped. The cube and the attenuation table are sent to every worker
+    once, when the pool starts.
+
+    Every point gets P07's atmospheric attenuation: by default the cached
+    P.618 table of attenuation.default_model, which needs itur and raises
+    ImportError without it (pass AttenuationTable.from_log(cube, base_params)
+    to work offline). Before any point runs, check_reproduction compares
+    the unmodified base point with the log and refuses the sweep if the
+    mean best-satellite throughput is off by more than `tolerance`.
+
+    Parameters:
+        log_path (str): Simulation log (read through load_log) whose geometry is replayed.
+        grid (dict or list): Parameter grid for expand_grid, or a list of point dicts.
+        base_params (LinkParams): Parameters the points are applied to, e.g. DOWNLINK or UPLINK.
+        stations (list): Station names, defaults to all stations of the log.
+        metric (str): Metric used to rank the satellites.
+        workers (int): Worker processes, 1 runs in this process and None uses the CPU count.
+        atmos_table (AttenuationTable): Attenuation of the log's stations, defaults to AttenuationTable.cached().
+        tolerance (float): Relative tolerance of check_reproduction.
+        cache_folder (str): Where the results are kept.
+
+    Returns:
+        pd.DataFrame: Tidy summary, one row per (point, station): the swept parameters, Station
+        and the evaluate_point columns, including Atmos_Model.
+    """
+    points = expand_grid(grid) if isinstance(grid, dict) else [dict(point) for point in grid]
+    cube = LinkCube.from_frame(load_log(log_path, cache_folder=cache_folder))
+    stations = cube.stations if stations is None else list(stations)
+    table = AttenuationTable.cached(cube.stations, cache_folder=cache_folder) if atmos_table is None else atmos_table
+    check_reproduction(cube, table, base_params, stations, metric, tolerance)
+
+    folder = os.path.join(cache_folder, 'sweep')
+    os.makedirs(folder, exist_ok=True)
+    log_hash = file_hash(log_path)
+    paths = [os.path.join(folder, f'{point_key(log_hash, base_params, point, stations, metric, table.model)}.json')
+             for point in points]
+
+    results = {}
+    for i, path in enumerate(paths):
+        try:
+            with open(path) as f:
+                results[i] = json.load(f)
+        except (OSError, ValueError):
+            pass
+    todo = [i for i in range(len(points)) if i not in results and paths[i] not in paths[:i]]
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(todo) <= 1:
+        for i in todo:
+            results[i] = evaluate_point(cube, points[i], table, base_params, stations, metric)
+            _save_result(paths[i], results[i])
+    elif todo:
+        with ProcessPoolExecutor(max_workers=min(workers, len(todo)), initializer=_init_worker,
+                                 initargs=(cube, table)) as pool:
+            futures = {pool.submit(_evaluate_task, (points[i], base_params, stations, metric)): i for i in todo}
+            for future in as_completed(futures):
+                i = futures[future]
+                results[i] = future.result()
+                _save_result(paths[i], results[i])
+
+    # Duplicate points share the result of their first occurrence
+    first = {path: i for i, path in reversed(list(enumerate(paths)))}
+    rows = []
+    for i, point in enumerate(points):
+        for row in results[first[paths[i]]]:
+            rows.append({**point, **row})
+    return pd.DataFrame(rows)
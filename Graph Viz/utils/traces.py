@@ -0,0 +1,284 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils.config import TIME_FORMAT
+
+
+MBPS = 1024 * 1024             # Bits/s per Mbps in the converted logs (process_cube divides by 1024 * 1024)
+MTU_BYTES = 1500               # Packet size of a mahimahi delivery opportunity
+STEP_MS = 1                    # Trace resolution
+CHUNK_MS = 10_000              # Trace span generated at once, bounds the memory use
+NETEM_STEP_MS = 100            # tc changes faster than this are not applied reliably
+HANDOVER_SPIKE_MS = 30.0       # Extra one-way delay right after a handover
+HANDOVER_SPIKE_LENGTH_MS = 100 # Duration of the delay spike
+HANDOVER_OUTAGE_MS = 0         # Zero capacity right after a handover (0 = none)
+
+
+def link_series(df, throughput, latency, sat_ids=(), time='Time') -> dict:
+    """
+    Throughput/latency series of one link, the input of the trace writers.
+
+    Missing throughput (no satellite) is an outage with zero capacity and
+    missing latency is carried over from the nearest known sample. A
+    handover is a change of any of the `sat_ids` columns between two steps
+    with a satellite; for end-to-end paths that is either leg.
+
+    Parameters:
+        df (pd.DataFrame): Series with a Time column in TIME_FORMAT.
+        throughput (str): Throughput column in Mbps.
+        latency (str): One-way latency column in ms.
+        sat_ids (list): Serving satellite columns.
+        time (str): Time column.
+
+    Returns:
+        dict: 'seconds' from the first sample, 'rate_mbps', 'delay_ms' and boolean 'handover' per sample.
+    """
+    seconds = pd.to_datetime(df[time], format=TIME_FORMAT)
+    seconds = (seconds - seconds.iloc[0]).dt.total_seconds().to_numpy()
+    rate = np.nan_to_num(df[throughput].to_numpy(dtype=float), nan=0.0)
+    delay = df[latency].astype(float).ffill().bfill().fillna(0.0).to_numpy()
+
+    handover = np.zeros(len(df), dtype=bool)
+    for column in sat_ids:
+        sat = df[column].to_numpy(dtype=object)
+        served = pd.notna(sat)
+        handover[1:] |= served[1:] & served[:-1] & (sat[1:] != sat[:-1])
+
+    return {'seconds': seconds, 'rate_mbps': rate, 'delay_ms': delay, 'handover': handover}
+
+
+def best_satellite_series(df, station) -> dict:
+    """link_series of one station in a select_best_satellite/schedule_best_satellite frame."""
+    return link_series(df, f'{station}_BEST_Thrpt', f'{station}_BEST_Latency', [f'{station}_Best_SAT_ID'])
+
+
+def end_to_end_series(df) -> dict:
+    """link_series of an end_to_end frame (EndToEnd_Starlink_Performance.csv layout)."""
+    sat_ids = [column for column in df.columns if column.endswith('_Best_SAT_ID')]
+    return link_series(df, 'EndToEnd_Thrpt_Mbps', 'EndToEnd_Latency_ms', sat_ids)
+
+
+def iter_trace(series, step_ms=STEP_MS, chunk_ms=CHUNK_MS, interpolation='linear',
+               spike_ms=HANDOVER_SPIKE_MS, spike_length_ms=HANDOVER_SPIKE_LENGTH_MS, outage_ms=HANDOVER_OUTAGE_MS):
+    """
+    Millisecond-resolution trace of a link_series, generated chunk by chunk.
+
+    Only the samples of the series are held, every chunk of `chunk_ms` is
+    interpolated on demand, so hours of trace take the memory of one chunk.
+    At each handover the delay is raised by `spike_ms` for `spike_length_ms`
+    and the capacity is zero for the first `outage_ms`.
+
+    Parameters:
+        series (dict): See link_series.
+        step_ms (int): Trace resolution in ms.
+        chunk_ms (int): Trace span per chunk in ms.
+        interpolation (str): 'linear' between samples, or 'hold' for the last sample's value.
+        spike_ms, spike_length_ms, outage_ms: Handover delay spike and capacity gap.
+
+    Yields:
+        dict: 't_ms' (int64), 'rate_mbps', 'delay_ms' and boolean 'handover' (inside a spike) per step.
+    """
+    if interpolation not in ('linear', 'hold'):
+        raise ValueError(f"Unknown interpolation '{interpolation}', use 'linear' or 'hold'")
+    sample_ms = series['seconds'] * 1000
+    handover_ms = sample_ms[series['handover']]
+    n_steps = int(sample_ms[-1] // step_ms) + 1
+    chunk_steps = max(int(chunk_ms // step_ms), 1)
+
+    for first in range(0, n_steps, chunk_steps):
+        t = np.arange(first, min(first + chunk_steps, n_steps), dtype=np.int64) * step_ms
+        if interpolation == 'linear':
+            rate = np.interp(t, sample_ms, series['rate_mbps'])
+            delay = np.interp(t, sample_ms, series['delay_ms'])
+        else:
+            last = np.searchsorted(sample_ms, t, side='right') - 1
+            rate = series['rate_mbps'][last]
+            delay = series['delay_ms'][last]
+
+        # Time since the latest handover, inf before the first one
+        latest = np.searchsorted(handover_ms, t, side='right') - 1
+        since = np.where(latest >= 0, t - handover_ms[np.maximum(latest, 0)], np.inf)
+        spike = since < spike_length_ms
+        yield {
+            't_ms': t,
+            'rate_mbps': np.where(since < outage_ms, 0.0, rate),
+            'delay_ms': delay + spike_ms * spike,
+            'handover': spike,
+        }
+
+
+def _atomic_open(path):
+    # Written next to the target and renamed once complete, as the loader caches
+    tmp_file = path + '.tmp'
+    return tmp_file, open(tmp_file, 'w', newline='\n')
+
+
+def write_mahimahi(series, path, mtu=MTU_BYTES, **trace_kwargs) -> dict:
+    """
+    mahimahi packet-delivery trace (mm-link): one line per MTU-sized delivery opportunity, in ms.
+
+    Capacity is turned into opportunities with a running credit of
+    fractional packets carried across steps and chunks, so the long-term
+    rate is exact. mahimahi replays the trace in a loop and takes the delay
+    from a separate mm-delay shell, so only the capacity is in the file.
+
+    Parameters:
+        series (dict): See link_series.
+        path (str): Output file.
+        mtu (int): Bytes per delivery opportunity.
+        trace_kwargs: Options of iter_trace (step_ms is fixed at 1).
+
+    Returns:
+        dict: 'packets' written and 'duration_ms'.
+    """
+    trace_kwargs['step_ms'] = 1
+    bits_per_packet = mtu * 8
+    credit, packets, end = 0.0, 0, 0
+    tmp_file, f = _atomic_open(path)
+    with f:
+        for chunk in iter_trace(series, **trace_kwargs):
+            total = credit + np.cumsum(chunk['rate_mbps'] * MBPS / 1000 / bits_per_packet)
+            counts = np.diff(np.floor(total), prepend=0.0).astype(np.int64)
+            credit = total[-1] - np.floor(total[-1])
+            stamps = np.repeat(chunk['t_ms'], counts)
+            if len(stamps):
+                f.write('\n'.join(map(str, stamps.tolist())) + '\n')
+                packets += len(stamps)
+                end = int(stamps[-1])
+    if end == 0:
+        os.remove(tmp_file)
+        raise ValueError("mahimahi needs a trace with capacity after 0 ms")
+    os.replace(tmp_file, path)
+    return {'packets': packets, 'duration_ms': end}
+
+
+def write_netem(series, path, dev='eth0', step_ms=NETEM_STEP_MS, interpolation='hold', **trace_kwargs) -> dict:
+    """
+    Shell script that replays the trace with `tc qdisc change ... netem delay ... rate ...`.
+
+    A command is only written when the rounded delay (0.01 ms) or rate
+    (1 kbit/s) changes; the sleeps in between are the time to the next
+    change. Outages become `loss 100%` and handovers are marked with a
+    comment. The sleeps do not correct for the tc call time, so keep
+    `step_ms` at 100 ms or more for long replays.
+
+    Parameters:
+        series (dict): See link_series.
+        path (str): Output script.
+        dev (str): Network interface.
+        step_ms (int): Schedule resolution in ms.
+        interpolation (str): As in iter_trace; 'hold' keeps the logged values between samples.
+        trace_kwargs: Other options of iter_trace.
+
+    Returns:
+        dict: 'commands' written and 'duration_ms'.
+    """
+    qdisc = f'tc qdisc {{}} dev {dev} root netem'
+    previous = None  # (delay in 10 us, rate in kbit/s, time) of the last command
+    commands, in_spike = 0, False
+    tmp_file, f = _atomic_open(path)
+    with f:
+        f.write('#!/bin/sh\n# netem link trace, one-way delay and rate\n')
+        for chunk in iter_trace(series, step_ms=step_ms, interpolation=interpolation, **trace_kwargs):
+            delay = np.round(chunk['delay_ms'] * 100).astype(np.int64)
+            rate = np.round(chunk['rate_mbps'] * MBPS / 1000).astype(np.int64)
+            marks = chunk['handover'] & ~np.r_[in_spike, chunk['handover'][:-1]]
+            in_spike = bool(chunk['handover'][-1])
+
+            changed = np.r_[True, (delay[1:] != delay[:-1]) | (rate[1:] != rate[:-1])]
+            if previous is not None:
+                changed[0] = (delay[0], rate[0]) != previous[:2]
+            lines = []
+            for i in np.flatnonzero(changed | marks):
+                t = int(chunk['t_ms'][i])
+                if previous is not None:
+                    if t > previous[2]:
+                        lines.append(f'sleep {(t - previous[2]) / 1000:.3f}')
+                if marks[i]:
+                    lines.append(f'# handover at {t} ms')
+                if not changed[i]:
+                    continue
+                action = 'replace' if previous is None else 'change'
+                link = f'rate {rate[i]}kbit' if rate[i] > 0 else 'loss 100%'
+                lines.append(f'{qdisc.format(action)} delay {delay[i] / 100:.2f}ms {link}')
+                previous = (delay[i], rate[i], t)
+                commands += 1
+            if lines:
+                f.write('\n'.join(lines) + '\n')
+        end = int(chunk['t_ms'][-1])
+        if end > previous[2]:
+            f.write(f'sleep {(end - previous[2]) / 1000:.3f}\n')
+    os.replace(tmp_file, path)
+    return {'commands': commands, 'duration_ms': end}
+
+
+def write_ns3(series, rate_path, delay_path, step_ms=STEP_MS, changes_only=True, **trace_kwargs) -> dict:
+    """
+    ns-3 time-value files, "time_s value" per line: the rate in bit/s and the one-way delay in ms.
+
+    The files are meant to be scheduled into a PointToPoint channel
+    (DataRate attribute and SetAttribute("Delay")) by the experiment
+    script. With `changes_only` a line is only written when the value
+    changes, which keeps hold-interpolated traces small.
+
+    Parameters:
+        series (dict): See link_series.
+        rate_path, delay_path (str): Output files.
+        step_ms (int): Trace resolution in ms.
+        changes_only (bool): Skip steps that repeat the previous value.
+        trace_kwargs: Other options of iter_trace.
+
+    Returns:
+        dict: 'rate_lines' and 'delay_lines' written.
+    """
+    outputs = {'rate': _atomic_open(rate_path), 'delay': _atomic_open(delay_path)}
+    last = {'rate': None, 'delay': None}
+    lines = {'rate': 0, 'delay': 0}
+    try:
+        for chunk in iter_trace(series, step_ms=step_ms, **trace_kwargs):
+            seconds = chunk['t_ms'] / 1000
+            values = {
+                'rate': np.round(chunk['rate_mbps'] * MBPS).astype(np.int64),
+                'delay': np.round(chunk['delay_ms'], 3),
+            }
+            for name, value in values.items():
+                keep = np.ones(len(value), dtype=bool)
+                if changes_only:
+                    keep[1:] = value[1:] != value[:-1]
+                    keep[0] = value[0] != last[name]
+                    last[name] = value[-1]
+                fmt = '%.3f %d' if name == 'rate' else '%.3f %.3f'
+                text = '\n'.join(fmt % row for row in zip(seconds[keep].tolist(), value[keep].tolist()))
+                if text:
+                    outputs[name][1].write(text + '\n')
+                lines[name] += int(keep.sum())
+    finally:
+        for _, f in outputs.values():
+            f.close()
+    os.replace(outputs['rate'][0], rate_path)
+    os.replace(outputs['delay'][0], delay_path)
+    return {'rate_lines': lines['rate'], 'delay_lines': lines['delay']}
+
+
+def export_traces(series, prefix, formats=('mahimahi', 'netem', 'ns3'), **trace_kwargs) -> dict:
+    """
+    Write the trace in several emulator formats next to each other.
+
+    Files: {prefix}.mahi, {prefix}_netem.sh, {prefix}_rate.ns3 and {prefix}_delay.ns3.
+
+    Returns:
+        dict: Result of every writer by format.
+    """
+    folder = os.path.dirname(prefix)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    results = {}
+    if 'mahimahi' in formats:
+        results['mahimahi'] = write_mahimahi(series, f'{prefix}.mahi', **trace_kwargs)
+    if 'netem' in formats:
+        results['netem'] = write_netem(series, f'{prefix}_netem.sh', **trace_kwargs)
+    if 'ns3' in formats:
+        results['ns3'] = write_ns3(series, f'{prefix}_rate.ns3', f'{prefix}_delay.ns3', **trace_kwargs)
+    return results
@@ -0,0 +1,157 @@
+import numpy as np
+
+from utils.config import STATIONS
+from utils.geometry import look_angles
+
+
+MEAN_EARTH_RADIUS = 6371000.0  # m
+
+# Extra central angle around the spherical coverage circle, covers the
+# ellipsoid and altitude differences before the exact elevation test
+COVERAGE_MARGIN = 0.5  # degrees
+
+
+def coverage_angle(altitude, min_elevation=0.0) -> float:
+    """
+    Earth central angle (degrees) between a station and the sub-satellite
+    point at which a satellite at `altitude` metres sits at `min_elevation`.
+    """
+    elevation = np.radians(min_elevation)
+    ratio = MEAN_EARTH_RADIUS * np.cos(elevation) / (MEAN_EARTH_RADIUS + altitude)
+    return float(np.degrees(np.arccos(ratio) - elevation))
+
+
+def central_angle(lat1, lon1, lat2, lon2):
+    """Haversine great-circle angle in degrees between points given in degrees."""
+    lat1, lon1, lat2, lon2 = (np.radians(x) for x in (lat1, lon1, lat2, lon2))
+    h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return np.degrees(2 * np.arcsin(np.sqrt(np.clip(h, 0, 1))))
+
+
+class VisibilityIndex:
+    """
+    Lat/lon bucket grid of sub-satellite points for every time step.
+
+    The points are bucketed into square cells at most one coverage radius
+    wide (a whole number of them around the globe) and sorted by (time, cell), so the satellites in a cell are one
+    contiguous slice found with searchsorted. A station only looks at the
+    few cells around it, whatever the constellation size, then keeps the
+    satellites inside the coverage circle and finally checks the exact
+    elevation of those candidates.
+
+    Parameters:
+        lat, lon (np.ndarray): Sub-satellite points of shape (time, satellite), e.g. cube.lat, cube.lon.
+            NaN points (satellites not logged at that step) are never visible.
+        altitude (float or np.ndarray): Satellite height in metres, scalar or (time, satellite).
+        min_elevation (float): Elevation mask in degrees.
+    """
+
+    def __init__(self, lat, lon, altitude=547e3, min_elevation=0.0):
+        self.lat = np.asarray(lat, dtype=float)
+        self.lon = np.asarray(lon, dtype=float)
+        self.altitude = altitude
+        self.min_elevation = min_elevation
+        self.n_time, self.n_sat = self.lat.shape
+
+        self.radius = coverage_angle(np.max(altitude), min_elevation) + COVERAGE_MARGIN
+        # Columns must tile 360 degrees exactly, or the wrap at the antimeridian
+        # puts a narrow last column under the index of the first one
+        self.n_cols = int(np.ceil(360 / self.radius))
+        self.cell = 360 / self.n_cols
+        self.n_rows = int(np.ceil(180 / self.cell))
+
+        valid = ~(np.isnan(self.lat) | np.isnan(self.lon))
+        row = np.clip(((np.nan_to_num(self.lat) + 90) // self.cell).astype(np.int64), 0, self.n_rows - 1)
+        col = ((np.nan_to_num(self.lon) + 180) // self.cell).astype(np.int64) % self.n_cols
+        time = np.arange(self.n_time)[:, np.newaxis]
+        key = (time * self.n_rows + row) * self.n_cols + col
+
+        # CSR layout: satellites sorted by (time, cell), invalid points dropped
+        t_idx, s_idx = np.nonzero(valid)
+        key = key[valid]
+        order = np.argsort(key, kind='stable')
+        self.sorted_key = key[order]
+        self.sorted_time = t_idx[order]
+        self.sorted_sat = s_idx[order]
+
+    def _cells(self, station_lat, station_lon) -> np.ndarray:
+        """Cell numbers (row * n_cols + col) within one radius of a station."""
+        lat_lo = max(station_lat - self.radius, -90.0)
+        lat_hi = min(station_lat + self.radius, 90.0)
+        rows = np.arange(int((lat_lo + 90) // self.cell), min(int((lat_hi + 90) // self.cell), self.n_rows - 1) + 1)
+
+        # Longitude half-width at the most poleward latitude of the box
+        max_abs_lat = max(abs(lat_lo), abs(lat_hi))
+        if max_abs_lat >= 89.0:
+            cols = np.arange(self.n_cols)
+        else:
+            half_width = min(self.radius / np.cos(np.radians(max_abs_lat)), 180.0)
+            first = int((station_lon - half_width + 180) // self.cell)
+            last = int((station_lon + half_width + 180) // self.cell)
+            cols = np.unique(np.arange(first, last + 1) % self.n_cols)
+        return (rows[:, np.newaxis] * self.n_cols + cols).ravel()
+
+    def _gather(self, station, times):
+        """(time, satellite) index pairs in the cells around a station, for the given time steps."""
+        station_lat, station_lon = STATIONS[station]
+        cells = self._cells(station_lat, station_lon)
+        keys = np.asarray(times)[:, np.newaxis] * (self.n_rows * self.n_cols) + cells
+        starts = np.searchsorted(self.sorted_key, keys.ravel(), 'left')
+        ends = np.searchsorted(self.sorted_key, keys.ravel(), 'right')
+
+        # Expand the [start, end) slices into one index array
+        counts = ends - starts
+        positions = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        return self.sorted_time[positions], self.sorted_sat[positions]
+
+    def _filter(self, station, t_idx, s_idx):
+        station_lat, station_lon = STATIONS[station]
+        lat = self.lat[t_idx, s_idx]
+        lon = self.lon[t_idx, s_idx]
+        near = central_angle(station_lat, station_lon, lat, lon) <= self.radius
+        t_idx, s_idx = t_idx[near], s_idx[near]
+
+        altitude = self.altitude if np.ndim(self.altitude) == 0 else np.asarray(self.altitude)[t_idx, s_idx]
+        _, elevation = look_angles(self.lat[t_idx, s_idx], self.lon[t_idx, s_idx], altitude, station_lat, station_lon)
+        visible = elevation[..., 0] >= self.min_elevation
+        return t_idx[visible], s_idx[visible]
+
+    def candidates(self, station, t) -> np.ndarray:
+        """Satellite indices in the grid cells around `station` at time step `t` (a superset of the visible ones)."""
+        return np.sort(self._gather(station, [t])[1])
+
+    def visible(self, station, t) -> np.ndarray:
+        """Satellite indices above the elevation mask of `station` at time step `t`."""
+        t_idx, s_idx = self._filter(station, *self._gather(station, [t]))
+        return np.sort(s_idx)
+
+    def pairs(self, stations=None, times=None):
+        """
+        All visible links as flat index arrays, without a dense (time, satellite, station) pass.
+
+        Parameters:
+            stations (list): Station names, defaults to all of config.STATIONS.
+            times (array_like): Time step indices, defaults to all.
+
+        Returns:
+            tuple: (t_idx, s_idx, k_idx) sorted by station, then time, then satellite,
+            with k_idx indexing `stations`.
+        """
+        stations = list(STATIONS) if stations is None else list(stations)
+        times = np.arange(self.n_time) if times is None else np.asarray(times)
+
+        t_parts, s_parts, k_parts = [], [], []
+        for k, station in enumerate(stations):
+            t_idx, s_idx = self._filter(station, *self._gather(station, times))
+            order = np.lexsort((s_idx, t_idx))
+            t_parts.append(t_idx[order])
+            s_parts.append(s_idx[order])
+            k_parts.append(np.full(len(order), k))
+        return np.concatenate(t_parts), np.concatenate(s_parts), np.concatenate(k_parts)
+
+    def access(self, stations=None) -> np.ndarray:
+        """Dense boolean (time, satellite, station) access from pairs(), e.g. for budget_cube."""
+        stations = list(STATIONS) if stations is None else list(stations)
+        access = np.zeros((self.n_time, self.n_sat, len(stations)), dtype=bool)
+        access[self.pairs(stations)] = True
+        return access